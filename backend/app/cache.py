@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .database import async_engine, data_version, engine
+
+CACHE_CONTROL = "no-cache"
+
+
+def current_version(connection: Connection) -> int:
+    return connection.execute(select(data_version.c.version).where(data_version.c.id == 1)).scalar() or 0
+
+
+def read_version() -> int:
+    with engine.connect() as connection:
+        return current_version(connection)
+
+
+async def read_version_async() -> int:
+    if async_engine is None:
+        return await run_in_threadpool(read_version)
+    async with async_engine.connect() as connection:
+        return await connection.run_sync(current_version)
+
+
+def cache_key(scope: Scope) -> str:
+    query = sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+    return f"{scope['path']}?{urlencode(query)}"
+
+
+def make_etag(version: int, key: str) -> str:
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@dataclass
+class CachedResponse:
+    etag: str
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+
+class ResponseCacheMiddleware:
+    """Serve cacheable GETs from a per-process LRU keyed by path and query string.
+
+    Entries are tagged with the shared data version, so a commit in any worker
+    invalidates them; clients revalidating with If-None-Match get a 304 without
+    the handler running. The cache is bounded by entry count and by the total size
+    of the stored bodies, evicting the least recently used entries first.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str],
+        max_entries: int,
+        max_body_bytes: int,
+        max_total_bytes: int,
+    ) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_entries = max_entries
+        self.max_body_bytes = min(max_body_bytes, max_total_bytes)
+        self.max_total_bytes = max_total_bytes
+        self.total_bytes = 0
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        key = cache_key(scope)
+        etag = make_etag(await read_version_async(), key)
+
+        if etag_matches(Headers(scope=scope).get("if-none-match"), etag):
+            scope["cache_route"] = scope["path"]
+            await self.send_not_modified(send, etag)
+            return
+
+        entry = self.entries.get(key)
+        if entry is not None and entry.etag == etag:
+            self.entries.move_to_end(key)
+            scope["cache_route"] = scope["path"]
+            await self.send_cached(send, entry)
+            return
+
+        await self.fetch(scope, receive, send, key, etag)
+
+    async def fetch(self, scope: Scope, receive: Receive, send: Send, key: str, etag: str) -> None:
+        status = 0
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        size = 0
+
+        async def send_and_capture(message: Message) -> None:
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if status == 200:
+                    response_headers = MutableHeaders(scope=message)
+                    response_headers["ETag"] = etag
+                    response_headers["Cache-Control"] = CACHE_CONTROL
+                    headers = list(message["headers"])
+                    response_headers["X-Cache"] = "MISS"
+            elif message["type"] == "http.response.body" and status == 200:
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= self.max_body_bytes:
+                    chunks.append(body)
+                if not message.get("more_body", False) and size <= self.max_body_bytes:
+                    self.store(key, CachedResponse(etag, status, headers, b"".join(chunks)))
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+    def store(self, key: str, entry: CachedResponse) -> None:
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= len(previous.body)
+        self.entries[key] = entry
+        self.total_bytes += len(entry.body)
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_total_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted.body)
+
+    async def send_cached(self, send: Send, entry: CachedResponse) -> None:
+        await send(
+            {"type": "http.response.start", "status": entry.status, "headers": entry.headers + [(b"x-cache", b"HIT")]}
+        )
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def send_not_modified(self, send: Send, etag: str) -> None:
+        headers = [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL.encode())]
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import argparse
+import sys
+
+from .database import SessionLocal, engine
+from .migrations import pending_migrations, run_migrations
+from .utils.analytics import rebuild_rollups, verify_rollups
+from .utils.importer import IMPORT_FORMATS, detect_format, import_expenses
+from .utils.ledger import rebuild_balances, verify_balances
+from .utils.money import format_cents
+from .utils.search import create_search_index
+
+
+def migrate(args: argparse.Namespace) -> int:
+    if args.status:
+        pending = pending_migrations(engine)
+        for migration in pending:
+            print(f"pendente: {migration.version} - {migration.description}")
+        if not pending:
+            print("Nenhuma migração pendente")
+        return 0
+    applied = run_migrations(engine)
+    for migration in applied:
+        print(f"aplicada: {migration.version} - {migration.description}")
+    if not applied:
+        print("Nenhuma migração pendente")
+    return 0
+
+
+def ledger_rebuild(args: argparse.Namespace) -> int:
+    with SessionLocal() as session:
+        rows = rebuild_balances(session)
+        session.commit()
+    print(f"Saldos recalculados: {rows} linha(s)")
+    return 0
+
+
+def ledger_verify(args: argparse.Namespace) -> int:
+    with SessionLocal() as session:
+        drifts = verify_balances(session)
+        if drifts and args.fix:
+            rebuild_balances(session)
+            session.commit()
+    if not drifts:
+        print("Saldos consistentes")
+        return 0
+    for drift in drifts:
+        print(
+            f"pessoa={drift.person_id} conta={drift.account_id} "
+            f"pago={format_cents(drift.stored_paid)} (esperado {format_cents(drift.expected_paid)}) "
+            f"deve={format_cents(drift.stored_owed)} (esperado {format_cents(drift.expected_owed)})"
+        )
+    print(f"{len(drifts)} divergência(s) encontrada(s)" + (", saldos recalculados" if args.fix else ""))
+    return 1
+
+
+def analytics_rebuild(args: argparse.Namespace) -> int:
+    with SessionLocal() as session:
+        rows = rebuild_rollups(session)
+        session.commit()
+    print(f"Agregados mensais recalculados: {rows} linha(s)")
+    return 0
+
+
+def analytics_verify(args: argparse.Namespace) -> int:
+    with SessionLocal() as session:
+        months = verify_rollups(session)
+        if months and args.fix:
+            rebuild_rollups(session)
+            session.commit()
+    if not months:
+        print("Agregados mensais consistentes")
+        return 0
+    print("Meses divergentes: " + ", ".join(months) + (" (agregados recalculados)" if args.fix else ""))
+    return 1
+
+
+def search_rebuild(args: argparse.Namespace) -> int:
+    with engine.begin() as connection:
+        created = create_search_index(connection)
+    if not created:
+        print("Banco sem suporte a FTS5; a busca usa LIKE e não precisa de índice")
+        return 0
+    print("Índice de busca recriado")
+    return 0
+
+
+def import_expenses_file(args: argparse.Namespace) -> int:
+    file_format = args.format or detect_format(args.path)
+    if file_format is None:
+        print("Informe o formato com --format (csv ou ndjson)", file=sys.stderr)
+        return 2
+    with open(args.path, encoding="utf-8-sig", newline="") as stream, SessionLocal() as session:
+        report = import_expenses(session, stream, file_format, chunk_size=args.chunk_size)
+    for error in report.errors:
+        print(f"linha {error.row}: {error.error}", file=sys.stderr)
+    if report.errors_truncated:
+        print("... demais erros omitidos", file=sys.stderr)
+    print(f"Importadas: {report.imported} | Com erro: {report.failed}")
+    return 1 if report.failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Aplica as migrações de esquema pendentes")
+    migrate_parser.add_argument("--status", action="store_true", help="Apenas lista as migrações pendentes")
+    migrate_parser.set_defaults(handler=migrate)
+
+    ledger = commands.add_parser("ledger", help="Manutenção da tabela de saldos por pessoa")
+    ledger_commands = ledger.add_subparsers(dest="ledger_command", required=True)
+    ledger_commands.add_parser("rebuild", help="Recalcula os saldos a partir das despesas").set_defaults(handler=ledger_rebuild)
+    verify = ledger_commands.add_parser("verify", help="Compara os saldos armazenados com as despesas")
+    verify.add_argument("--fix", action="store_true", help="Recalcula os saldos quando houver divergência")
+    verify.set_defaults(handler=ledger_verify)
+
+    analytics = commands.add_parser("analytics", help="Manutenção dos agregados mensais de despesas")
+    analytics_commands = analytics.add_subparsers(dest="analytics_command", required=True)
+    analytics_commands.add_parser("rebuild", help="Recalcula os agregados a partir das despesas").set_defaults(
+        handler=analytics_rebuild
+    )
+    analytics_verify_parser = analytics_commands.add_parser(
+        "verify", help="Compara os agregados armazenados com as despesas"
+    )
+    analytics_verify_parser.add_argument("--fix", action="store_true", help="Recalcula os agregados quando houver divergência")
+    analytics_verify_parser.set_defaults(handler=analytics_verify)
+
+    search = commands.add_parser("search", help="Manutenção do índice de busca textual das despesas")
+    search_commands = search.add_subparsers(dest="search_command", required=True)
+    search_commands.add_parser("rebuild", help="Cria o índice FTS5 e reindexa todas as despesas").set_defaults(
+        handler=search_rebuild
+    )
+
+    import_parser = commands.add_parser("import-expenses", help="Importa despesas de um arquivo CSV ou NDJSON")
+    import_parser.add_argument("path", help="Arquivo a importar")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="Padrão: deduzido pela extensão")
+    import_parser.add_argument("--chunk-size", type=int, default=None, help="Linhas gravadas por transação")
+    import_parser.set_defaults(handler=import_expenses_file)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command != "migrate":
+        run_migrations(engine)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,8 +6,52 @@ class Settings(BaseSettings):
     app_name: str = "Sistema de Rateio Pessoal"
     api_prefix: str = "/api"
     database_url: str | None = None
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 30.0
+    database_async: bool = False
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64000
+    sqlite_single_writer: bool = False
+    sqlite_write_lock_timeout: float = 30.0
     default_split_fernando: float = 0.5
     default_split_spouse: float = 0.5
+    fernando_person_id: int = 1
+    spouse_person_id: int = 2
+    request_log_enabled: bool = True
+    server_timing_enabled: bool = True
+    slow_query_threshold_ms: float | None = 250.0
+    slow_query_log_parameters: bool = True
+    fast_serialization: bool = True
+    scheduler_enabled: bool = False
+    scheduler_interval_seconds: float = 3600.0
+    scheduler_lease_seconds: float = 120.0
+    scheduler_max_attempts: int = 3
+    scheduler_retry_base_seconds: float = 5.0
+    idempotency_enabled: bool = True
+    idempotency_ttl_seconds: float = 24 * 3600.0
+    idempotency_lease_seconds: float = 30.0
+    idempotency_purge_interval_seconds: float = 600.0
+    idempotency_max_body_bytes: int = 1024 * 1024
+    response_cache_enabled: bool = True
+    response_cache_paths: list[str] = [
+        "/dashboard/summary",
+        "/analytics/",
+        "/expenses/",
+        "/people/",
+        "/accounts/",
+        "/recurrences/",
+        "/sync/",
+    ]
+    response_cache_max_entries: int = 256
+    response_cache_max_body_bytes: int = 1024 * 1024
+    # Per worker; multiply by GUNICORN_WORKERS for the memory the cache can take on the host.
+    response_cache_max_total_bytes: int = 32 * 1024 * 1024
+    import_chunk_size: int = 1000
+    import_max_errors: int = 1000
 
     class Config:
         env_file = ".env"
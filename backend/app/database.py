@@ -1,19 +1,320 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from sqlalchemy import BigInteger, Boolean, Column, Index, Integer, String, Table, create_engine, delete, event, insert, select, update
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction, declarative_base, sessionmaker
 
 from .config import settings
+from .metrics import WRITE_LOCK_RETRIES, WRITE_LOCK_TIMEOUTS, WRITE_LOCK_WAIT
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+
+class WriteLockTimeout(Exception):
+    pass
+
+
+class WriteLock:
+    def __init__(self, path: Path, timeout: float) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.Lock()
+        self._fd: int | None = None
+
+    def acquire(self) -> None:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            WRITE_LOCK_TIMEOUTS.inc()
+            raise WriteLockTimeout("Tempo esgotado aguardando o bloqueio de escrita")
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        WRITE_LOCK_TIMEOUTS.inc()
+                        raise WriteLockTimeout("Tempo esgotado aguardando o bloqueio de escrita")
+                    WRITE_LOCK_RETRIES.inc()
+                    time.sleep(0.005)
+        except BaseException:
+            os.close(fd)
+            self._thread_lock.release()
+            raise
+        self._fd = fd
+        WRITE_LOCK_WAIT.observe(time.monotonic() - started)
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._thread_lock.release()
+
+
+def is_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite"
+
+
+def sqlite_file(url: URL) -> Path | None:
+    if not is_sqlite(url) or url.database in (None, "", ":memory:"):
+        return None
+    return Path(url.database)
+
+
+def build_engine(database_url: str) -> Engine:
+    url = make_url(database_url)
+    if not is_sqlite(url):
+        return create_engine(
+            url,
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+            pool_pre_ping=True,
+        )
+
+    options = {"connect_args": {"check_same_thread": False}}
+    if sqlite_file(url) is not None:
+        options.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+        )
+    sqlite_engine = create_engine(url, **options)
+    event.listen(sqlite_engine, "connect", configure_sqlite_connection)
+    return sqlite_engine
+
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url: URL) -> URL:
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"DATABASE_ASYNC não é suportado para o banco {backend}")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def build_async_engine(database_url: str) -> AsyncEngine:
+    # Imported here so the sync mode does not require greenlet and the async drivers.
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(database_url)
+    options = {}
+    if not is_sqlite(url) or sqlite_file(url) is not None:
+        options.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+        )
+    if not is_sqlite(url):
+        options["pool_pre_ping"] = True
+    async_engine = create_async_engine(async_database_url(url), **options)
+    if is_sqlite(url):
+        event.listen(async_engine.sync_engine, "connect", configure_sqlite_connection)
+    return async_engine
+
+
+def configure_sqlite_connection(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA cache_size = {int(settings.sqlite_cache_size)}")
+    cursor.close()
 
 
 database_url = settings.resolved_database_url
-engine = create_engine(database_url, connect_args={"check_same_thread": False} if database_url.startswith("sqlite") else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = build_engine(database_url)
+
+
+class RateioSession(Session):
+    """Session class shared by the sync and async session factories, so both get the listeners below."""
+
+
+def build_async_sessionmaker(async_engine: AsyncEngine) -> async_sessionmaker:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    return async_sessionmaker(async_engine, sync_session_class=RateioSession, autoflush=False)
+
+
+SessionLocal = sessionmaker(class_=RateioSession, autocommit=False, autoflush=False, bind=engine)
+
+async_engine: AsyncEngine | None = None
+AsyncSessionLocal: async_sessionmaker | None = None
+if settings.database_async:
+    async_engine = build_async_engine(database_url)
+    AsyncSessionLocal = build_async_sessionmaker(async_engine)
 
 Base = declarative_base()
 
+data_version = Table(
+    "data_version",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False, default=0),
+)
+bump_data_version_statement = (
+    update(data_version).where(data_version.c.id == 1).values(version=data_version.c.version + 1)
+)
 
-def get_db():
+# One row per synced entity, stamped with the data_version of the transaction that last changed it.
+change_log = Table(
+    "change_log",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False, index=True),
+    Column("entity", String(32), nullable=False),
+    Column("entity_id", Integer, nullable=False),
+    Column("deleted", Boolean, nullable=False, default=False),
+    Index("ix_change_log_entity_id", "entity", "entity_id"),
+)
+CHANGE_LOG_BATCH = 500
+
+write_lock: WriteLock | None = None
+# The lock blocks the calling thread, which in async mode is the event loop; there busy_timeout serializes writers.
+if settings.sqlite_single_writer and not settings.database_async and sqlite_file(engine.url) is not None:
+    write_lock = WriteLock(sqlite_file(engine.url).with_suffix(".write.lock"), settings.sqlite_write_lock_timeout)
+
+
+def acquire_write_lock(session: Session) -> None:
+    if write_lock is None or session.info.get("holds_write_lock"):
+        return
+    write_lock.acquire()
+    session.info["holds_write_lock"] = True
+
+
+def mark_write(session: Session) -> None:
+    session.info["has_writes"] = True
+    acquire_write_lock(session)
+
+
+def has_pending_writes(session: Session) -> bool:
+    return bool(session.info.get("has_writes") or session.new or session.dirty or session.deleted)
+
+
+@event.listens_for(RateioSession, "before_flush")
+def lock_before_flush(session: Session, flush_context, instances) -> None:
+    mark_write(session)
+
+
+@event.listens_for(RateioSession, "do_orm_execute")
+def lock_before_dml(orm_execute_state: ORMExecuteState) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_write(orm_execute_state.session)
+
+
+def record_changes(session: Session, entity: str, ids, deleted: bool = False) -> None:
+    """Queue entities for the change log; used by writes that bypass the unit of work."""
+    changes = session.info.setdefault("changes", {})
+    for entity_id in ids:
+        changes[(entity, entity_id)] = deleted
+
+
+def sync_target(instance) -> tuple[str, int] | None:
+    entity = getattr(instance, "__sync_entity__", None)
+    if entity is not None:
+        return entity, instance.id
+    parent = getattr(instance, "__sync_parent__", None)
+    if parent is not None:
+        return parent[0], getattr(instance, parent[1])
+    return None
+
+
+@event.listens_for(RateioSession, "after_flush")
+def collect_changes(session: Session, flush_context) -> None:
+    flushed: dict[tuple[str, int], bool] = {}
+    for instance in list(session.new) + [instance for instance in session.dirty if session.is_modified(instance)]:
+        target = sync_target(instance)
+        if target is not None:
+            flushed.setdefault(target, False)
+    for instance in session.deleted:
+        target = sync_target(instance)
+        if target is None:
+            continue
+        # A deleted split only touches its expense; a deleted entity always ends up as a tombstone.
+        flushed[target] = flushed.get(target, False) or hasattr(instance, "__sync_entity__")
+    if flushed:
+        session.info.setdefault("changes", {}).update(flushed)
+
+
+def write_changes(session: Session, version: int, changes: dict[tuple[str, int], bool]) -> None:
+    by_entity: dict[str, list[int]] = {}
+    for entity, entity_id in changes:
+        by_entity.setdefault(entity, []).append(entity_id)
+    for entity, ids in sorted(by_entity.items()):
+        for start in range(0, len(ids), CHANGE_LOG_BATCH):
+            session.execute(
+                delete(change_log).where(
+                    change_log.c.entity == entity, change_log.c.entity_id.in_(ids[start : start + CHANGE_LOG_BATCH])
+                )
+            )
+    session.execute(
+        insert(change_log),
+        [
+            {"version": version, "entity": entity, "entity_id": entity_id, "deleted": deleted}
+            for (entity, entity_id), deleted in sorted(changes.items())
+        ],
+    )
+
+
+@event.listens_for(RateioSession, "before_commit")
+def bump_data_version(session: Session) -> None:
+    if not has_pending_writes(session):
+        return
+    # Flush here so the change log sees the final flush of the commit as well.
+    session.flush()
+    changes = session.info.pop("changes", None)
+    if not changes:
+        session.execute(bump_data_version_statement)
+        return
+    if session.get_bind().dialect.update_returning:
+        version = session.execute(bump_data_version_statement.returning(data_version.c.version)).scalar_one()
+    else:
+        session.execute(bump_data_version_statement)
+        version = session.execute(select(data_version.c.version).where(data_version.c.id == 1)).scalar_one()
+    write_changes(session, version, changes)
+
+
+@event.listens_for(RateioSession, "after_transaction_end")
+def release_write_lock(session: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is not None:
+        return
+    session.info.pop("has_writes", None)
+    session.info.pop("changes", None)
+    if session.info.pop("holds_write_lock", False):
+        write_lock.release()
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if settings.database_async else get_sync_db
+
+
+def sql_engines() -> list[Engine]:
+    """Engines whose connections run application queries, for instrumentation hooks."""
+    if async_engine is None:
+        return [engine]
+    return [engine, async_engine.sync_engine]
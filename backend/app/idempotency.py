@@ -0,0 +1,415 @@
+"""Replay of mutating requests sent with an ``Idempotency-Key`` header.
+
+The first request with a key claims a row in ``idempotency_keys`` before the handler runs and
+stores the response once it is sent; a retry with the same key gets the stored response back
+without reaching the route, so nothing is inserted or split again. A retry that arrives while
+the first request is still running gets a 409, and reusing a key for a different request (method,
+path, query string or body) gets a 422. Only outcomes that a retry would reproduce are stored:
+server errors and the statuses that ask the client to try again (409 conflicts, 429 and the like)
+release the key, so the retry runs the route again. A successful response that cannot be stored
+(too large, or the write failed) keeps the key without a body: running the route again would
+repeat a change that already happened, so its retries get a 409 saying so instead.
+
+While the first request runs, the key is only held by a short lease, renewed by a heartbeat, so a
+worker that dies mid-request frees it within ``IDEMPOTENCY_LEASE_SECONDS`` instead of locking retries
+out for the whole TTL; each claim carries a random token, so a request whose lease was taken over
+cannot store or release the new holder's entry. Stored responses are looked up by a fixed-size hash
+of the key (the primary key) and expire after ``IDEMPOTENCY_TTL_SECONDS``; expired rows are ignored
+on lookup and deleted by a background task.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import Column, DateTime, LargeBinary, SmallInteger, Table, Text, delete, insert, select, update
+from sqlalchemy.engine import Connection, Row
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .database import Base, async_engine, engine
+from .metrics import IDEMPOTENT_REQUESTS
+
+logger = logging.getLogger("rateio.idempotency")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+MULTIPART_BOUNDARY = re.compile(r'^multipart/[^;]+;.*?boundary="?([^";]+)"?', re.IGNORECASE)
+# Client errors that depend on timing rather than on the request, so replaying them would be wrong.
+RETRYABLE_STATUSES = frozenset({408, 409, 423, 425, 429})
+
+idempotency_keys = Table(
+    "idempotency_keys",
+    Base.metadata,
+    Column("key_hash", LargeBinary(16), primary_key=True),
+    # Token of the request holding the key; cleared once its response is stored.
+    Column("claim", LargeBinary(16)),
+    # Both stay NULL while the first request is running.
+    Column("fingerprint", LargeBinary(16)),
+    Column("status", SmallInteger),
+    # NULL with a status set: the request succeeded but its response could not be stored.
+    Column("headers", Text),
+    Column("body", LargeBinary),
+    Column("expires_at", DateTime, nullable=False, index=True),
+)
+
+
+def digest(*parts: bytes) -> bytes:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(len(part).to_bytes(8, "big"))
+        hasher.update(part)
+    return hasher.digest()
+
+
+class RequestFingerprint:
+    """Hash of the method, path, query string and body, fed one body chunk at a time.
+
+    The body is never held in memory, so an upload (``/expenses/import``) sent with a key keeps
+    the import's flat memory use. Multipart delimiters are left out of the hash, because clients
+    pick a new random boundary every time they encode the same form.
+    """
+
+    def __init__(self, scope: Scope) -> None:
+        self.hasher = hashlib.blake2b(digest_size=16)
+        for part in (scope["method"].encode(), scope["path"].encode(), scope["query_string"]):
+            self.hasher.update(len(part).to_bytes(8, "big"))
+            self.hasher.update(part)
+        match = MULTIPART_BOUNDARY.search(Headers(scope=scope).get("content-type", ""))
+        self.delimiter = b"--" + match.group(1).encode("latin-1") if match else None
+        self.pending = b""
+        self.complete = False
+        self.disconnected = False
+
+    def update(self, message: Message) -> None:
+        if message["type"] == "http.disconnect":
+            self.disconnected = True
+        elif message["type"] == "http.request":
+            self.complete = not message.get("more_body", False)
+            self.feed(message.get("body", b""))
+
+    def feed(self, chunk: bytes) -> None:
+        if self.delimiter is None:
+            self.hasher.update(chunk)
+            return
+        data = (self.pending + chunk).replace(self.delimiter, b"")
+        # Keep back enough bytes to catch a delimiter split across two chunks.
+        keep = 0 if self.complete else len(self.delimiter) - 1
+        split = max(len(data) - keep, 0)
+        self.hasher.update(data[:split])
+        self.pending = data[split:]
+
+    async def drain(self, receive: Receive) -> None:
+        """Hash whatever is left of the body, for requests the route did not read to the end."""
+        while not (self.complete or self.disconnected):
+            self.update(await receive())
+
+    def digest(self) -> bytes:
+        return self.hasher.digest()
+
+
+def claim_key(connection: Connection, key_hash: bytes, claim: bytes, now: datetime, lease: float) -> Row | None:
+    """Return the live entry for ``key_hash``, or claim the key for ``lease`` seconds and return None.
+
+    An expired entry, including the lease of a request that died, is taken over. A concurrent claim
+    of the same key makes the insert fail with IntegrityError.
+    """
+    row = connection.execute(select(idempotency_keys).where(idempotency_keys.c.key_hash == key_hash)).first()
+    if row is not None:
+        if row.expires_at > now:
+            return row
+        # Conditional, so two retries taking over the same expired entry cannot delete each other's claim.
+        expired = delete(idempotency_keys).where(
+            idempotency_keys.c.key_hash == key_hash, idempotency_keys.c.expires_at <= now
+        )
+        connection.execute(expired)
+    connection.execute(
+        insert(idempotency_keys).values(key_hash=key_hash, claim=claim, expires_at=now + timedelta(seconds=lease))
+    )
+    return None
+
+
+def owned_by(key_hash: bytes, claim: bytes):
+    return idempotency_keys.c.key_hash == key_hash, idempotency_keys.c.claim == claim
+
+
+def renew_claim(connection: Connection, key_hash: bytes, claim: bytes, now: datetime, lease: float) -> bool:
+    result = connection.execute(
+        update(idempotency_keys)
+        .where(*owned_by(key_hash, claim))
+        .values(expires_at=now + timedelta(seconds=lease))
+    )
+    return result.rowcount == 1
+
+
+def store_response(
+    connection: Connection,
+    key_hash: bytes,
+    claim: bytes,
+    fingerprint: bytes,
+    status: int,
+    headers: list[tuple[bytes, bytes]],
+    body: bytes,
+    expires_at: datetime,
+) -> bool:
+    result = connection.execute(
+        update(idempotency_keys)
+        .where(*owned_by(key_hash, claim))
+        .values(
+            claim=None,
+            fingerprint=fingerprint,
+            status=status,
+            headers=json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers]),
+            body=body,
+            expires_at=expires_at,
+        )
+    )
+    return result.rowcount == 1
+
+
+def hold_key(connection: Connection, key_hash: bytes, claim: bytes, status: int, expires_at: datetime) -> bool:
+    result = connection.execute(
+        update(idempotency_keys)
+        .where(*owned_by(key_hash, claim))
+        .values(claim=None, status=status, expires_at=expires_at)
+    )
+    return result.rowcount == 1
+
+
+def release_key(connection: Connection, key_hash: bytes, claim: bytes) -> None:
+    connection.execute(delete(idempotency_keys).where(*owned_by(key_hash, claim)))
+
+
+def purge_expired_keys(connection: Connection, now: datetime) -> int:
+    return connection.execute(delete(idempotency_keys).where(idempotency_keys.c.expires_at <= now)).rowcount
+
+
+def run_in_transaction_sync(function: Callable[..., Any], *args: Any) -> Any:
+    with engine.begin() as connection:
+        return function(connection, *args)
+
+
+async def run_in_transaction(function: Callable[..., Any], *args: Any) -> Any:
+    # Core connections, not sessions: these writes are bookkeeping and must not bump the data version.
+    if async_engine is None:
+        return await run_in_threadpool(run_in_transaction_sync, function, *args)
+    async with async_engine.begin() as connection:
+        return await connection.run_sync(function, *args)
+
+
+def is_storable(status: int) -> bool:
+    return status < 500 and status not in RETRYABLE_STATUSES
+
+
+def match_route(scope: Scope) -> None:
+    """Resolve the route a replay stands in for, so metrics and logs keep the path template."""
+    router = scope["app"].router
+    for route in router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            scope.update(child_scope)
+            return
+
+
+async def send_json(send: Send, status: int, detail: str, headers: list[tuple[bytes, bytes]] | None = None) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+    response_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": response_headers + (headers or [])})
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """Store and replay the responses of mutating API requests that carry an ``Idempotency-Key``."""
+
+    def __init__(self, app: ASGIApp, prefix: str, ttl: float, lease: float, max_body_bytes: int) -> None:
+        self.app = app
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lease = lease
+        self.heartbeat = lease / 4
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in MUTATING_METHODS
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await send_json(send, 400, f"{IDEMPOTENCY_HEADER} deve ter de 1 a {MAX_KEY_LENGTH} caracteres")
+            return
+
+        key_hash = digest(key.encode())
+        claim = os.urandom(16)
+        try:
+            entry = await run_in_transaction(claim_key, key_hash, claim, datetime.utcnow(), self.lease)
+        except IntegrityError:
+            entry = None
+            in_progress = True
+        else:
+            in_progress = entry is not None and entry.status is None
+
+        if in_progress:
+            IDEMPOTENT_REQUESTS.labels("in_progress").inc()
+            await send_json(
+                send,
+                409,
+                f"Uma requisição com esta {IDEMPOTENCY_HEADER} ainda está em processamento",
+                [(b"retry-after", b"1")],
+            )
+            return
+        if entry is not None:
+            await self.replay(scope, receive, send, entry)
+            return
+        await self.execute(scope, receive, send, key_hash, claim)
+
+    async def replay(self, scope: Scope, receive: Receive, send: Send, entry: Row) -> None:
+        fingerprint = RequestFingerprint(scope)
+        await fingerprint.drain(receive)
+        if fingerprint.disconnected:
+            return
+        if entry.headers is None:
+            IDEMPOTENT_REQUESTS.labels("unrecorded").inc()
+            detail = f"A requisição com esta {IDEMPOTENCY_HEADER} já foi concluída, mas sua resposta não foi guardada"
+            await send_json(send, 409, detail)
+            return
+        if fingerprint.digest() != entry.fingerprint:
+            IDEMPOTENT_REQUESTS.labels("mismatch").inc()
+            await send_json(send, 422, f"{IDEMPOTENCY_HEADER} já usada em uma requisição diferente")
+            return
+
+        IDEMPOTENT_REQUESTS.labels("replayed").inc()
+        match_route(scope)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(entry.headers)]
+        headers.append((REPLAYED_HEADER.lower().encode(), b"true"))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def renew_forever(self, key_hash: bytes, claim: bytes) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                if not await run_in_transaction(renew_claim, key_hash, claim, datetime.utcnow(), self.lease):
+                    return
+            except Exception:
+                logger.exception("Falha ao renovar a chave de idempotência")
+
+    async def execute(self, scope: Scope, receive: Receive, send: Send, key_hash: bytes, claim: bytes) -> None:
+        fingerprint = RequestFingerprint(scope)
+        status = 0
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        size = 0
+        stored = False
+
+        async def receive_and_hash() -> Message:
+            message = await receive()
+            fingerprint.update(message)
+            return message
+
+        async def send_and_capture(message: Message) -> None:
+            nonlocal status, headers, size, stored
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                # The body can only be received until the response completes; hash what the route skipped.
+                await fingerprint.drain(receive)
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_body_bytes:
+                    chunks.append(chunk)
+                if (
+                    not message.get("more_body", False)
+                    and is_storable(status)
+                    and size <= self.max_body_bytes
+                    and fingerprint.complete
+                ):
+                    # Stored before the last chunk goes out, so a client that got the response can always replay it.
+                    expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+                    try:
+                        stored = await run_in_transaction(
+                            store_response,
+                            key_hash,
+                            claim,
+                            fingerprint.digest(),
+                            status,
+                            headers,
+                            b"".join(chunks),
+                            expires_at,
+                        )
+                    except Exception:
+                        # The route has already committed: the client still gets its response and the key is held below.
+                        logger.exception("Falha ao guardar a resposta de %s %s", scope["method"], scope["path"])
+                    else:
+                        if not stored:
+                            logger.warning(
+                                "Chave de idempotência de %s %s assumida por outra requisição",
+                                scope["method"],
+                                scope["path"],
+                            )
+            await send(message)
+
+        renewer = asyncio.create_task(self.renew_forever(key_hash, claim))
+        try:
+            await self.app(scope, receive_and_hash, send_and_capture)
+        finally:
+            renewer.cancel()
+            try:
+                await renewer
+            except asyncio.CancelledError:
+                pass
+            if size > self.max_body_bytes:
+                logger.warning("Resposta de %s %s grande demais para guardar", scope["method"], scope["path"])
+            if stored:
+                IDEMPOTENT_REQUESTS.labels("stored").inc()
+            elif 200 <= status < 300:
+                IDEMPOTENT_REQUESTS.labels("unrecorded").inc()
+                await self.hold(scope, key_hash, claim, status)
+            else:
+                IDEMPOTENT_REQUESTS.labels("released").inc()
+                await run_in_transaction(release_key, key_hash, claim)
+
+    async def hold(self, scope: Scope, key_hash: bytes, claim: bytes, status: int) -> None:
+        """Keep the key of a success whose response was not stored, so retries do not repeat it."""
+        try:
+            await run_in_transaction(
+                hold_key, key_hash, claim, status, datetime.utcnow() + timedelta(seconds=self.ttl)
+            )
+        except Exception:
+            logger.exception(
+                "Falha ao reter a chave de idempotência de %s %s; ela fica livre em %s s",
+                scope["method"],
+                scope["path"],
+                self.lease,
+            )
+
+
+async def purge_expired_keys_forever(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+        try:
+            purged = await run_in_transaction(purge_expired_keys, datetime.utcnow())
+        except Exception:
+            logger.exception("Falha ao remover chaves de idempotência expiradas")
+            continue
+        if purged:
+            logger.info("%s chave(s) de idempotência expirada(s) removida(s)", purged)
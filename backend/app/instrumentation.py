@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi.routing import APIRoute, request_response
+from starlette.responses import Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .database import get_db
+from .metrics import observe_request
+
+request_logger = logging.getLogger("rateio.requests")
+sql_logger = logging.getLogger("rateio.sql")
+
+MAX_LOGGED_PARAMETERS = 1000
+
+
+@dataclass
+class RequestMetrics:
+    started: float
+    query_count: int = 0
+    db_time: float = 0.0
+    handler_time: float | None = None
+    handler_finished: float | None = None
+    response_started: float | None = None
+
+    @property
+    def serialization_time(self) -> float | None:
+        if self.handler_finished is None or self.response_started is None:
+            return None
+        return max(self.response_started - self.handler_finished, 0.0)
+
+    def server_timing(self, total: float) -> str:
+        parts = [f'db;dur={self.db_time * 1000:.2f};desc="{self.query_count} queries"']
+        if self.handler_time is not None:
+            parts.append(f"handler;dur={self.handler_time * 1000:.2f}")
+        if self.serialization_time is not None:
+            parts.append(f"serialize;dur={self.serialization_time * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+current_request: ContextVar[RequestMetrics | None] = ContextVar("current_request", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    metrics = current_request.get()
+    if metrics is not None:
+        metrics.query_count += 1
+        metrics.db_time += elapsed
+    threshold = settings.slow_query_threshold_ms
+    if threshold is not None and elapsed * 1000 >= threshold:
+        record = {"event": "slow_query", "duration_ms": round(elapsed * 1000, 2), "statement": statement}
+        if executemany:
+            record["executemany"] = True
+        if settings.slow_query_log_parameters:
+            record["parameters"] = repr(parameters)[:MAX_LOGGED_PARAMETERS]
+        sql_logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def install_sql_hooks(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def time_handler(call):
+    def record(started: float) -> None:
+        metrics = current_request.get()
+        if metrics is not None:
+            metrics.handler_finished = time.perf_counter()
+            metrics.handler_time = metrics.handler_finished - started
+
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def timed_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                record(started)
+
+        return timed_async
+
+    @functools.wraps(call)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            record(started)
+
+    return timed
+
+
+def run_in_session(call, session_param: str, response_field):
+    """Run a sync endpoint on the event loop through ``AsyncSession.run_sync``.
+
+    The response is validated inside the same call, because lazy loads made
+    while serializing ORM objects only work within the session's greenlet.
+    Long blocking endpoints (the import) depend on ``get_sync_db`` instead, so
+    they are left alone here and FastAPI runs them in the threadpool.
+    """
+
+    @functools.wraps(call)
+    async def run(**kwargs):
+        def invoke(session):
+            result = call(**{**kwargs, session_param: session})
+            if response_field is None or isinstance(result, Response):
+                return result
+            value, errors = response_field.validate(result, {}, loc=("response",))
+            return result if errors else value
+
+        return await kwargs[session_param].run_sync(invoke)
+
+    return run
+
+
+class InstrumentedRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs) -> None:
+        super().__init__(path, endpoint, **kwargs)
+        if settings.database_async and not asyncio.iscoroutinefunction(self.dependant.call):
+            session_param = next(
+                (dependency.name for dependency in self.dependant.dependencies if dependency.call is get_db), None
+            )
+            if session_param is not None:
+                self.dependant.call = run_in_session(self.dependant.call, session_param, self.response_field)
+        self.dependant.call = time_handler(self.dependant.call)
+        self.app = request_response(self.get_route_handler())
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics(started=time.perf_counter())
+        token = current_request.set(metrics)
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                metrics.response_started = time.perf_counter()
+                status_code = message["status"]
+                if settings.server_timing_enabled:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", metrics.server_timing(metrics.response_started - metrics.started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            observe_request(
+                scope["method"],
+                route_template(scope),
+                status_code,
+                time.perf_counter() - metrics.started,
+                metrics.query_count,
+            )
+            if settings.request_log_enabled:
+                log_request(scope, metrics, status_code)
+
+
+def route_template(scope: Scope) -> str | None:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return scope.get("cache_route")
+
+
+def log_request(scope: Scope, metrics: RequestMetrics, status_code: int) -> None:
+    serialization = metrics.serialization_time
+    request_logger.info(
+        json.dumps(
+            {
+                "event": "request",
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - metrics.started) * 1000, 2),
+                "handler_ms": round(metrics.handler_time * 1000, 2) if metrics.handler_time is not None else None,
+                "serialize_ms": round(serialization * 1000, 2) if serialization is not None else None,
+                "db_ms": round(metrics.db_time * 1000, 2),
+                "queries": metrics.query_count,
+            }
+        )
+    )
@@ -1,31 +1,111 @@
 from __future__ import annotations
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.orm.exc import StaleDataError
 
+from .cache import ResponseCacheMiddleware
 from .config import settings
-from .database import Base, engine
-from .routes import accounts, dashboard, expenses, people, recurrences
+from .database import WriteLockTimeout, async_engine, engine, sql_engines
+from .idempotency import REPLAYED_HEADER, IdempotencyMiddleware, purge_expired_keys_forever
+from .instrumentation import InstrumentationMiddleware, install_sql_hooks
+from .metrics import install_engine_metrics, render_metrics
+from .migrations import run_migrations
+from .routes import accounts, analytics, dashboard, expenses, people, recurrences, sync
+from .scheduler import build_scheduler
+from .utils.queries import NEXT_CURSOR_HEADER
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    run_migrations(engine)
+    scheduler = build_scheduler()
+    if scheduler is not None:
+        scheduler.start()
+    purger = None
+    if settings.idempotency_enabled:
+        purger = asyncio.create_task(purge_expired_keys_forever(settings.idempotency_purge_interval_seconds))
+    yield
+    if purger is not None:
+        purger.cancel()
+        try:
+            await purger
+        except asyncio.CancelledError:
+            pass
+    if scheduler is not None:
+        await scheduler.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title=settings.app_name)
+app = FastAPI(title=settings.app_name, lifespan=lifespan)
+for sql_engine in sql_engines():
+    install_sql_hooks(sql_engine)
+    install_engine_metrics(sql_engine)
 
+if settings.response_cache_enabled:
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        paths=[settings.api_prefix + path for path in settings.response_cache_paths],
+        max_entries=settings.response_cache_max_entries,
+        max_body_bytes=settings.response_cache_max_body_bytes,
+        max_total_bytes=settings.response_cache_max_total_bytes,
+    )
+if settings.idempotency_enabled:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        prefix=settings.api_prefix,
+        ttl=settings.idempotency_ttl_seconds,
+        lease=settings.idempotency_lease_seconds,
+        max_body_bytes=settings.idempotency_max_body_bytes,
+    )
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Server-Timing", "ETag", "X-Cache", REPLAYED_HEADER],
 )
+app.add_middleware(InstrumentationMiddleware)
+
+
+@app.exception_handler(WriteLockTimeout)
+async def write_lock_timeout_handler(request: Request, exc: WriteLockTimeout):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Banco de dados ocupado, tente novamente"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "O registro foi alterado por outra operação, tente novamente"},
+    )
+
 
 app.include_router(people.router, prefix=settings.api_prefix)
 app.include_router(accounts.router, prefix=settings.api_prefix)
 app.include_router(expenses.router, prefix=settings.api_prefix)
 app.include_router(recurrences.router, prefix=settings.api_prefix)
 app.include_router(dashboard.router, prefix=settings.api_prefix)
+app.include_router(analytics.router, prefix=settings.api_prefix)
+app.include_router(sync.router, prefix=settings.api_prefix)
 
 
 @app.get("/")
 def healthcheck():
     return {"status": "ok", "app": settings.app_name}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
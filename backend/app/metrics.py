@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUEST_LATENCY = Histogram(
+    "rateio_http_request_duration_seconds",
+    "Tempo de resposta das requisições HTTP por rota",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS = Counter(
+    "rateio_http_requests_total",
+    "Requisições HTTP por rota e status",
+    ["method", "route", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "rateio_http_request_queries",
+    "Consultas SQL executadas por requisição",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250),
+)
+POOL_CHECKED_OUT = Gauge(
+    "rateio_db_pool_checked_out",
+    "Conexões do pool em uso",
+    multiprocess_mode="livesum",
+)
+POOL_CONNECTIONS = Gauge(
+    "rateio_db_pool_connections",
+    "Conexões abertas pelo pool",
+    multiprocess_mode="livesum",
+)
+POOL_CHECKOUTS = Counter("rateio_db_pool_checkouts_total", "Retiradas de conexões do pool")
+DB_LOCK_ERRORS = Counter(
+    "rateio_db_lock_errors_total",
+    "Erros de banco ocupado/bloqueado devolvidos pelo SQLite",
+)
+WRITE_LOCK_RETRIES = Counter(
+    "rateio_write_lock_retries_total",
+    "Tentativas repetidas de obter o bloqueio de escrita",
+)
+WRITE_LOCK_TIMEOUTS = Counter(
+    "rateio_write_lock_timeouts_total",
+    "Esperas pelo bloqueio de escrita que estouraram o tempo limite",
+)
+WRITE_LOCK_WAIT = Histogram(
+    "rateio_write_lock_wait_seconds",
+    "Tempo de espera pelo bloqueio de escrita",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+RECURRENCE_OCCURRENCES = Counter(
+    "rateio_recurrence_occurrences_generated_total",
+    "Despesas geradas a partir de regras de recorrência",
+    ["trigger"],
+)
+RECURRENCE_SKIPPED_RULES = Counter(
+    "rateio_recurrence_rules_skipped_total",
+    "Regras vencidas ignoradas por não terem despesa modelo",
+)
+IDEMPOTENT_REQUESTS = Counter(
+    "rateio_idempotent_requests_total",
+    "Requisições com Idempotency-Key por resultado",
+    ["outcome"],
+)
+SCHEDULER_RUNS = Counter(
+    "rateio_scheduler_runs_total",
+    "Execuções do agendador de recorrências por resultado",
+    ["status"],
+)
+
+
+def observe_request(method: str, route: str | None, status: int, duration: float, queries: int) -> None:
+    route = route or UNMATCHED_ROUTE
+    REQUEST_LATENCY.labels(method, route).observe(duration)
+    REQUESTS.labels(method, route, str(status)).inc()
+    REQUEST_QUERIES.labels(route).observe(queries)
+
+
+def on_connect(dbapi_connection, connection_record) -> None:
+    POOL_CONNECTIONS.inc()
+
+
+def on_close(dbapi_connection, connection_record) -> None:
+    POOL_CONNECTIONS.dec()
+
+
+def on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    POOL_CHECKED_OUT.inc()
+    POOL_CHECKOUTS.inc()
+
+
+def on_checkin(dbapi_connection, connection_record) -> None:
+    POOL_CHECKED_OUT.dec()
+
+
+def on_error(context) -> None:
+    error = context.original_exception
+    if isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error)):
+        DB_LOCK_ERRORS.inc()
+
+
+def install_engine_metrics(engine: Engine) -> None:
+    if event.contains(engine, "checkout", on_checkout):
+        return
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "close", on_close)
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "checkin", on_checkin)
+    event.listen(engine, "handle_error", on_error)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import Column, DateTime, Integer, String, Table, inspect, insert, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from . import models
+from .database import Base, data_version
+from .idempotency import idempotency_keys
+from .scheduler import seed_scheduler_state
+from .utils.analytics import rebuild_rollups
+from .utils.ledger import rebuild_balances
+from .utils.search import create_search_index
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_indexes(connection: Connection, table: Table, *names: str) -> None:
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        connection.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+
+HOT_PATH_INDEXES: dict[Table, tuple[str, ...]] = {
+    models.Expense.__table__: (
+        "ix_expenses_date_id",
+        "ix_expenses_category_date_id",
+        "ix_expenses_paid_by_date_id",
+        "ix_expenses_account_date_id",
+        "ix_expenses_recurrence_rule_date",
+    ),
+    models.ExpenseSplit.__table__: (
+        "ix_expense_splits_expense_person",
+        "ix_expense_splits_person_expense",
+    ),
+    models.RecurrenceRule.__table__: ("ix_recurrence_rules_active_next_due",),
+}
+
+
+def add_hot_path_indexes(connection: Connection) -> None:
+    for table, names in HOT_PATH_INDEXES.items():
+        create_indexes(connection, table, *names)
+
+
+# Money columns that used to hold reais as NUMERIC(…, 2) and now hold integer cents.
+CENTS_COLUMNS: dict[str, dict[str, str]] = {
+    "expenses": {"amount": "amount_cents"},
+    "expense_splits": {"amount": "amount_cents"},
+    "person_balances": {"paid": "paid_cents", "owed": "owed_cents"},
+    "monthly_rollups": {"total": "total_cents"},
+    "monthly_split_rollups": {"total": "total_cents"},
+}
+
+
+def convert_amounts_to_cents(connection: Connection) -> None:
+    """Replace every legacy reais column with its cents counterpart; a no-op on current schemas."""
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table_name, columns in CENTS_COLUMNS.items():
+        if table_name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        for old, new in columns.items():
+            if old not in existing:
+                continue
+            if new not in existing:
+                connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {new} BIGINT NOT NULL DEFAULT 0")
+            connection.exec_driver_sql(
+                f"UPDATE {table_name} SET {new} = CAST(ROUND({old} * 100) AS BIGINT) WHERE {old} IS NOT NULL"
+            )
+            connection.exec_driver_sql(f"ALTER TABLE {table_name} DROP COLUMN {old}")
+
+
+def backfill_person_balances(connection: Connection) -> None:
+    # Databases older than migration 6 get here with the reais columns still in place.
+    convert_amounts_to_cents(connection)
+    with Session(bind=connection) as session:
+        rebuild_balances(session)
+        session.flush()
+
+
+def seed_data_version(connection: Connection) -> None:
+    # Start from the clock so a recreated database never reissues ETags of an older one.
+    if connection.execute(select(data_version.c.id).where(data_version.c.id == 1)).first() is None:
+        connection.execute(insert(data_version).values(id=1, version=int(time.time() * 1000)))
+
+
+def backfill_monthly_rollups(connection: Connection) -> None:
+    convert_amounts_to_cents(connection)
+    with Session(bind=connection) as session:
+        rebuild_rollups(session)
+        session.flush()
+
+
+def add_expense_version(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("expenses")}
+    if "version" not in columns:
+        connection.exec_driver_sql("ALTER TABLE expenses ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def add_idempotency_claim(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("idempotency_keys")}
+    if "claim" not in columns:
+        column_type = idempotency_keys.c.claim.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE idempotency_keys ADD COLUMN claim {column_type}")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Índices das consultas mais frequentes", add_hot_path_indexes),
+    Migration(2, "Carga inicial da tabela person_balances", backfill_person_balances),
+    Migration(3, "Contador de versão dos dados para o cache de respostas", seed_data_version),
+    Migration(4, "Carga inicial dos agregados mensais", backfill_monthly_rollups),
+    Migration(5, "Índice de busca textual das despesas (FTS5)", create_search_index),
+    Migration(6, "Valores monetários em centavos inteiros", convert_amounts_to_cents),
+    Migration(7, "Estado do agendador de recorrências", seed_scheduler_state),
+    Migration(8, "Versão das despesas para detectar atualizações concorrentes", add_expense_version),
+    Migration(9, "Dono da chave de idempotência durante a execução", add_idempotency_claim),
+]
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    applied = applied_versions(engine)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def run_migrations(engine: Engine) -> List[Migration]:
+    Base.metadata.create_all(bind=engine)
+    applied: List[Migration] = []
+    for migration in pending_migrations(engine):
+        try:
+            with engine.begin() as connection:
+                migration.upgrade(connection)
+                connection.execute(
+                    insert(schema_migrations).values(version=migration.version, description=migration.description)
+                )
+        except IntegrityError:
+            # Another process applied the same version concurrently.
+            continue
+        applied.append(migration)
+    return applied
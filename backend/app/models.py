@@ -4,10 +4,11 @@ from datetime import date, datetime
 from enum import Enum
 from typing import List
 
-from sqlalchemy import Boolean, Column, Date, DateTime, Enum as SqlEnum, Float, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, Date, DateTime, Enum as SqlEnum, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
+from .utils.money import from_cents
 
 
 class FrequencyUnit(str, Enum):
@@ -19,6 +20,7 @@ class FrequencyUnit(str, Enum):
 
 class Person(Base):
     __tablename__ = "people"
+    __sync_entity__ = "people"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
@@ -32,6 +34,7 @@ class Person(Base):
 
 class Account(Base):
     __tablename__ = "accounts"
+    __sync_entity__ = "accounts"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False, unique=True)
@@ -44,6 +47,8 @@ class Account(Base):
 
 class RecurrenceRule(Base):
     __tablename__ = "recurrence_rules"
+    __sync_entity__ = "recurrences"
+    __table_args__ = (Index("ix_recurrence_rules_active_next_due", "is_active", "next_due_date"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     frequency_unit: Mapped[FrequencyUnit] = mapped_column(SqlEnum(FrequencyUnit), default=FrequencyUnit.monthly)
@@ -56,13 +61,25 @@ class RecurrenceRule(Base):
 
     expenses: Mapped[List["Expense"]] = relationship(back_populates="recurrence_rule")
 
+    # Every generated occurrence increments the counter, so two concurrent generations of the same
+    # due date cannot both commit: the second UPDATE matches no row and raises StaleDataError.
+    __mapper_args__ = {"version_id_col": occurrences_generated, "version_id_generator": False}
+
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __sync_entity__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_date_id", "date", "id"),
+        Index("ix_expenses_category_date_id", "category", "date", "id"),
+        Index("ix_expenses_paid_by_date_id", "paid_by_id", "date", "id"),
+        Index("ix_expenses_account_date_id", "account_id", "date", "id"),
+        Index("ix_expenses_recurrence_rule_date", "recurrence_rule_id", "date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     description: Mapped[str] = mapped_column(String(200), nullable=False)
-    amount: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    amount_cents: Mapped[int] = mapped_column(BigInteger, nullable=False)
     date: Mapped[date] = mapped_column(Date, nullable=False, default=date.today)
     category: Mapped[str | None] = mapped_column(String(120))
     notes: Mapped[str | None] = mapped_column(Text)
@@ -70,21 +87,73 @@ class Expense(Base):
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id"), nullable=False)
     recurrence_rule_id: Mapped[int | None] = mapped_column(ForeignKey("recurrence_rules.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
 
     paid_by: Mapped[Person] = relationship(back_populates="expenses_paid", foreign_keys=[paid_by_id])
     account: Mapped[Account] = relationship(back_populates="expenses")
     splits: Mapped[List["ExpenseSplit"]] = relationship(back_populates="expense", cascade="all, delete-orphan")
     recurrence_rule: Mapped[RecurrenceRule | None] = relationship(back_populates="expenses")
 
+    # Bumped by every update that moves the ledger, so two concurrent updates (or an update and a delete)
+    # computed from the same old state cannot both commit their deltas: the second raises StaleDataError.
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
+
+    @property
+    def amount(self) -> float:
+        return from_cents(self.amount_cents)
+
 
 class ExpenseSplit(Base):
     __tablename__ = "expense_splits"
+    __sync_parent__ = ("expenses", "expense_id")
+    __table_args__ = (
+        Index("ix_expense_splits_expense_person", "expense_id", "person_id"),
+        Index("ix_expense_splits_person_expense", "person_id", "expense_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     expense_id: Mapped[int] = mapped_column(ForeignKey("expenses.id", ondelete="CASCADE"), nullable=False)
     person_id: Mapped[int] = mapped_column(ForeignKey("people.id", ondelete="CASCADE"), nullable=False)
     percentage: Mapped[float] = mapped_column(Float, nullable=False)
-    amount: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    amount_cents: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
     expense: Mapped[Expense] = relationship(back_populates="splits")
     person: Mapped[Person] = relationship(back_populates="splits")
+
+    @property
+    def amount(self) -> float:
+        return from_cents(self.amount_cents)
+
+
+class PersonBalance(Base):
+    __tablename__ = "person_balances"
+
+    person_id: Mapped[int] = mapped_column(ForeignKey("people.id", ondelete="CASCADE"), primary_key=True)
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    paid_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    owed_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    paid_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    owed_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollups"
+
+    month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    paid_by_id: Mapped[int] = mapped_column(ForeignKey("people.id", ondelete="CASCADE"), primary_key=True)
+    category: Mapped[str] = mapped_column(String(120), primary_key=True, default="")
+    total_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class MonthlySplitRollup(Base):
+    __tablename__ = "monthly_split_rollups"
+
+    month: Mapped[str] = mapped_column(String(7), primary_key=True)
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    paid_by_id: Mapped[int] = mapped_column(ForeignKey("people.id", ondelete="CASCADE"), primary_key=True)
+    category: Mapped[str] = mapped_column(String(120), primary_key=True, default="")
+    person_id: Mapped[int] = mapped_column(ForeignKey("people.id", ondelete="CASCADE"), primary_key=True)
+    total_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
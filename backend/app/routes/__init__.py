@@ -1,9 +1,11 @@
-from . import accounts, dashboard, expenses, people, recurrences
+from . import accounts, analytics, dashboard, expenses, people, recurrences, sync
 
 __all__ = [
     "accounts",
+    "analytics",
     "dashboard",
     "expenses",
     "people",
     "recurrences",
+    "sync",
 ]
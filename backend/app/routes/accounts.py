@@ -3,8 +3,10 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_db
+from ..instrumentation import InstrumentedRoute
+from ..utils.analytics import delete_account_rollups
 
-router = APIRouter(prefix="/accounts", tags=["accounts"])
+router = APIRouter(prefix="/accounts", tags=["accounts"], route_class=InstrumentedRoute)
 
 
 @router.get("/", response_model=list[schemas.AccountRead])
@@ -46,6 +48,8 @@ def delete_account(account_id: int, db: Session = Depends(get_db)):
     account = db.query(models.Account).filter(models.Account.id == account_id).first()
     if not account:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conta não encontrada")
+    db.query(models.PersonBalance).filter(models.PersonBalance.account_id == account_id).delete(synchronize_session=False)
+    delete_account_rollups(db, account_id)
     db.delete(account)
     db.commit()
     return None
@@ -0,0 +1,23 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..database import get_db
+from ..instrumentation import InstrumentedRoute
+from ..utils.analytics import expense_totals
+from .expenses import expense_filters
+
+router = APIRouter(prefix="/analytics", tags=["analytics"], route_class=InstrumentedRoute)
+
+
+@router.get("/", response_model=schemas.AnalyticsReport)
+def get_analytics(
+    bucket: Literal["month", "week", "year"] = Query("month"),
+    group_by: Literal["category", "account", "payer", "person"] = Query("category"),
+    source: Literal["auto", "live"] = Query("auto"),
+    filters: dict = Depends(expense_filters),
+    db: Session = Depends(get_db),
+):
+    return expense_totals(db, bucket, group_by, filters, use_rollups=source == "auto")
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
+from ..config import settings
 from ..database import get_db
+from ..instrumentation import InstrumentedRoute
 from ..utils.calculations import calculate_dashboard
+from ..utils.serialization import FastJSONResponse
 
-router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+router = APIRouter(prefix="/dashboard", tags=["dashboard"], route_class=InstrumentedRoute)
 
 
 @router.get("/summary")
-def get_dashboard_summary(db: Session = Depends(get_db)):
-    return calculate_dashboard(db)
+def get_dashboard_summary(exact_settlements: bool = Query(False), db: Session = Depends(get_db)):
+    summary = calculate_dashboard(db, exact_settlements=exact_settlements)
+    if settings.fast_serialization:
+        return FastJSONResponse(summary.dict())
+    return summary
@@ -1,64 +1,151 @@
-from decimal import Decimal
+import io
+from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
 
 from .. import models, schemas
-from ..database import get_db
-from ..utils.calculations import apply_split
-
-router = APIRouter(prefix="/expenses", tags=["expenses"])
+from ..config import settings
+from ..database import get_db, get_sync_db
+from ..instrumentation import InstrumentedRoute
+from ..utils.expenses import (
+    ExpenseBatch,
+    ExpenseError,
+    apply_expense_update,
+    build_expense,
+    validate_expense_update,
+)
+from ..utils.exporter import EXPORT_FORMATS, EXPORT_MEDIA_TYPES, stream_expenses
+from ..utils.importer import IMPORT_FORMATS, detect_format, import_expenses
+from ..utils.ledger import LedgerDelta
+from ..utils.queries import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, filter_expenses
+from ..utils.search import search_expenses
+from ..utils.serialization import FastJSONResponse, expense_records, select_expense_rows
+
+router = APIRouter(prefix="/expenses", tags=["expenses"], route_class=InstrumentedRoute)
+
+
+async def expense_filters(
+    account_id: int | None = Query(None),
+    person_id: int | None = Query(None),
+    paid_by_id: int | None = Query(None),
+    category: str | None = Query(None),
+    date_from: date | None = Query(None),
+    date_to: date | None = Query(None),
+) -> dict[str, object]:
+    return {
+        "account_id": account_id,
+        "person_id": person_id,
+        "paid_by_id": paid_by_id,
+        "category": category,
+        "date_from": date_from,
+        "date_to": date_to,
+    }
 
 
 @router.get("/", response_model=list[schemas.ExpenseRead])
 def list_expenses(
+    response: Response,
     db: Session = Depends(get_db),
-    account_id: int | None = Query(None),
-    person_id: int | None = Query(None),
+    filters: dict[str, object] = Depends(expense_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None),
+):
+    fast = settings.fast_serialization
+    query = filter_expenses(select_expense_rows() if fast else db.query(models.Expense), **filters)
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                models.Expense.date < cursor_date,
+                and_(models.Expense.date == cursor_date, models.Expense.id < cursor_id),
+            )
+        )
+    query = query.order_by(models.Expense.date.desc(), models.Expense.id.desc()).limit(limit + 1)
+    if fast:
+        rows = db.execute(query).all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].date, rows[-1].id)
+        return FastJSONResponse(expense_records(db, rows), headers=headers)
+
+    expenses = query.options(selectinload(models.Expense.splits)).all()
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(expenses[-1].date, expenses[-1].id)
+    return expenses
+
+
+@router.get("/export")
+def export_expenses(
+    format: str = Query("csv", regex=f"^({'|'.join(EXPORT_FORMATS)})$"),
+    filters: dict[str, object] = Depends(expense_filters),
 ):
-    query = db.query(models.Expense)
-    if account_id is not None:
-        query = query.filter(models.Expense.account_id == account_id)
-    if person_id is not None:
-        query = query.join(models.Expense.splits).filter(models.ExpenseSplit.person_id == person_id)
-    return query.order_by(models.Expense.date.desc()).all()
+    return StreamingResponse(
+        stream_expenses(format, filters),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="despesas.{format}"'},
+    )
 
 
-@router.post("/", response_model=schemas.ExpenseRead, status_code=status.HTTP_201_CREATED)
-def create_expense(payload: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    amount = Decimal(str(payload.amount))
-
-    expense = models.Expense(
-        description=payload.description,
-        amount=amount,
-        date=payload.date,
-        category=payload.category,
-        notes=payload.notes,
-        paid_by_id=payload.paid_by_id,
-        account_id=payload.account_id,
-        recurrence_rule_id=payload.recurrence_rule_id,
-    )
+@router.get("/search", response_model=schemas.ExpenseSearchPage)
+def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    db: Session = Depends(get_db),
+    filters: dict[str, object] = Depends(expense_filters),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    return search_expenses(db, q, filters, limit, offset)
 
-    for split_payload in payload.splits:
-        expense.splits.append(
-            models.ExpenseSplit(
-                person_id=split_payload.person_id,
-                percentage=split_payload.percentage,
-                amount=0,
-            )
-        )
 
-    if not expense.splits:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ao menos um rateio é obrigatório")
+@router.post("/", response_model=schemas.ExpenseRead, status_code=status.HTTP_201_CREATED)
+def create_expense(payload: schemas.ExpenseCreate, db: Session = Depends(get_db)):
+    try:
+        expense = build_expense(payload)
+    except ExpenseError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
 
-    apply_split(amount, expense.splits)
+    delta = LedgerDelta()
+    delta.add_expense(expense)
 
     db.add(expense)
+    delta.apply(db)
     db.commit()
     db.refresh(expense)
     return expense
 
 
+@router.post("/batch", response_model=schemas.ExpenseBatchResponse)
+def batch_expenses(payload: schemas.ExpenseBatchRequest, response: Response, db: Session = Depends(get_db)):
+    result = ExpenseBatch(db, payload.operations, payload.mode).run()
+    if not result["committed"]:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+    return result
+
+
+@router.post("/import", response_model=schemas.ExpenseImportReport)
+def import_expenses_file(
+    file: UploadFile = File(...),
+    format: str | None = Query(None, regex=f"^({'|'.join(IMPORT_FORMATS)})$"),
+    chunk_size: int | None = Query(None, ge=1, le=50_000),
+    # Always a sync session, so even with DATABASE_ASYNC the import (blocking reads of the upload and
+    # CPU work per chunk) runs in the threadpool instead of holding the event loop until it finishes.
+    db: Session = Depends(get_sync_db),
+):
+    file_format = format or detect_format(file.filename, file.content_type)
+    if file_format is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Informe o formato do arquivo (csv ou ndjson)")
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        return import_expenses(db, stream, file_format, chunk_size=chunk_size)
+    finally:
+        stream.detach()
+
+
 @router.get("/{expense_id}", response_model=schemas.ExpenseRead)
 def get_expense(expense_id: int, db: Session = Depends(get_db)):
     expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
@@ -73,30 +160,14 @@ def update_expense(expense_id: int, payload: schemas.ExpenseUpdate, db: Session
     if not expense:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Despesa não encontrada")
 
-    update_data = payload.dict(exclude_unset=True)
-
-    if "splits" in update_data:
-        expense.splits.clear()
-        for split_payload in update_data.pop("splits") or []:
-            expense.splits.append(
-                models.ExpenseSplit(
-                    person_id=split_payload.person_id,
-                    percentage=split_payload.percentage,
-                    amount=0,
-                )
-            )
-
-    if not expense.splits:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ao menos um rateio é obrigatório")
-
-    for key, value in update_data.items():
-        if key == "amount" and value is not None:
-            setattr(expense, key, Decimal(str(value)))
-        else:
-            setattr(expense, key, value)
-
-    apply_split(Decimal(str(expense.amount)), expense.splits)
+    try:
+        validate_expense_update(expense, payload)
+    except ExpenseError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
 
+    delta = LedgerDelta()
+    if apply_expense_update(expense, payload, delta):
+        delta.apply(db)
     db.commit()
     db.refresh(expense)
     return expense
@@ -107,6 +178,9 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db)):
     expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
     if not expense:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Despesa não encontrada")
+    delta = LedgerDelta()
+    delta.add_expense(expense, sign=-1)
+    delta.apply(db)
     db.delete(expense)
     db.commit()
     return None
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
+from ..config import settings
 from ..database import get_db
+from ..instrumentation import InstrumentedRoute
+from ..utils.analytics import delete_person_rollups
+from ..utils.ledger import person_ledger_query, person_ledger_records, rebuild_balances
+from ..utils.queries import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..utils.serialization import FastJSONResponse
 
-router = APIRouter(prefix="/people", tags=["people"])
+router = APIRouter(prefix="/people", tags=["people"], route_class=InstrumentedRoute)
 
 
 @router.get("/", response_model=list[schemas.PersonRead])
@@ -29,6 +35,30 @@ def get_person(person_id: int, db: Session = Depends(get_db)):
     return person
 
 
+@router.get("/{person_id}/ledger", response_model=list[schemas.PersonLedgerEntry])
+def person_ledger(
+    person_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None),
+):
+    if db.get(models.Person, person_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pessoa não encontrada")
+    after = decode_cursor(cursor) if cursor else None
+    rows = db.execute(person_ledger_query(person_id, limit + 1, after)).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(last.date, last.id)
+    records = person_ledger_records(rows)
+    if settings.fast_serialization:
+        return FastJSONResponse(records, headers=headers)
+    response.headers.update(headers)
+    return records
+
+
 @router.put("/{person_id}", response_model=schemas.PersonRead)
 def update_person(person_id: int, payload: schemas.PersonUpdate, db: Session = Depends(get_db)):
     person = db.query(models.Person).filter(models.Person.id == person_id).first()
@@ -46,6 +76,9 @@ def delete_person(person_id: int, db: Session = Depends(get_db)):
     person = db.query(models.Person).filter(models.Person.id == person_id).first()
     if not person:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pessoa não encontrada")
+    delete_person_rollups(db, person_id)
     db.delete(person)
+    db.flush()
+    rebuild_balances(db)
     db.commit()
     return None
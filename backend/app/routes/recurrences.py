@@ -1,17 +1,34 @@
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
+from ..config import settings
 from ..database import get_db
-from ..utils.recurrence import advance_recurrence, fetch_due_recurrences, instantiate_expense_from_template
+from ..instrumentation import InstrumentedRoute
+from ..metrics import RECURRENCE_OCCURRENCES, RECURRENCE_SKIPPED_RULES
+from ..scheduler import read_state
+from ..utils.forecast import build_forecast
+from ..utils.ledger import LedgerDelta
+from ..utils.recurrence import (
+    add_months,
+    advance_recurrence,
+    fetch_templates,
+    generate_due_occurrences,
+    instantiate_expense_from_template,
+)
+from ..utils.serialization import FastJSONResponse, recurrence_records
 
-router = APIRouter(prefix="/recurrences", tags=["recurrences"])
+router = APIRouter(prefix="/recurrences", tags=["recurrences"], route_class=InstrumentedRoute)
+
+MAX_FORECAST_MONTHS = 120
 
 
 @router.get("/", response_model=list[schemas.RecurrenceRuleRead])
 def list_rules(db: Session = Depends(get_db)):
+    if settings.fast_serialization:
+        return FastJSONResponse(recurrence_records(db))
     return db.query(models.RecurrenceRule).order_by(models.RecurrenceRule.next_due_date).all()
 
 
@@ -24,6 +41,34 @@ def create_rule(payload: schemas.RecurrenceRuleCreate, db: Session = Depends(get
     return rule
 
 
+@router.get("/forecast", response_model=schemas.RecurrenceForecast)
+def forecast_recurrences(
+    months: int = Query(12, ge=1, le=MAX_FORECAST_MONTHS),
+    until: date | None = None,
+    include_expenses: bool = False,
+    db: Session = Depends(get_db),
+):
+    # The same limit as ``months``: every date up to the horizon is generated and kept in the series cache.
+    if until is not None and until > add_months(date.today(), MAX_FORECAST_MONTHS):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A previsão pode ir no máximo {MAX_FORECAST_MONTHS} meses à frente",
+        )
+    horizon = until or add_months(date.today(), months)
+    return build_forecast(db, horizon, include_expenses=include_expenses)
+
+
+@router.get("/scheduler", response_model=schemas.SchedulerStatus)
+def scheduler_status(db: Session = Depends(get_db)):
+    state = read_state(db.connection())
+    return schemas.SchedulerStatus(
+        enabled=settings.scheduler_enabled,
+        interval_seconds=settings.scheduler_interval_seconds,
+        leader=state.get("holder"),
+        **{key: value for key, value in state.items() if key not in ("name", "holder")},
+    )
+
+
 @router.put("/{rule_id}", response_model=schemas.RecurrenceRuleRead)
 def update_rule(rule_id: int, payload: schemas.RecurrenceRuleUpdate, db: Session = Depends(get_db)):
     rule = db.query(models.RecurrenceRule).filter(models.RecurrenceRule.id == rule_id).first()
@@ -54,19 +99,18 @@ def generate_occurrence(rule_id: int, reference_date: date | None = None, db: Se
     if not rule.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Regra inativa")
 
-    template = (
-        db.query(models.Expense)
-        .filter(models.Expense.recurrence_rule_id == rule.id)
-        .order_by(models.Expense.date.asc())
-        .first()
-    )
+    template = fetch_templates(db, [rule.id]).get(rule.id)
     if not template:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Não há despesa modelo associada")
 
     due_date = reference_date or rule.next_due_date
     new_expense = instantiate_expense_from_template(db, template, due_date)
     advance_recurrence(rule)
+    delta = LedgerDelta()
+    delta.add_expense(new_expense)
+    delta.apply(db)
     db.commit()
+    RECURRENCE_OCCURRENCES.labels("generate").inc()
     db.refresh(new_expense)
 
     return (
@@ -77,21 +121,14 @@ def generate_occurrence(rule_id: int, reference_date: date | None = None, db: Se
     )
 
 
-@router.post("/run-due", response_model=dict[str, int])
-def generate_due_recurrences(db: Session = Depends(get_db)):
-    due_rules = fetch_due_recurrences(db)
-    created = 0
-    for rule in due_rules:
-        template = (
-            db.query(models.Expense)
-            .filter(models.Expense.recurrence_rule_id == rule.id)
-            .order_by(models.Expense.date.asc())
-            .first()
-        )
-        if not template:
-            continue
-        instantiate_expense_from_template(db, template, rule.next_due_date)
-        advance_recurrence(rule)
-        created += 1
+@router.post("/run-due", response_model=schemas.RecurrenceRunSummary)
+def generate_due_recurrences(
+    reference_date: date | None = None,
+    catch_up: bool = False,
+    db: Session = Depends(get_db),
+):
+    generated, skipped = generate_due_occurrences(db, reference_date, catch_up=catch_up)
     db.commit()
-    return {"generated": created}
+    RECURRENCE_OCCURRENCES.labels("run_due").inc(sum(generated.values()))
+    RECURRENCE_SKIPPED_RULES.inc(len(skipped))
+    return schemas.RecurrenceRunSummary(generated=sum(generated.values()), rules=generated, skipped_rules=skipped)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import schemas
+from ..database import get_db
+from ..instrumentation import InstrumentedRoute
+from ..utils.sync import changes_since
+
+router = APIRouter(prefix="/sync", tags=["sync"], route_class=InstrumentedRoute)
+
+
+@router.get("/", response_model=schemas.SyncResponse)
+def sync(
+    since: int | None = Query(None, ge=0),
+    limit: int = Query(1000, ge=1, le=10_000),
+    snapshot: str | None = Query(None),
+    db: Session = Depends(get_db),
+):
+    return changes_since(db, since, limit, snapshot)
@@ -0,0 +1,213 @@
+"""Background generation of due recurrences, run by a single leader among the workers.
+
+Every worker runs the loop, but only the holder of the lease in ``scheduler_state`` generates. The
+lease is taken and renewed with a conditional UPDATE, so it works across processes (and hosts, on a
+shared database); when the leader dies another worker takes over once the lease expires. The next
+run and the outcome of the last one live in the same row, so any worker can report them.
+
+A run that outlives its lease may overlap with the next leader; the version check on
+``RecurrenceRule.occurrences_generated`` makes the slower of the two roll back instead of
+generating the same due date twice.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, Table, Text, insert, or_, select, update
+from sqlalchemy.engine import Connection
+
+from .config import settings
+from .database import Base, SessionLocal, engine
+from .metrics import RECURRENCE_OCCURRENCES, RECURRENCE_SKIPPED_RULES, SCHEDULER_RUNS
+from .utils.recurrence import generate_due_occurrences
+
+logger = logging.getLogger("rateio.scheduler")
+
+JOB_NAME = "recurrences"
+
+scheduler_state = Table(
+    "scheduler_state",
+    Base.metadata,
+    Column("name", String(50), primary_key=True),
+    Column("holder", String(120)),
+    Column("lease_expires_at", DateTime),
+    Column("next_run_at", DateTime),
+    Column("last_started_at", DateTime),
+    Column("last_finished_at", DateTime),
+    Column("last_duration_ms", Float),
+    Column("last_status", String(20)),
+    Column("last_error", Text),
+    Column("last_generated", Integer),
+    Column("last_attempts", Integer),
+)
+
+
+def seed_scheduler_state(connection: Connection) -> None:
+    if connection.execute(select(scheduler_state.c.name).where(scheduler_state.c.name == JOB_NAME)).first() is None:
+        connection.execute(insert(scheduler_state).values(name=JOB_NAME))
+
+
+def acquire_lease(connection: Connection, holder: str, now: datetime, seconds: float) -> bool:
+    """Take the lease if it is free or expired, or renew it if ``holder`` already has it."""
+    result = connection.execute(
+        update(scheduler_state)
+        .where(
+            scheduler_state.c.name == JOB_NAME,
+            or_(
+                scheduler_state.c.holder == holder,
+                scheduler_state.c.lease_expires_at.is_(None),
+                scheduler_state.c.lease_expires_at < now,
+            ),
+        )
+        .values(holder=holder, lease_expires_at=now + timedelta(seconds=seconds))
+    )
+    return result.rowcount == 1
+
+
+def release_lease(connection: Connection, holder: str) -> None:
+    connection.execute(
+        update(scheduler_state)
+        .where(scheduler_state.c.name == JOB_NAME, scheduler_state.c.holder == holder)
+        .values(holder=None, lease_expires_at=None)
+    )
+
+
+def read_state(connection: Connection) -> dict[str, Any]:
+    row = connection.execute(select(scheduler_state).where(scheduler_state.c.name == JOB_NAME)).mappings().first()
+    return dict(row) if row is not None else {}
+
+
+def run_due_recurrences() -> tuple[int, int]:
+    with SessionLocal() as session:
+        generated, skipped = generate_due_occurrences(session, catch_up=True)
+        session.commit()
+    total = sum(generated.values())
+    RECURRENCE_OCCURRENCES.labels("scheduler").inc(total)
+    RECURRENCE_SKIPPED_RULES.inc(len(skipped))
+    return total, len(skipped)
+
+
+def retry_delay(attempt: int, base: float) -> float:
+    # Exponential backoff with jitter, so workers recovering from the same failure do not retry in step.
+    return base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+class RecurrenceScheduler:
+    def __init__(
+        self,
+        interval: float,
+        lease_seconds: float,
+        max_attempts: int,
+        retry_base: float,
+    ) -> None:
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.heartbeat = lease_seconds / 4
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.loop())
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await asyncio.to_thread(self.release)
+
+    async def loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.tick)
+            except Exception:
+                logger.exception("Falha no agendador de recorrências")
+            await asyncio.sleep(self.heartbeat * random.uniform(0.8, 1.2))
+
+    def renew(self) -> bool:
+        with engine.begin() as connection:
+            return acquire_lease(connection, self.holder, datetime.utcnow(), self.lease_seconds)
+
+    def release(self) -> None:
+        with engine.begin() as connection:
+            release_lease(connection, self.holder)
+
+    def tick(self) -> None:
+        if not self.renew():
+            return
+        with engine.connect() as connection:
+            next_run_at = read_state(connection).get("next_run_at")
+        if next_run_at is None or next_run_at <= datetime.utcnow():
+            self.run()
+
+    def run(self) -> None:
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            connection.execute(
+                update(scheduler_state)
+                .where(scheduler_state.c.name == JOB_NAME)
+                .values(last_started_at=started_at, last_status="running")
+            )
+
+        generated = skipped = 0
+        error: str | None = None
+        attempts = 0
+        while attempts < self.max_attempts:
+            attempts += 1
+            try:
+                generated, skipped = run_due_recurrences()
+                error = None
+                break
+            except Exception as exc:
+                error = f"{exc.__class__.__name__}: {exc}"
+                logger.warning("Geração de recorrências falhou (tentativa %s de %s): %s", attempts, self.max_attempts, error)
+            if attempts < self.max_attempts:
+                time.sleep(retry_delay(attempts, self.retry_base))
+                if not self.renew():
+                    # Another worker took over; it will run on its own schedule.
+                    return
+
+        status = "error" if error else "ok"
+        SCHEDULER_RUNS.labels(status).inc()
+        finished_at = datetime.utcnow()
+        with engine.begin() as connection:
+            connection.execute(
+                update(scheduler_state)
+                .where(scheduler_state.c.name == JOB_NAME)
+                .values(
+                    last_finished_at=finished_at,
+                    last_duration_ms=round((time.perf_counter() - started) * 1000, 2),
+                    last_status=status,
+                    last_error=error,
+                    last_generated=generated,
+                    last_attempts=attempts,
+                    next_run_at=finished_at + timedelta(seconds=self.interval),
+                )
+            )
+        if error is None:
+            logger.info("Recorrências geradas: %s despesa(s), %s regra(s) sem modelo", generated, skipped)
+
+
+def build_scheduler() -> RecurrenceScheduler | None:
+    if not settings.scheduler_enabled:
+        return None
+    return RecurrenceScheduler(
+        interval=settings.scheduler_interval_seconds,
+        lease_seconds=settings.scheduler_lease_seconds,
+        max_attempts=settings.scheduler_max_attempts,
+        retry_base=settings.scheduler_retry_base_seconds,
+    )
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Any, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field, validator
 
@@ -33,6 +33,20 @@ class PersonRead(PersonBase):
         orm_mode = True
 
 
+class PersonLedgerEntry(BaseModel):
+    expense_id: int
+    date: date
+    description: str
+    category: Optional[str]
+    account_id: int
+    paid_by_id: int
+    amount: float
+    paid: float
+    owed: float
+    net: float
+    balance: float
+
+
 class AccountBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -145,6 +159,63 @@ class ExpenseRead(BaseModel):
         orm_mode = True
 
 
+class ExpenseSearchHit(ExpenseRead):
+    rank: Optional[float] = None
+
+
+class ExpenseSearchPage(BaseModel):
+    query: str
+    source: Literal["fts", "like", "none"]
+    items: List[ExpenseSearchHit]
+    next_offset: Optional[int] = None
+
+
+class ExpenseBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: dict[str, Any] = Field(default_factory=dict)
+
+    @validator("id", always=True)
+    def require_id(cls, value, values):
+        if values.get("op") in ("update", "delete") and value is None:
+            raise ValueError("id é obrigatório para update e delete")
+        return value
+
+
+class ExpenseBatchRequest(BaseModel):
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+    operations: List[ExpenseBatchOperation] = Field(..., min_items=1, max_items=1000)
+
+
+class ExpenseBatchResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    expense: Optional[ExpenseRead] = None
+    error: Optional[str] = None
+
+
+class ExpenseBatchResponse(BaseModel):
+    mode: str
+    committed: bool
+    succeeded: int
+    failed: int
+    results: List[ExpenseBatchResult]
+
+
+class ExpenseImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ExpenseImportReport(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    errors: List[ExpenseImportError] = []
+    errors_truncated: bool = False
+
+
 class RecurrenceRuleBase(BaseModel):
     frequency_unit: FrequencyUnit = FrequencyUnit.monthly
     interval: int = Field(1, ge=1)
@@ -175,6 +246,65 @@ class RecurrenceRuleRead(RecurrenceRuleBase):
         orm_mode = True
 
 
+class RecurrenceRunSummary(BaseModel):
+    generated: int
+    rules: dict[int, int]
+    skipped_rules: List[int]
+
+
+class SchedulerStatus(BaseModel):
+    enabled: bool
+    interval_seconds: float
+    leader: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    next_run_at: Optional[datetime] = None
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_duration_ms: Optional[float] = None
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+    last_generated: Optional[int] = None
+    last_attempts: Optional[int] = None
+
+
+class ForecastSplit(BaseModel):
+    person_id: int
+    amount: float
+
+
+class ForecastExpense(BaseModel):
+    rule_id: int
+    date: date
+    description: str
+    amount: float
+    category: Optional[str] = None
+    paid_by_id: int
+    account_id: int
+    splits: List[ForecastSplit]
+
+
+class ForecastObligation(BaseModel):
+    person_id: int
+    paid: float
+    owed: float
+    balance: float
+
+
+class ForecastMonth(BaseModel):
+    month: str
+    total: float
+
+
+class RecurrenceForecast(BaseModel):
+    horizon: date
+    occurrences: int
+    total: float
+    obligations: List[ForecastObligation]
+    months: List[ForecastMonth]
+    expenses: List[ForecastExpense]
+    skipped_rules: List[int]
+
+
 class SettlementSummary(BaseModel):
     payer_id: int
     receiver_id: int
@@ -186,3 +316,41 @@ class DashboardSummary(BaseModel):
     total_paid_by: dict[int, float]
     total_owed_by: dict[int, float]
     settlements: List[SettlementSummary]
+    # Paid minus owed: positive when part of the expenses is owed by nobody (a deleted person's splits).
+    unallocated: float = 0.0
+
+
+class AnalyticsPoint(BaseModel):
+    period: str
+    key: Optional[Union[int, str]]
+    total: float
+    count: int
+
+    class Config:
+        smart_union = True
+
+
+class AnalyticsReport(BaseModel):
+    bucket: str
+    group_by: str
+    source: str
+    points: List[AnalyticsPoint]
+
+
+class SyncDeleted(BaseModel):
+    people: List[int] = []
+    accounts: List[int] = []
+    expenses: List[int] = []
+    recurrences: List[int] = []
+
+
+class SyncResponse(BaseModel):
+    cursor: int
+    full: bool
+    has_more: bool = False
+    snapshot: Optional[str] = None
+    people: List[PersonRead] = []
+    accounts: List[AccountRead] = []
+    expenses: List[ExpenseRead] = []
+    recurrences: List[RecurrenceRuleRead] = []
+    deleted: SyncDeleted = SyncDeleted()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import calendar
+from typing import List
+
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from ..models import Expense, ExpenseSplit, MonthlyRollup, MonthlySplitRollup
+from .money import from_cents
+from .queries import filter_expenses
+
+
+def period_expression(bucket: str, column, dialect: str):
+    if dialect == "sqlite":
+        if bucket == "month":
+            return func.strftime("%Y-%m", column)
+        if bucket == "year":
+            return func.strftime("%Y", column)
+        # Monday of the ISO week: jump to the next Sunday (or stay on it) and go back six days.
+        return func.date(column, "weekday 0", "-6 days")
+    if bucket == "month":
+        return func.to_char(column, "YYYY-MM")
+    if bucket == "year":
+        return func.to_char(column, "YYYY")
+    return func.to_char(func.date_trunc("week", column), "YYYY-MM-DD")
+
+
+def can_use_rollups(bucket: str, filters: dict) -> bool:
+    if bucket == "week" or filters.get("person_id") is not None:
+        return False
+    date_from, date_to = filters.get("date_from"), filters.get("date_to")
+    if date_from is not None and date_from.day != 1:
+        return False
+    if date_to is not None and date_to.day != calendar.monthrange(date_to.year, date_to.month)[1]:
+        return False
+    return True
+
+
+def live_totals(session: Session, bucket: str, group_by: str, filters: dict) -> list[tuple]:
+    period = period_expression(bucket, Expense.date, session.get_bind().dialect.name)
+    if group_by == "person":
+        key = ExpenseSplit.person_id
+        query = select(period, key, func.sum(ExpenseSplit.amount_cents), func.count(ExpenseSplit.id)).join(
+            ExpenseSplit, ExpenseSplit.expense_id == Expense.id
+        )
+        if filters.get("person_id") is not None:
+            # Only the person's own share; the EXISTS filter would correlate against the joined splits.
+            query = query.where(ExpenseSplit.person_id == filters["person_id"])
+            filters = {**filters, "person_id": None}
+    else:
+        key = {
+            "category": func.coalesce(Expense.category, ""),
+            "account": Expense.account_id,
+            "payer": Expense.paid_by_id,
+        }[group_by]
+        query = select(period, key, func.sum(Expense.amount_cents), func.count(Expense.id)).select_from(Expense)
+    query = filter_expenses(query, **filters).group_by(period, key).order_by(period, key)
+    return list(session.execute(query))
+
+
+def rollup_totals(session: Session, bucket: str, group_by: str, filters: dict) -> list[tuple]:
+    model = MonthlySplitRollup if group_by == "person" else MonthlyRollup
+    period = model.month if bucket == "month" else func.substr(model.month, 1, 4)
+    key = {
+        "category": model.category,
+        "account": model.account_id,
+        "payer": model.paid_by_id,
+        "person": getattr(model, "person_id", None),
+    }[group_by]
+    query = select(period, key, func.sum(model.total_cents), func.sum(model.count))
+    if filters.get("account_id") is not None:
+        query = query.where(model.account_id == filters["account_id"])
+    if filters.get("paid_by_id") is not None:
+        query = query.where(model.paid_by_id == filters["paid_by_id"])
+    if filters.get("category") is not None:
+        query = query.where(model.category == filters["category"])
+    if filters.get("date_from") is not None:
+        query = query.where(model.month >= f"{filters['date_from']:%Y-%m}")
+    if filters.get("date_to") is not None:
+        query = query.where(model.month <= f"{filters['date_to']:%Y-%m}")
+    query = query.group_by(period, key).having(func.sum(model.count) > 0).order_by(period, key)
+    return list(session.execute(query))
+
+
+def expense_totals(
+    session: Session,
+    bucket: str,
+    group_by: str,
+    filters: dict,
+    use_rollups: bool = True,
+) -> dict:
+    source = "rollup" if use_rollups and can_use_rollups(bucket, filters) else "live"
+    rows = (rollup_totals if source == "rollup" else live_totals)(session, bucket, group_by, filters)
+    points = [
+        {
+            "period": period,
+            "key": (key or None) if group_by == "category" else key,
+            "total": from_cents(int(total or 0)),
+            "count": int(count),
+        }
+        for period, key, total, count in rows
+    ]
+    return {"bucket": bucket, "group_by": group_by, "source": source, "points": points}
+
+
+ROLLUP_COLUMNS = ["month", "account_id", "paid_by_id", "category", "total_cents", "count"]
+SPLIT_ROLLUP_COLUMNS = ["month", "account_id", "paid_by_id", "category", "person_id", "total_cents", "count"]
+
+
+def expected_rollups(session: Session):
+    month = period_expression("month", Expense.date, session.get_bind().dialect.name)
+    category = func.coalesce(Expense.category, "")
+    rollups = select(
+        month, Expense.account_id, Expense.paid_by_id, category, func.sum(Expense.amount_cents), func.count(Expense.id)
+    ).group_by(month, Expense.account_id, Expense.paid_by_id, category)
+    split_rollups = (
+        select(
+            month,
+            Expense.account_id,
+            Expense.paid_by_id,
+            category,
+            ExpenseSplit.person_id,
+            func.sum(ExpenseSplit.amount_cents),
+            func.count(ExpenseSplit.id),
+        )
+        .join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)
+        .group_by(month, Expense.account_id, Expense.paid_by_id, category, ExpenseSplit.person_id)
+    )
+    return rollups, split_rollups
+
+
+def rebuild_rollups(session: Session) -> int:
+    rollups, split_rollups = expected_rollups(session)
+    session.execute(delete(MonthlyRollup))
+    session.execute(delete(MonthlySplitRollup))
+    session.execute(insert(MonthlyRollup).from_select(ROLLUP_COLUMNS, rollups))
+    session.execute(insert(MonthlySplitRollup).from_select(SPLIT_ROLLUP_COLUMNS, split_rollups))
+    return session.scalar(select(func.count()).select_from(MonthlyRollup)) or 0
+
+
+def delete_person_rollups(session: Session, person_id: int) -> None:
+    session.execute(delete(MonthlyRollup).where(MonthlyRollup.paid_by_id == person_id))
+    session.execute(
+        delete(MonthlySplitRollup).where(
+            or_(MonthlySplitRollup.paid_by_id == person_id, MonthlySplitRollup.person_id == person_id)
+        )
+    )
+
+
+def delete_account_rollups(session: Session, account_id: int) -> None:
+    session.execute(delete(MonthlyRollup).where(MonthlyRollup.account_id == account_id))
+    session.execute(delete(MonthlySplitRollup).where(MonthlySplitRollup.account_id == account_id))
+
+
+def verify_rollups(session: Session) -> List[str]:
+    """Return the months whose stored rollups disagree with the expenses."""
+    drifted: set[str] = set()
+    for model, columns, expected_query in zip(
+        (MonthlyRollup, MonthlySplitRollup), (ROLLUP_COLUMNS, SPLIT_ROLLUP_COLUMNS), expected_rollups(session)
+    ):
+        expected = {tuple(row[:-2]): _rollup_values(row[-2], row[-1]) for row in session.execute(expected_query)}
+        stored = {
+            tuple(row[:-2]): _rollup_values(row[-2], row[-1])
+            for row in session.execute(select(*(getattr(model, column) for column in columns)).where(model.count != 0))
+        }
+        for key in set(expected) | set(stored):
+            if expected.get(key) != stored.get(key):
+                drifted.add(key[0])
+    return sorted(drifted)
+
+
+def _rollup_values(total, count) -> tuple[int, int]:
+    return int(total or 0), int(count)
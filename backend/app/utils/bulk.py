@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Any, List, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..database import record_changes
+from ..models import Expense, ExpenseSplit
+from .ledger import LedgerDelta
+from .money import allocate_cents, percentage_weight
+
+
+def allocate_split_rows(expenses: Sequence[dict[str, Any]], splits: Sequence[Sequence[dict[str, Any]]]) -> None:
+    """Fill ``amount_cents`` on every split row, allocating the whole batch in one call."""
+    offsets = [0]
+    weights: List[int] = []
+    for expense_splits in splits:
+        weights.extend(percentage_weight(split["percentage"]) for split in expense_splits)
+        offsets.append(len(weights))
+    shares = iter(allocate_cents([expense["amount_cents"] for expense in expenses], offsets, weights))
+    for expense_splits in splits:
+        for split in expense_splits:
+            split["amount_cents"] = next(shares)
+
+
+def insert_expenses(
+    session: Session,
+    expenses: Sequence[dict[str, Any]],
+    splits: Sequence[Sequence[dict[str, Any]]],
+    delta: LedgerDelta | None = None,
+) -> List[int]:
+    if not expenses:
+        return []
+    # Auto-assigned primary keys increase in VALUES order, so sorting the returned ids recovers the
+    # parameter order while keeping the insert batched (sort_by_parameter_order degrades to one row
+    # per statement on SQLite).
+    expense_ids = sorted(session.scalars(insert(Expense).returning(Expense.id), list(expenses)))
+    split_rows = [
+        {**split, "expense_id": expense_id}
+        for expense_id, expense_splits in zip(expense_ids, splits)
+        for split in expense_splits
+    ]
+    if split_rows:
+        session.execute(insert(ExpenseSplit), split_rows)
+    record_changes(session, "expenses", expense_ids)
+    if delta is not None:
+        for expense, expense_splits in zip(expenses, splits):
+            delta.add(
+                expense["paid_by_id"],
+                expense["account_id"],
+                expense["date"],
+                expense.get("category"),
+                expense["amount_cents"],
+                ((split["person_id"], split["amount_cents"]) for split in expense_splits),
+            )
+    return expense_ids
@@ -1,103 +1,190 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from decimal import Decimal, ROUND_HALF_UP
+import heapq
+import logging
 from typing import Iterable, List
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from ..models import Expense, ExpenseSplit
+from ..models import ExpenseSplit, PersonBalance
 from ..schemas import DashboardSummary, SettlementSummary
+from .money import from_cents, split_cents
 
+logger = logging.getLogger("rateio.settlements")
 
-def round_currency(value: Decimal) -> Decimal:
-    return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-
-def apply_split(amount: Decimal, splits: Iterable[ExpenseSplit]) -> None:
+def apply_split(amount_cents: int, splits: Iterable[ExpenseSplit]) -> None:
     splits = list(splits)
-    decimal_splits = [Decimal(str(split.percentage)) for split in splits]
-    total_percentage = sum(decimal_splits)
-    if total_percentage == 0:
-        raise ValueError("Soma das porcentagens é zero")
-
-    running_total = Decimal("0.00")
-    for index, split in enumerate(splits):
-        if index == len(splits) - 1:
-            split.amount = round_currency(amount - running_total)
-        else:
-            share = round_currency(amount * decimal_splits[index])
-            split.amount = share
-            running_total += share
-
-
-def calculate_dashboard(session: Session) -> DashboardSummary:
-    expenses = session.query(Expense).all()
+    for split, share in zip(splits, split_cents(amount_cents, [split.percentage for split in splits])):
+        split.amount_cents = share
+
+
+def aggregate_totals(session: Session) -> tuple[int, dict[int, int], dict[int, int]]:
+    rows = (
+        session.query(
+            PersonBalance.person_id,
+            func.sum(PersonBalance.paid_cents),
+            func.sum(PersonBalance.owed_cents),
+            func.sum(PersonBalance.paid_count),
+            func.sum(PersonBalance.owed_count),
+        )
+        .group_by(PersonBalance.person_id)
+        .order_by(PersonBalance.person_id)
+        .all()
+    )
 
-    total_paid_by: defaultdict[int, Decimal] = defaultdict(lambda: Decimal("0.00"))
-    total_owed_by: defaultdict[int, Decimal] = defaultdict(lambda: Decimal("0.00"))
+    total_paid_by: dict[int, int] = {}
+    total_owed_by: dict[int, int] = {}
+    for person_id, paid, owed, paid_count, owed_count in rows:
+        if paid_count:
+            total_paid_by[person_id] = int(paid or 0)
+        if owed_count:
+            total_owed_by[person_id] = int(owed or 0)
+    total_expenses = sum(total_paid_by.values())
+    return total_expenses, total_paid_by, total_owed_by
 
-    total_expenses = Decimal("0.00")
 
-    for expense in expenses:
-        amount = Decimal(expense.amount)
-        total_expenses += amount
-        total_paid_by[expense.paid_by_id] += amount
-        for split in expense.splits:
-            total_owed_by[split.person_id] += Decimal(split.amount)
+def calculate_dashboard(session: Session, exact_settlements: bool = False) -> DashboardSummary:
+    total_expenses, total_paid_by, total_owed_by = aggregate_totals(session)
 
-    settlements = build_settlements(total_paid_by, total_owed_by)
+    settlements = build_settlements(total_paid_by, total_owed_by, exact=exact_settlements)
+    unallocated = total_expenses - sum(total_owed_by.values())
+    if unallocated:
+        logger.warning("Pagamentos e rateios diferem em %s centavos; a diferença foi absorvida no acerto", unallocated)
 
     return DashboardSummary(
-        total_expenses=float(round_currency(total_expenses)),
-        total_paid_by={pid: float(round_currency(total)) for pid, total in total_paid_by.items()},
-        total_owed_by={pid: float(round_currency(total)) for pid, total in total_owed_by.items()},
+        total_expenses=from_cents(total_expenses),
+        total_paid_by={pid: from_cents(total) for pid, total in total_paid_by.items()},
+        total_owed_by={pid: from_cents(total) for pid, total in total_owed_by.items()},
         settlements=[SettlementSummary(**settlement) for settlement in settlements],
+        unallocated=from_cents(unallocated),
     )
 
 
-def build_settlements(total_paid_by: dict[int, Decimal], total_owed_by: dict[int, Decimal]) -> List[dict[str, int | float]]:
-    balances: dict[int, Decimal] = {}
-    person_ids = set(total_paid_by.keys()) | set(total_owed_by.keys())
-    for person_id in person_ids:
-        paid = total_paid_by.get(person_id, Decimal("0.00"))
-        owed = total_owed_by.get(person_id, Decimal("0.00"))
-        balances[person_id] = paid - owed
+EXACT_SETTLEMENT_LIMIT = 15
 
-    receivers = []
-    payers = []
 
-    for person_id, balance in balances.items():
-        if balance > 0:
-            receivers.append([person_id, balance])
-        elif balance < 0:
-            payers.append([person_id, -balance])
-
-    settlements: List[dict[str, int | float]] = []
-    receiver_index = 0
-    payer_index = 0
-
-    while receiver_index < len(receivers) and payer_index < len(payers):
-        receiver_id, receiver_amount = receivers[receiver_index]
-        payer_id, payer_amount = payers[payer_index]
-
-        payment = min(receiver_amount, payer_amount)
-        payment = round_currency(payment)
-
-        settlements.append(
-            {
-                "payer_id": payer_id,
-                "receiver_id": receiver_id,
-                "amount": float(payment),
-            }
-        )
+def net_balances_in_cents(total_paid_by: dict[int, int], total_owed_by: dict[int, int]) -> dict[int, int]:
+    balances: dict[int, int] = {}
+    for person_id in sorted(set(total_paid_by) | set(total_owed_by)):
+        balance = total_paid_by.get(person_id, 0) - total_owed_by.get(person_id, 0)
+        if balance:
+            balances[person_id] = balance
+
+    # The books do not close when part of what was paid is owed by nobody: the splits of a deleted
+    # person go with them, and stored totals can drift. The residue is charged to the largest balance
+    # on the heavier side, so the transfers still close out (the exact settlement needs a zero sum);
+    # calculate_dashboard reports it as ``unallocated``, since it changes that person's settlement.
+    residue = sum(balances.values())
+    if residue:
+        side = [person_id for person_id, balance in balances.items() if (balance > 0) == (residue > 0)]
+        target = max(side, key=lambda person_id: (abs(balances[person_id]), -person_id))
+        balances[target] -= residue
+        if not balances[target]:
+            del balances[target]
+    return balances
 
-        receivers[receiver_index][1] = receiver_amount - payment
-        payers[payer_index][1] = payer_amount - payment
 
-        if receivers[receiver_index][1] <= Decimal("0.00"):
-            receiver_index += 1
-        if payers[payer_index][1] <= Decimal("0.00"):
-            payer_index += 1
+def settle_greedy(balances: dict[int, int]) -> List[tuple[int, int, int]]:
+    transfers: List[tuple[int, int, int]] = []
+    debtors_by_amount: dict[int, List[int]] = {}
+    for person_id, balance in balances.items():
+        if balance < 0:
+            debtors_by_amount.setdefault(-balance, []).append(person_id)
 
-    return settlements
+    creditors: List[tuple[int, int]] = []
+    matched_debtors: set[int] = set()
+    for person_id, balance in balances.items():
+        if balance <= 0:
+            continue
+        candidates = debtors_by_amount.get(balance)
+        if candidates:
+            payer_id = candidates.pop()
+            matched_debtors.add(payer_id)
+            transfers.append((payer_id, person_id, balance))
+        else:
+            creditors.append((-balance, person_id))
+    debtors = [
+        (balance, person_id)
+        for person_id, balance in balances.items()
+        if balance < 0 and person_id not in matched_debtors
+    ]
+
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    while creditors and debtors:
+        credit, receiver_id = heapq.heappop(creditors)
+        debt, payer_id = heapq.heappop(debtors)
+        payment = min(-credit, -debt)
+        transfers.append((payer_id, receiver_id, payment))
+        if credit + payment < 0:
+            heapq.heappush(creditors, (credit + payment, receiver_id))
+        if debt + payment < 0:
+            heapq.heappush(debtors, (debt + payment, payer_id))
+    return transfers
+
+
+def zero_sum_groups(balances: dict[int, int]) -> List[List[int]]:
+    people = list(balances)
+    size = len(people)
+    full = (1 << size) - 1
+    totals = [0] * (full + 1)
+    groups = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        lowest = (mask & -mask).bit_length() - 1
+        totals[mask] = totals[mask & (mask - 1)] + balances[people[lowest]]
+        best = 0
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            best = max(best, groups[mask ^ bit])
+            remaining ^= bit
+        groups[mask] = best + (1 if totals[mask] == 0 else 0)
+
+    order: List[int] = []
+    mask = full
+    while mask:
+        target = groups[mask] - (1 if totals[mask] == 0 else 0)
+        remaining = mask
+        while remaining:
+            bit = remaining & -remaining
+            if groups[mask ^ bit] == target:
+                order.append(bit.bit_length() - 1)
+                mask ^= bit
+                break
+            remaining ^= bit
+
+    result: List[List[int]] = []
+    current: List[int] = []
+    running = 0
+    for index in reversed(order):
+        current.append(people[index])
+        running += balances[people[index]]
+        if running == 0:
+            result.append(current)
+            current = []
+    return result
+
+
+def settle_exact(balances: dict[int, int]) -> List[tuple[int, int, int]]:
+    transfers: List[tuple[int, int, int]] = []
+    for group in zero_sum_groups(balances):
+        transfers.extend(settle_greedy({person_id: balances[person_id] for person_id in group}))
+    return transfers
+
+
+def build_settlements(
+    total_paid_by: dict[int, int],
+    total_owed_by: dict[int, int],
+    exact: bool = False,
+) -> List[dict[str, int | float]]:
+    balances = net_balances_in_cents(total_paid_by, total_owed_by)
+    if exact and len(balances) <= EXACT_SETTLEMENT_LIMIT:
+        transfers = settle_exact(balances)
+    else:
+        transfers = settle_greedy(balances)
+    return [
+        {"payer_id": payer_id, "receiver_id": receiver_id, "amount": from_cents(cents)}
+        for payer_id, receiver_id, cents in transfers
+    ]
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+from typing import Any, List
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from ..models import Account, Expense, ExpenseSplit, Person
+from ..schemas import ExpenseBatchOperation, ExpenseCreate, ExpenseSplitCreate, ExpenseUpdate
+from .calculations import apply_split
+from .importer import format_validation_error
+from .ledger import LedgerDelta
+from .money import split_cents, to_cents
+
+REQUIRED_FIELDS = ("description", "amount", "date", "paid_by_id", "account_id")
+LEDGER_FIELDS = ("amount_cents", "date", "category", "paid_by_id", "account_id")
+
+
+class ExpenseError(Exception):
+    def __init__(self, detail: str, status_code: int = 400) -> None:
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def new_splits(split_payloads: List[ExpenseSplitCreate]) -> List[ExpenseSplit]:
+    return [
+        ExpenseSplit(person_id=split_payload.person_id, percentage=split_payload.percentage, amount_cents=0)
+        for split_payload in split_payloads
+    ]
+
+
+def amount_in_cents(amount: float) -> int:
+    cents = to_cents(amount)
+    if cents <= 0:
+        raise ExpenseError("amount: deve ser de ao menos 0.01")
+    return cents
+
+
+def build_expense(payload: ExpenseCreate) -> Expense:
+    if not payload.splits:
+        raise ExpenseError("Ao menos um rateio é obrigatório")
+    amount_cents = amount_in_cents(payload.amount)
+    expense = Expense(
+        description=payload.description,
+        amount_cents=amount_cents,
+        date=payload.date,
+        category=payload.category,
+        notes=payload.notes,
+        paid_by_id=payload.paid_by_id,
+        account_id=payload.account_id,
+        recurrence_rule_id=payload.recurrence_rule_id,
+    )
+    expense.splits = new_splits(payload.splits)
+    apply_split(amount_cents, expense.splits)
+    return expense
+
+
+def validate_expense_update(expense: Expense, payload: ExpenseUpdate) -> None:
+    """Reject an update before anything on ``expense`` is changed."""
+    if "splits" in payload.__fields_set__:
+        if not payload.splits:
+            raise ExpenseError("Ao menos um rateio é obrigatório")
+    elif "amount" in payload.__fields_set__ and not expense.splits:
+        raise ExpenseError("Ao menos um rateio é obrigatório")
+    for field in REQUIRED_FIELDS:
+        if field in payload.__fields_set__ and getattr(payload, field) is None:
+            raise ExpenseError(f"{field}: não pode ser nulo")
+    if payload.amount is not None:
+        amount_in_cents(payload.amount)
+
+
+def changed_fields(expense: Expense, payload: ExpenseUpdate) -> dict[str, Any]:
+    changes: dict[str, Any] = {}
+    for key, value in payload.dict(exclude_unset=True, exclude={"splits"}).items():
+        if key == "amount":
+            cents = to_cents(value)
+            if cents != expense.amount_cents:
+                changes["amount_cents"] = cents
+        elif value != getattr(expense, key):
+            changes[key] = value
+    return changes
+
+
+def splits_changed(expense: Expense, split_payloads: List[ExpenseSplitCreate] | None) -> bool:
+    if split_payloads is None:
+        return False
+    current = [(split.person_id, split.percentage) for split in expense.splits]
+    return current != [(split_payload.person_id, split_payload.percentage) for split_payload in split_payloads]
+
+
+def sync_splits(expense: Expense, split_payloads: List[ExpenseSplitCreate]) -> None:
+    """Match the new splits to the stored ones by person, so only changed rows are written."""
+    existing = {split.person_id: split for split in expense.splits}
+    splits: List[ExpenseSplit] = []
+    for split_payload in split_payloads:
+        split = existing.pop(split_payload.person_id, None)
+        if split is None:
+            split = ExpenseSplit(person_id=split_payload.person_id, percentage=split_payload.percentage, amount_cents=0)
+        elif split.percentage != split_payload.percentage:
+            split.percentage = split_payload.percentage
+        splits.append(split)
+    expense.splits = splits
+
+
+def reallocate_splits(expense: Expense) -> None:
+    shares = split_cents(expense.amount_cents, [split.percentage for split in expense.splits])
+    for split, share in zip(expense.splits, shares):
+        if split.amount_cents != share:
+            split.amount_cents = share
+
+
+def apply_expense_update(expense: Expense, payload: ExpenseUpdate, delta: LedgerDelta | None = None) -> bool:
+    """Apply only the fields that actually change; returns whether the ledger was affected.
+
+    Splits are recomputed only when the amount or the split list changes, and the
+    expense is recorded in ``delta`` (before and after) only in that case or when
+    another field the ledger is keyed on changes. In that case the expense version is
+    bumped too, so a concurrent update computed from the same old state fails on flush.
+    """
+    changes = changed_fields(expense, payload)
+    split_payloads = payload.splits if "splits" in payload.__fields_set__ else None
+    resplit = splits_changed(expense, split_payloads)
+    affects_ledger = resplit or any(key in LEDGER_FIELDS for key in changes)
+    if affects_ledger:
+        expense.version += 1
+        if delta is not None:
+            delta.add_expense(expense, sign=-1)
+
+    for key, value in changes.items():
+        setattr(expense, key, value)
+    if resplit:
+        sync_splits(expense, split_payloads)
+    if resplit or "amount_cents" in changes:
+        reallocate_splits(expense)
+
+    if affects_ledger and delta is not None:
+        delta.add_expense(expense)
+    return affects_ledger
+
+
+class ExpenseBatch:
+    """Apply a list of create/update/delete operations in one transaction.
+
+    Every operation is validated before it touches the session, so in
+    best-effort mode a failed operation leaves nothing behind and the rest can
+    still be committed together.
+    """
+
+    def __init__(self, session: Session, operations: List[ExpenseBatchOperation], mode: str) -> None:
+        self.session = session
+        self.operations = operations
+        self.mode = mode
+        self.delta = LedgerDelta()
+        self.person_ids = set(session.scalars(select(Person.id)))
+        self.account_ids = set(session.scalars(select(Account.id)))
+        target_ids = {operation.id for operation in operations if operation.op != "create"}
+        self.expenses: dict[int, Expense] = {}
+        if target_ids:
+            self.expenses = {
+                expense.id: expense
+                for expense in session.query(Expense)
+                .filter(Expense.id.in_(target_ids))
+                .options(selectinload(Expense.splits))
+            }
+
+    def check_references(self, paid_by_id: int | None, account_id: int | None, splits) -> None:
+        if account_id is not None and account_id not in self.account_ids:
+            raise ExpenseError("Conta não encontrada")
+        if paid_by_id is not None and paid_by_id not in self.person_ids:
+            raise ExpenseError("Pessoa pagadora não encontrada")
+        for split_payload in splits or []:
+            if split_payload.person_id not in self.person_ids:
+                raise ExpenseError(f"Pessoa {split_payload.person_id} do rateio não encontrada")
+
+    def target(self, expense_id: int) -> Expense:
+        expense = self.expenses.get(expense_id)
+        if expense is None:
+            raise ExpenseError("Despesa não encontrada", status_code=404)
+        return expense
+
+    def create(self, data: dict[str, Any]) -> Expense:
+        payload = parse(ExpenseCreate, data)
+        self.check_references(payload.paid_by_id, payload.account_id, payload.splits)
+        expense = build_expense(payload)
+        self.session.add(expense)
+        self.delta.add_expense(expense)
+        return expense
+
+    def update(self, expense_id: int, data: dict[str, Any]) -> Expense:
+        expense = self.target(expense_id)
+        payload = parse(ExpenseUpdate, data)
+        self.check_references(payload.paid_by_id, payload.account_id, payload.splits)
+        validate_expense_update(expense, payload)
+        apply_expense_update(expense, payload, self.delta)
+        return expense
+
+    def delete(self, expense_id: int) -> None:
+        expense = self.target(expense_id)
+        self.delta.add_expense(expense, sign=-1)
+        self.session.delete(expense)
+        del self.expenses[expense_id]
+
+    def run(self) -> dict[str, Any]:
+        results: List[dict[str, Any]] = []
+        touched: List[tuple[dict[str, Any], Expense]] = []
+        for index, operation in enumerate(self.operations):
+            result: dict[str, Any] = {"index": index, "op": operation.op, "id": operation.id}
+            try:
+                if operation.op == "create":
+                    touched.append((result, self.create(operation.data)))
+                    result["status"] = 201
+                elif operation.op == "update":
+                    touched.append((result, self.update(operation.id, operation.data)))
+                    result["status"] = 200
+                else:
+                    self.delete(operation.id)
+                    result["status"] = 204
+            except ExpenseError as exc:
+                result.update(status=exc.status_code, error=exc.detail)
+            results.append(result)
+
+        failed = sum(1 for result in results if result.get("error"))
+        committed = not (failed and self.mode == "all_or_nothing")
+        if committed:
+            self.delta.apply(self.session)
+            self.session.flush()
+            ids = [expense.id for _, expense in touched]
+            self.session.commit()
+            reloaded = self.reload(ids)
+            for result, expense_id in zip((result for result, _ in touched), ids):
+                result["id"] = expense_id
+                result["expense"] = reloaded.get(expense_id)
+        else:
+            self.session.rollback()
+            for result in results:
+                if not result.get("error"):
+                    result.update(status=424, error="Não aplicada: outra operação do lote falhou")
+        return {
+            "mode": self.mode,
+            "committed": committed,
+            "succeeded": len(results) - failed if committed else 0,
+            "failed": failed,
+            "results": results,
+        }
+
+    def reload(self, ids: List[int]) -> dict[int, Expense]:
+        if not ids:
+            return {}
+        expenses = (
+            self.session.query(Expense)
+            .filter(Expense.id.in_(ids))
+            .options(selectinload(Expense.splits))
+            .populate_existing()
+        )
+        return {expense.id: expense for expense in expenses}
+
+
+def parse(model, data: dict[str, Any]):
+    try:
+        return model.parse_obj(data)
+    except ValidationError as exc:
+        raise ExpenseError(format_validation_error(exc), status_code=422)
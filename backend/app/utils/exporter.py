@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Iterator, List
+
+from sqlalchemy import func, select
+
+from ..database import SessionLocal
+from ..models import Expense, ExpenseSplit
+from .money import format_cents, from_cents
+from .queries import filter_expenses
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+EXPENSE_COLUMNS = (
+    "id",
+    "description",
+    "amount",
+    "date",
+    "category",
+    "notes",
+    "paid_by_id",
+    "account_id",
+    "recurrence_rule_id",
+    "created_at",
+)
+# Amounts are exported in reais, like the API; the column is read in cents and converted per row.
+AMOUNT_INDEX = EXPENSE_COLUMNS.index("amount")
+YIELD_PER = 1000
+FLUSH_EVERY = 500
+
+
+def iter_expense_rows(session, filters: dict[str, Any]) -> Iterator[tuple[tuple, List[tuple]]]:
+    expense_ids = filter_expenses(select(Expense.id), **filters).subquery()
+    statement = (
+        select(
+            *(Expense.amount_cents if column == "amount" else getattr(Expense, column) for column in EXPENSE_COLUMNS),
+            ExpenseSplit.person_id,
+            ExpenseSplit.percentage,
+            ExpenseSplit.amount_cents,
+        )
+        .join(expense_ids, expense_ids.c.id == Expense.id)
+        .outerjoin(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)
+        .order_by(Expense.date.desc(), Expense.id.desc(), ExpenseSplit.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    current: tuple | None = None
+    splits: List[tuple] = []
+    width = len(EXPENSE_COLUMNS)
+    for row in session.execute(statement):
+        expense, split = tuple(row[:width]), tuple(row[width:])
+        if current is not None and expense[0] != current[0]:
+            yield current, splits
+            splits = []
+        current = expense
+        if split[0] is not None:
+            splits.append(split)
+    if current is not None:
+        yield current, splits
+
+
+def max_split_count(session, filters: dict[str, Any]) -> int:
+    expense_ids = filter_expenses(select(Expense.id), **filters).subquery()
+    counts = (
+        select(func.count(ExpenseSplit.id).label("total"))
+        .join(expense_ids, expense_ids.c.id == ExpenseSplit.expense_id)
+        .group_by(ExpenseSplit.expense_id)
+        .subquery()
+    )
+    return session.scalar(select(func.max(counts.c.total))) or 0
+
+
+def _isoformat(value: Any) -> Any:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def stream_csv(session, filters: dict[str, Any]) -> Iterator[bytes]:
+    split_columns = max_split_count(session, filters)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = list(EXPENSE_COLUMNS)
+    for index in range(1, split_columns + 1):
+        header += [f"split_{index}_person_id", f"split_{index}_percentage", f"split_{index}_amount"]
+    writer.writerow(header)
+    for position, (expense, splits) in enumerate(iter_expense_rows(session, filters), start=1):
+        row = [_isoformat(value) if value is not None else "" for value in expense]
+        row[AMOUNT_INDEX] = format_cents(expense[AMOUNT_INDEX])
+        for person_id, percentage, amount_cents in splits:
+            row += [person_id, percentage, format_cents(amount_cents)]
+        writer.writerow(row)
+        if position % FLUSH_EVERY == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def stream_ndjson(session, filters: dict[str, Any]) -> Iterator[bytes]:
+    lines: List[str] = []
+    for expense, splits in iter_expense_rows(session, filters):
+        record = {column: _isoformat(value) for column, value in zip(EXPENSE_COLUMNS, expense)}
+        record["amount"] = from_cents(record["amount"])
+        record["splits"] = [
+            {"person_id": person_id, "percentage": percentage, "amount": from_cents(amount_cents)}
+            for person_id, percentage, amount_cents in splits
+        ]
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= FLUSH_EVERY:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def stream_expenses(file_format: str, filters: dict[str, Any]) -> Iterator[bytes]:
+    # Dependencies are torn down before a StreamingResponse body is sent, so the export owns its session.
+    with SessionLocal() as session:
+        if file_format == "csv":
+            yield from stream_csv(session, filters)
+        elif file_format == "ndjson":
+            yield from stream_ndjson(session, filters)
+        else:
+            raise ValueError("Formato desconhecido")
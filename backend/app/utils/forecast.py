@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterator, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import Expense, ExpenseSplit, FrequencyUnit, RecurrenceRule
+from .money import from_cents
+from .recurrence import step_due_date, template_ids
+
+SERIES_CACHE_SIZE = 4096
+SERIES_CHUNK = 64
+
+
+class DateSeries:
+    """Due dates of one rule, generated on demand and kept for later horizons.
+
+    Alongside the dates it keeps run-length month buckets, so aggregating a
+    horizon costs one step per month instead of one per occurrence.
+    """
+
+    def __init__(self, frequency_unit: FrequencyUnit, interval: int, first_due: date, remaining: int | None) -> None:
+        self.frequency_unit = frequency_unit
+        self.interval = interval
+        self.remaining = remaining
+        self.dates: List[date] = []
+        self.month_keys: List[int] = []
+        self.month_ends: List[int] = []
+        self._next = first_due
+        self._exhausted = remaining is not None and remaining <= 0
+
+    def count_until(self, horizon: date) -> int:
+        while not self._exhausted and self._next <= horizon:
+            self._extend()
+        return bisect_right(self.dates, horizon)
+
+    def until(self, horizon: date) -> List[date]:
+        return self.dates[: self.count_until(horizon)]
+
+    def month_counts(self, count: int) -> Iterator[tuple[int, int]]:
+        start = 0
+        for key, end in zip(self.month_keys, self.month_ends):
+            if start >= count:
+                return
+            yield key, min(end, count) - start
+            start = end
+
+    def _extend(self) -> None:
+        for _ in range(SERIES_CHUNK):
+            if self.remaining is not None and len(self.dates) >= self.remaining:
+                self._exhausted = True
+                return
+            due_date = self._next
+            self.dates.append(due_date)
+            key = due_date.year * 12 + due_date.month - 1
+            if self.month_keys and self.month_keys[-1] == key:
+                self.month_ends[-1] += 1
+            else:
+                self.month_keys.append(key)
+                self.month_ends.append(len(self.dates))
+            self._next = step_due_date(self.frequency_unit, self.interval, due_date)
+
+
+def rule_state(rule) -> tuple:
+    return (
+        rule.frequency_unit,
+        rule.interval,
+        rule.next_due_date,
+        rule.occurrences_generated,
+        rule.total_occurrences,
+        rule.is_active,
+    )
+
+
+_series_cache: OrderedDict[int, tuple[tuple, DateSeries]] = OrderedDict()
+_series_lock = threading.Lock()
+
+
+def series_for(rule) -> DateSeries:
+    """Memoized date series of ``rule``, rebuilt whenever its schedule changes."""
+    state = rule_state(rule)
+    with _series_lock:
+        cached = _series_cache.get(rule.id)
+        if cached is None or cached[0] != state:
+            remaining = None
+            if rule.total_occurrences:
+                remaining = rule.total_occurrences - (rule.occurrences_generated or 0)
+            cached = (state, DateSeries(rule.frequency_unit, rule.interval, rule.next_due_date, remaining))
+            _series_cache[rule.id] = cached
+            while len(_series_cache) > SERIES_CACHE_SIZE:
+                _series_cache.popitem(last=False)
+        else:
+            _series_cache.move_to_end(rule.id)
+        return cached[1]
+
+
+@dataclass
+class RuleProjection:
+    rule_id: int
+    description: str
+    category: str | None
+    paid_by_id: int
+    account_id: int
+    amount_cents: int
+    split_cents: List[tuple[int, int]]
+    series: DateSeries
+    count: int
+
+
+def fetch_template_rows(session: Session, rule_ids: List[int]) -> dict[int, tuple]:
+    if not rule_ids:
+        return {}
+    ids = template_ids(rule_ids)
+    templates = session.execute(
+        select(
+            Expense.id,
+            Expense.recurrence_rule_id,
+            Expense.description,
+            Expense.category,
+            Expense.paid_by_id,
+            Expense.account_id,
+            Expense.amount_cents,
+        )
+        .join(ids, ids.c.id == Expense.id)
+    ).all()
+    splits: defaultdict[int, List[tuple[int, int]]] = defaultdict(list)
+    for expense_id, person_id, amount_cents in session.execute(
+        select(ExpenseSplit.expense_id, ExpenseSplit.person_id, ExpenseSplit.amount_cents)
+        .where(ExpenseSplit.expense_id.in_([template.id for template in templates]))
+        .order_by(ExpenseSplit.expense_id, ExpenseSplit.id)
+    ):
+        splits[expense_id].append((person_id, amount_cents))
+    return {template.recurrence_rule_id: (template, splits[template.id]) for template in templates}
+
+
+def project_rules(session: Session, horizon: date) -> tuple[List[RuleProjection], List[int]]:
+    rules = session.execute(
+        select(
+            RecurrenceRule.id,
+            RecurrenceRule.frequency_unit,
+            RecurrenceRule.interval,
+            RecurrenceRule.next_due_date,
+            RecurrenceRule.occurrences_generated,
+            RecurrenceRule.total_occurrences,
+            RecurrenceRule.is_active,
+        )
+        .where(RecurrenceRule.is_active.is_(True), RecurrenceRule.next_due_date <= horizon)
+        .order_by(RecurrenceRule.id)
+    ).all()
+    templates = fetch_template_rows(session, [rule.id for rule in rules])
+    projections: List[RuleProjection] = []
+    skipped: List[int] = []
+    for rule in rules:
+        if rule.id not in templates:
+            skipped.append(rule.id)
+            continue
+        template, split_cents = templates[rule.id]
+        series = series_for(rule)
+        with _series_lock:
+            count = series.count_until(horizon)
+        if not count:
+            continue
+        projections.append(
+            RuleProjection(
+                rule_id=rule.id,
+                description=template.description,
+                category=template.category,
+                paid_by_id=template.paid_by_id,
+                account_id=template.account_id,
+                amount_cents=template.amount_cents,
+                split_cents=split_cents,
+                series=series,
+                count=count,
+            )
+        )
+    return projections, skipped
+
+
+def build_forecast(session: Session, horizon: date, include_expenses: bool = False) -> dict:
+    """Project every active rule up to ``horizon`` without writing anything."""
+    projections, skipped = project_rules(session, horizon)
+    paid: defaultdict[int, int] = defaultdict(int)
+    owed: defaultdict[int, int] = defaultdict(int)
+    months: defaultdict[int, int] = defaultdict(int)
+    total = 0
+    occurrences = 0
+    expenses: List[dict] = []
+
+    for projection in projections:
+        count = projection.count
+        occurrences += count
+        total += projection.amount_cents * count
+        paid[projection.paid_by_id] += projection.amount_cents * count
+        for person_id, cents in projection.split_cents:
+            owed[person_id] += cents * count
+        for month, month_count in projection.series.month_counts(count):
+            months[month] += projection.amount_cents * month_count
+        if include_expenses:
+            splits = [{"person_id": person_id, "amount": from_cents(cents)} for person_id, cents in projection.split_cents]
+            expenses.extend(
+                {
+                    "rule_id": projection.rule_id,
+                    "date": due_date,
+                    "description": projection.description,
+                    "amount": from_cents(projection.amount_cents),
+                    "category": projection.category,
+                    "paid_by_id": projection.paid_by_id,
+                    "account_id": projection.account_id,
+                    "splits": splits,
+                }
+                for due_date in projection.series.dates[:count]
+            )
+
+    expenses.sort(key=lambda expense: (expense["date"], expense["rule_id"]))
+    return {
+        "horizon": horizon,
+        "occurrences": occurrences,
+        "total": from_cents(total),
+        "obligations": [
+            {
+                "person_id": person_id,
+                "paid": from_cents(paid.get(person_id, 0)),
+                "owed": from_cents(owed.get(person_id, 0)),
+                "balance": from_cents(paid.get(person_id, 0) - owed.get(person_id, 0)),
+            }
+            for person_id in sorted(set(paid) | set(owed))
+        ],
+        "months": [
+            {"month": f"{month // 12:04d}-{month % 12 + 1:02d}", "total": from_cents(cents)}
+            for month, cents in sorted(months.items())
+        ],
+        "expenses": expenses,
+        "skipped_rules": skipped,
+    }
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import csv
+import json
+import re
+from typing import Any, Iterable, Iterator, List, TextIO
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Account, Person
+from ..schemas import ExpenseCreate, ExpenseImportError, ExpenseImportReport
+from .bulk import allocate_split_rows, insert_expenses
+from .ledger import LedgerDelta
+from .money import percentage_weight, to_cents
+
+IMPORT_FORMATS = ("csv", "ndjson")
+SPLIT_COLUMN = re.compile(r"^split_(\d+)_(person_id|percentage)$")
+
+
+class RowError(Exception):
+    pass
+
+
+def detect_format(filename: str | None, content_type: str | None = None) -> str | None:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+
+def iter_csv_rows(stream: TextIO) -> Iterator[tuple[int, dict[str, Any] | RowError]]:
+    reader = csv.DictReader(stream)
+    for row_number, raw in enumerate(reader, start=1):
+        row: dict[str, Any] = {}
+        splits: dict[int, dict[str, str]] = {}
+        for column, value in raw.items():
+            if column is None:
+                continue
+            value = value.strip() if isinstance(value, str) else value
+            if value in ("", None):
+                continue
+            match = SPLIT_COLUMN.match(column.strip())
+            if match:
+                splits.setdefault(int(match.group(1)), {})[match.group(2)] = value
+            else:
+                row[column.strip()] = value
+        if splits:
+            row["splits"] = [splits[index] for index in sorted(splits)]
+        yield row_number, row
+
+
+def iter_ndjson_rows(stream: TextIO) -> Iterator[tuple[int, dict[str, Any] | RowError]]:
+    row_number = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield row_number, RowError(f"JSON inválido: {exc}")
+            continue
+        if not isinstance(row, dict):
+            yield row_number, RowError("Cada linha deve ser um objeto JSON")
+            continue
+        yield row_number, row
+
+
+def iter_rows(stream: TextIO, file_format: str) -> Iterator[tuple[int, dict[str, Any] | RowError]]:
+    if file_format == "csv":
+        return iter_csv_rows(stream)
+    if file_format == "ndjson":
+        return iter_ndjson_rows(stream)
+    raise ValueError("Formato desconhecido")
+
+
+def format_validation_error(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors())
+
+
+class ExpenseImporter:
+    def __init__(self, session: Session, chunk_size: int | None = None, max_errors: int | None = None) -> None:
+        self.session = session
+        self.chunk_size = chunk_size or settings.import_chunk_size
+        self.max_errors = settings.import_max_errors if max_errors is None else max_errors
+        self.report = ExpenseImportReport()
+        self.person_ids = set(session.scalars(select(Person.id)))
+        self.account_defaults = {
+            account_id: (split_fernando, split_spouse)
+            for account_id, split_fernando, split_spouse in session.execute(
+                select(Account.id, Account.default_split_fernando, Account.default_split_spouse)
+            )
+        }
+        self._rows: List[int] = []
+        self._expenses: List[dict[str, Any]] = []
+        self._splits: List[List[dict[str, Any]]] = []
+
+    def add_error(self, row_number: int, message: str) -> None:
+        self.report.failed += 1
+        if len(self.report.errors) < self.max_errors:
+            self.report.errors.append(ExpenseImportError(row=row_number, error=message))
+        else:
+            self.report.errors_truncated = True
+
+    def default_splits(self, account_id: Any) -> List[dict[str, Any]]:
+        try:
+            split_fernando, split_spouse = self.account_defaults[int(account_id)]
+        except (KeyError, TypeError, ValueError):
+            raise RowError("Conta não encontrada")
+        return [
+            {"person_id": settings.fernando_person_id, "percentage": split_fernando},
+            {"person_id": settings.spouse_person_id, "percentage": split_spouse},
+        ]
+
+    def prepare(self, row: dict[str, Any]) -> tuple[dict[str, Any], List[dict[str, Any]]]:
+        if not row.get("splits"):
+            row = {**row, "splits": self.default_splits(row.get("account_id"))}
+        try:
+            payload = ExpenseCreate(**row)
+        except ValidationError as exc:
+            raise RowError(format_validation_error(exc))
+
+        if payload.account_id not in self.account_defaults:
+            raise RowError("Conta não encontrada")
+        if payload.paid_by_id not in self.person_ids:
+            raise RowError("Pessoa pagadora não encontrada")
+        for split_payload in payload.splits:
+            if split_payload.person_id not in self.person_ids:
+                raise RowError(f"Pessoa {split_payload.person_id} do rateio não encontrada")
+        if not payload.splits:
+            raise RowError("Ao menos um rateio é obrigatório")
+
+        amount_cents = to_cents(payload.amount)
+        if amount_cents <= 0:
+            raise RowError("amount: deve ser de ao menos 0.01")
+        # The split amounts themselves are allocated per chunk in flush().
+        if sum(percentage_weight(item.percentage) for item in payload.splits) <= 0:
+            raise RowError("Soma das porcentagens é zero")
+
+        expense = {
+            "description": payload.description,
+            "amount_cents": amount_cents,
+            "date": payload.date,
+            "category": payload.category,
+            "notes": payload.notes,
+            "paid_by_id": payload.paid_by_id,
+            "account_id": payload.account_id,
+            "recurrence_rule_id": payload.recurrence_rule_id,
+        }
+        return expense, [{"person_id": item.person_id, "percentage": item.percentage} for item in payload.splits]
+
+    def add(self, row_number: int, row: dict[str, Any] | RowError) -> None:
+        try:
+            if isinstance(row, RowError):
+                raise row
+            expense, splits = self.prepare(row)
+        except RowError as exc:
+            self.add_error(row_number, str(exc))
+            return
+        self._rows.append(row_number)
+        self._expenses.append(expense)
+        self._splits.append(splits)
+        if len(self._expenses) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._expenses:
+            return
+        delta = LedgerDelta()
+        allocate_split_rows(self._expenses, self._splits)
+        try:
+            insert_expenses(self.session, self._expenses, self._splits, delta)
+            delta.apply(self.session)
+            self.session.commit()
+            self.report.imported += len(self._expenses)
+        except SQLAlchemyError as exc:
+            self.session.rollback()
+            message = f"Falha ao gravar o lote: {exc.__class__.__name__}"
+            for row_number in self._rows:
+                self.add_error(row_number, message)
+        finally:
+            self._rows.clear()
+            self._expenses.clear()
+            self._splits.clear()
+
+    def run(self, rows: Iterable[tuple[int, dict[str, Any] | RowError]]) -> ExpenseImportReport:
+        for row_number, row in rows:
+            self.add(row_number, row)
+        self.flush()
+        return self.report
+
+
+def import_expenses(
+    session: Session,
+    stream: TextIO,
+    file_format: str,
+    chunk_size: int | None = None,
+    max_errors: int | None = None,
+) -> ExpenseImportReport:
+    importer = ExpenseImporter(session, chunk_size=chunk_size, max_errors=max_errors)
+    return importer.run(iter_rows(stream, file_format))
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Iterable, List, Sequence
+
+from sqlalchemy import ColumnElement, Row, Select, and_, case, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..models import Expense, ExpenseSplit, MonthlyRollup, MonthlySplitRollup, PersonBalance
+from .money import from_cents
+
+
+def rollup_month(value: date) -> str:
+    return f"{value:%Y-%m}"
+
+
+def _rollup_totals() -> list:
+    return [0, 0]
+
+
+class LedgerDelta:
+    """Pending changes (in cents) to the person balances and the monthly rollups, applied in one pass."""
+
+    def __init__(self) -> None:
+        self.paid: defaultdict[tuple[int, int], int] = defaultdict(int)
+        self.owed: defaultdict[tuple[int, int], int] = defaultdict(int)
+        self.paid_count: defaultdict[tuple[int, int], int] = defaultdict(int)
+        self.owed_count: defaultdict[tuple[int, int], int] = defaultdict(int)
+        self.rollups: defaultdict[tuple, list] = defaultdict(_rollup_totals)
+        self.split_rollups: defaultdict[tuple, list] = defaultdict(_rollup_totals)
+
+    def add(
+        self,
+        paid_by_id: int,
+        account_id: int,
+        expense_date: date,
+        category: str | None,
+        amount_cents: int,
+        splits: Iterable[tuple[int, int]],
+        sign: int = 1,
+    ) -> None:
+        key = (paid_by_id, account_id)
+        self.paid[key] += sign * amount_cents
+        self.paid_count[key] += sign
+        rollup_key = (rollup_month(expense_date), account_id, paid_by_id, category or "")
+        rollup = self.rollups[rollup_key]
+        rollup[0] += sign * amount_cents
+        rollup[1] += sign
+        for person_id, split_cents in splits:
+            key = (person_id, account_id)
+            self.owed[key] += sign * split_cents
+            self.owed_count[key] += sign
+            rollup = self.split_rollups[(*rollup_key, person_id)]
+            rollup[0] += sign * split_cents
+            rollup[1] += sign
+
+    def add_expense(self, expense: Expense, sign: int = 1) -> None:
+        self.add(
+            expense.paid_by_id,
+            expense.account_id,
+            expense.date,
+            expense.category,
+            expense.amount_cents,
+            ((split.person_id, split.amount_cents) for split in expense.splits),
+            sign,
+        )
+
+    def apply(self, session: Session) -> None:
+        balance_rows = []
+        for person_id, account_id in sorted(set(self.paid) | set(self.owed)):
+            key = (person_id, account_id)
+            values = {
+                "paid_cents": self.paid.get(key, 0),
+                "owed_cents": self.owed.get(key, 0),
+                "paid_count": self.paid_count.get(key, 0),
+                "owed_count": self.owed_count.get(key, 0),
+            }
+            if any(values.values()):
+                balance_rows.append({"person_id": person_id, "account_id": account_id, **values})
+        upsert_increments(session, PersonBalance, ("person_id", "account_id"), balance_rows)
+        upsert_increments(
+            session,
+            MonthlyRollup,
+            ("month", "account_id", "paid_by_id", "category"),
+            _rollup_rows(("month", "account_id", "paid_by_id", "category"), self.rollups),
+        )
+        upsert_increments(
+            session,
+            MonthlySplitRollup,
+            ("month", "account_id", "paid_by_id", "category", "person_id"),
+            _rollup_rows(("month", "account_id", "paid_by_id", "category", "person_id"), self.split_rollups),
+        )
+        self.paid.clear()
+        self.owed.clear()
+        self.paid_count.clear()
+        self.owed_count.clear()
+        self.rollups.clear()
+        self.split_rollups.clear()
+
+
+def _rollup_rows(key_columns: tuple[str, ...], deltas: dict[tuple, list]) -> List[dict[str, Any]]:
+    return [
+        {**dict(zip(key_columns, key)), "total_cents": total, "count": count}
+        for key, (total, count) in sorted(deltas.items())
+        if total or count
+    ]
+
+
+UPSERT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def upsert_increments(session: Session, model, key_columns: tuple[str, ...], rows: List[dict[str, Any]]) -> None:
+    """Add each row's values to the stored row with the same key, inserting the missing keys.
+
+    One INSERT ... ON CONFLICT DO UPDATE executed with every row as a parameter set, so a delta
+    touching thousands of keys is still a single statement per table. Dialects without that
+    statement fall back to :func:`increment_rows`.
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect not in UPSERT_INSERTS:
+        increment_rows(session, model, key_columns, rows)
+        return
+    table = model.__table__
+    statement = UPSERT_INSERTS[dialect](table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={
+            column: table.c[column] + statement.excluded[column]
+            for column in rows[0]
+            if column not in key_columns
+        },
+    )
+    session.execute(statement, rows)
+
+
+def increment_rows(session: Session, model, key_columns: tuple[str, ...], rows: List[dict[str, Any]]) -> None:
+    """Portable :func:`upsert_increments`: an UPDATE per row, and an INSERT when it matched nothing."""
+    table = model.__table__
+    for row in rows:
+        result = session.execute(
+            update(table)
+            .where(*(table.c[column] == row[column] for column in key_columns))
+            .values({column: table.c[column] + value for column, value in row.items() if column not in key_columns})
+        )
+        if result.rowcount == 0:
+            session.execute(insert(table).values(row))
+
+
+@dataclass
+class BalanceDrift:
+    person_id: int
+    account_id: int
+    expected_paid: int
+    stored_paid: int
+    expected_owed: int
+    stored_owed: int
+
+
+def compute_balances(session: Session) -> dict[tuple[int, int], dict[str, int]]:
+    balances: defaultdict[tuple[int, int], dict[str, int]] = defaultdict(
+        lambda: {"paid_cents": 0, "owed_cents": 0, "paid_count": 0, "owed_count": 0}
+    )
+    paid_rows = session.execute(
+        select(Expense.paid_by_id, Expense.account_id, func.sum(Expense.amount_cents), func.count(Expense.id))
+        .group_by(Expense.paid_by_id, Expense.account_id)
+    )
+    for person_id, account_id, total, count in paid_rows:
+        balances[(person_id, account_id)]["paid_cents"] = int(total or 0)
+        balances[(person_id, account_id)]["paid_count"] = count
+    owed_rows = session.execute(
+        select(ExpenseSplit.person_id, Expense.account_id, func.sum(ExpenseSplit.amount_cents), func.count(ExpenseSplit.id))
+        .join(Expense, Expense.id == ExpenseSplit.expense_id)
+        .group_by(ExpenseSplit.person_id, Expense.account_id)
+    )
+    for person_id, account_id, total, count in owed_rows:
+        balances[(person_id, account_id)]["owed_cents"] = int(total or 0)
+        balances[(person_id, account_id)]["owed_count"] = count
+    return dict(balances)
+
+
+def rebuild_balances(session: Session) -> int:
+    balances = compute_balances(session)
+    session.execute(delete(PersonBalance))
+    if balances:
+        session.execute(
+            insert(PersonBalance),
+            [
+                {"person_id": person_id, "account_id": account_id, **values}
+                for (person_id, account_id), values in sorted(balances.items())
+            ],
+        )
+    return len(balances)
+
+
+def verify_balances(session: Session) -> List[BalanceDrift]:
+    expected = compute_balances(session)
+    stored = {
+        (row.person_id, row.account_id): row
+        for row in session.query(PersonBalance).all()
+    }
+    drifts: List[BalanceDrift] = []
+    for key in sorted(set(expected) | set(stored)):
+        values = expected.get(key, {"paid_cents": 0, "owed_cents": 0})
+        row = stored.get(key)
+        stored_paid = row.paid_cents if row else 0
+        stored_owed = row.owed_cents if row else 0
+        if values["paid_cents"] != stored_paid or values["owed_cents"] != stored_owed:
+            drifts.append(
+                BalanceDrift(
+                    person_id=key[0],
+                    account_id=key[1],
+                    expected_paid=values["paid_cents"],
+                    stored_paid=stored_paid,
+                    expected_owed=values["owed_cents"],
+                    stored_owed=stored_owed,
+                )
+            )
+    return drifts
+
+
+def opening_balance(person_id: int, after: tuple[date, int]) -> ColumnElement[int]:
+    """Balance of ``person_id`` over the expenses up to and including the keyset ``after``.
+
+    The payments walk ``ix_expenses_paid_by_date_id`` and the splits ``ix_expense_splits_person_expense``.
+    """
+    after_date, after_id = after
+    up_to_after = or_(Expense.date < after_date, and_(Expense.date == after_date, Expense.id <= after_id))
+    paid = (
+        select(func.coalesce(func.sum(Expense.amount_cents), 0))
+        .where(Expense.paid_by_id == person_id, Expense.date <= after_date, up_to_after)
+        .scalar_subquery()
+    )
+    owed = (
+        select(func.coalesce(func.sum(ExpenseSplit.amount_cents), 0))
+        .join(Expense, Expense.id == ExpenseSplit.expense_id)
+        .where(ExpenseSplit.person_id == person_id, up_to_after)
+        .scalar_subquery()
+    )
+    return paid - owed
+
+
+def person_ledger_query(person_id: int, limit: int, after: tuple[date, int] | None = None) -> Select:
+    """One page of the expenses ``person_id`` paid or has a split on, oldest first, with the running balance.
+
+    The page is picked by walking ``ix_expenses_date_id`` from the keyset ``after`` (the date and id of
+    the previous page's last entry), so its cost does not depend on how deep it is. The running balance
+    is a window sum over the page, started from the balance of every expense before it, which is summed
+    in the same statement so it always matches the current data.
+    """
+    owed = (
+        select(func.sum(ExpenseSplit.amount_cents))
+        .where(ExpenseSplit.expense_id == Expense.id, ExpenseSplit.person_id == person_id)
+        .scalar_subquery()
+    )
+    has_split = (
+        select(ExpenseSplit.id)
+        .where(ExpenseSplit.expense_id == Expense.id, ExpenseSplit.person_id == person_id)
+        .exists()
+    )
+    page = select(
+        Expense.id,
+        Expense.date,
+        Expense.description,
+        Expense.category,
+        Expense.account_id,
+        Expense.paid_by_id,
+        Expense.amount_cents,
+        case((Expense.paid_by_id == person_id, Expense.amount_cents), else_=0).label("paid_cents"),
+        func.coalesce(owed, 0).label("owed_cents"),
+    ).where(or_(Expense.paid_by_id == person_id, has_split))
+    if after is not None:
+        after_date, after_id = after
+        # The redundant lower bound on date lets the planner start the index scan at the keyset.
+        page = page.where(
+            Expense.date >= after_date,
+            or_(Expense.date > after_date, and_(Expense.date == after_date, Expense.id > after_id)),
+        )
+    page = page.order_by(Expense.date, Expense.id).limit(limit).subquery()
+
+    net = page.c.paid_cents - page.c.owed_cents
+    balance = func.sum(net).over(order_by=(page.c.date, page.c.id), rows=(None, 0))
+    if after is not None:
+        balance = opening_balance(person_id, after) + balance
+    return select(
+        page,
+        net.label("net_cents"),
+        balance.label("balance_cents"),
+    ).order_by(page.c.date, page.c.id)
+
+
+def person_ledger_records(rows: Sequence[Row]) -> List[dict[str, Any]]:
+    """Shape ``person_ledger_query`` rows like ``schemas.PersonLedgerEntry``."""
+    return [
+        {
+            "expense_id": row.id,
+            "date": row.date,
+            "description": row.description,
+            "category": row.category,
+            "account_id": row.account_id,
+            "paid_by_id": row.paid_by_id,
+            "amount": from_cents(row.amount_cents),
+            "paid": from_cents(row.paid_cents),
+            "owed": from_cents(row.owed_cents),
+            "net": from_cents(row.net_cents),
+            "balance": from_cents(row.balance_cents),
+        }
+        for row in rows
+    ]
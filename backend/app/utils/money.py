@@ -0,0 +1,80 @@
+"""Money as integer cents.
+
+Amounts are stored and summed as cents; reais only exist at the edges (API payloads, import and
+export files). Splits are allocated with the largest-remainder method over flat arrays, so a whole
+batch of expenses is split in one pass and a single expense is just a batch of one.
+"""
+from __future__ import annotations
+
+from array import array
+from decimal import ROUND_HALF_UP, Decimal
+from typing import List, NewType, Sequence
+
+Cents = NewType("Cents", int)
+
+# Percentages are resolved to millionths before allocating, so the float inputs never take part in rounding.
+PERCENT_SCALE = 1_000_000
+ONE_CENT = Decimal("0.01")
+
+
+def to_cents(value) -> Cents:
+    """Convert an amount in reais (float, str, Decimal or int) to cents, rounding half up."""
+    if isinstance(value, int):
+        return Cents(value * 100)
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return Cents(int(value.quantize(ONE_CENT, rounding=ROUND_HALF_UP) * 100))
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+def format_cents(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    whole, fraction = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{fraction:02d}"
+
+
+def percentage_weight(percentage: float) -> int:
+    return round(percentage * PERCENT_SCALE)
+
+
+def allocate_cents(amounts: Sequence[int], offsets: Sequence[int], weights: Sequence[int]) -> array:
+    """Split every amount proportionally to its row of weights.
+
+    The weight matrix is ragged and stored row-major in one flat sequence: row ``i`` is
+    ``weights[offsets[i]:offsets[i + 1]]`` (``len(offsets) == len(amounts) + 1``). Each share is
+    the floor of ``amount * weight / row_total``; the cents left over go one each to the shares
+    with the largest remainders, ties to the earlier split. The shares of a row always add up to
+    its amount. Returns the shares aligned with ``weights``.
+    """
+    shares = array("q", bytes(8 * len(weights)))
+    for row, amount in enumerate(amounts):
+        start, end = offsets[row], offsets[row + 1]
+        total = sum(weights[start:end])
+        if total <= 0:
+            raise ValueError("Soma das porcentagens é zero")
+        magnitude = -amount if amount < 0 else amount
+        allocated = 0
+        remainders = []
+        for index in range(start, end):
+            share, remainder = divmod(magnitude * weights[index], total)
+            shares[index] = share
+            allocated += share
+            remainders.append((-remainder, index))
+        leftover = magnitude - allocated
+        if leftover:
+            remainders.sort()
+            for _, index in remainders[:leftover]:
+                shares[index] += 1
+        if amount < 0:
+            for index in range(start, end):
+                shares[index] = -shares[index]
+    return shares
+
+
+def split_cents(amount: int, percentages: Sequence[float]) -> List[int]:
+    """Per-expense entry point; identical to a one-row :func:`allocate_cents`."""
+    weights = [percentage_weight(percentage) for percentage in percentages]
+    return allocate_cents([amount], [0, len(weights)], weights).tolist()
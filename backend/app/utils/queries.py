@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+
+from ..models import Expense, ExpenseSplit
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_token(values: list) -> str:
+    """Opaque, URL-safe form of a small JSON list, for pagination cursors."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str) -> list:
+    """Inverse of :func:`encode_token`; raises ValueError or TypeError for a malformed token."""
+    values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    if not isinstance(values, list):
+        raise ValueError(token)
+    return values
+
+
+def invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+
+
+def encode_cursor(expense_date: date, expense_id: int) -> str:
+    """Keyset cursor for expense lists ordered by (date, id): the date and id of the page's last row."""
+    return encode_token([expense_date.isoformat(), expense_id])
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    """Inverse of :func:`encode_cursor`, or a 400 for a malformed cursor."""
+    try:
+        expense_date, expense_id = decode_token(cursor)
+        return date.fromisoformat(expense_date), int(expense_id)
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+
+
+def filter_expenses(
+    query,
+    account_id: int | None = None,
+    person_id: int | None = None,
+    paid_by_id: int | None = None,
+    category: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+):
+    if account_id is not None:
+        query = query.filter(Expense.account_id == account_id)
+    if person_id is not None:
+        query = query.filter(
+            select(ExpenseSplit.id)
+            .where(ExpenseSplit.expense_id == Expense.id, ExpenseSplit.person_id == person_id)
+            .exists()
+        )
+    if paid_by_id is not None:
+        query = query.filter(Expense.paid_by_id == paid_by_id)
+    if category is not None:
+        query = query.filter(Expense.category == category)
+    if date_from is not None:
+        query = query.filter(Expense.date >= date_from)
+    if date_to is not None:
+        query = query.filter(Expense.date <= date_to)
+    return query
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+from collections import defaultdict
 from datetime import date, timedelta
-from typing import List
+from typing import Iterator, List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Subquery, func, select
+from sqlalchemy.orm import Session, selectinload
 
 from ..models import Expense, ExpenseSplit, FrequencyUnit, RecurrenceRule
+from .bulk import insert_expenses
+from .ledger import LedgerDelta
 
 
 def add_months(base_date: date, months: int) -> date:
@@ -26,18 +30,22 @@ def add_years(base_date: date, years: int) -> date:
         return base_date.replace(month=2, day=28, year=base_date.year + years)
 
 
-def calculate_next_due(rule: RecurrenceRule) -> date:
-    if rule.frequency_unit == FrequencyUnit.daily:
-        return rule.next_due_date + timedelta(days=rule.interval)
-    if rule.frequency_unit == FrequencyUnit.weekly:
-        return rule.next_due_date + timedelta(weeks=rule.interval)
-    if rule.frequency_unit == FrequencyUnit.monthly:
-        return add_months(rule.next_due_date, rule.interval)
-    if rule.frequency_unit == FrequencyUnit.yearly:
-        return add_years(rule.next_due_date, rule.interval)
+def step_due_date(frequency_unit: FrequencyUnit, interval: int, current: date) -> date:
+    if frequency_unit == FrequencyUnit.daily:
+        return current + timedelta(days=interval)
+    if frequency_unit == FrequencyUnit.weekly:
+        return current + timedelta(weeks=interval)
+    if frequency_unit == FrequencyUnit.monthly:
+        return add_months(current, interval)
+    if frequency_unit == FrequencyUnit.yearly:
+        return add_years(current, interval)
     raise ValueError("Frequência desconhecida")
 
 
+def calculate_next_due(rule: RecurrenceRule) -> date:
+    return step_due_date(rule.frequency_unit, rule.interval, rule.next_due_date)
+
+
 def advance_recurrence(rule: RecurrenceRule) -> None:
     rule.occurrences_generated += 1
     if rule.total_occurrences and rule.occurrences_generated >= rule.total_occurrences:
@@ -59,7 +67,7 @@ def fetch_due_recurrences(session: Session, reference: date | None = None) -> Li
 def instantiate_expense_from_template(session: Session, template_expense: Expense, due_date: date) -> Expense:
     expense = Expense(
         description=template_expense.description,
-        amount=template_expense.amount,
+        amount_cents=template_expense.amount_cents,
         date=due_date,
         category=template_expense.category,
         notes=template_expense.notes,
@@ -72,8 +80,102 @@ def instantiate_expense_from_template(session: Session, template_expense: Expens
             ExpenseSplit(
                 person_id=split.person_id,
                 percentage=split.percentage,
-                amount=split.amount,
+                amount_cents=split.amount_cents,
             )
         )
     session.add(expense)
     return expense
+
+
+def iter_due_dates(rule: RecurrenceRule, reference: date, limit: int | None = None) -> Iterator[date]:
+    if not rule.is_active:
+        return
+    due_date = rule.next_due_date
+    generated = rule.occurrences_generated or 0
+    yielded = 0
+    while due_date <= reference:
+        if rule.total_occurrences and generated >= rule.total_occurrences:
+            return
+        if limit is not None and yielded >= limit:
+            return
+        yield due_date
+        generated += 1
+        yielded += 1
+        due_date = step_due_date(rule.frequency_unit, rule.interval, due_date)
+
+
+def template_ids(rule_ids: List[int]) -> Subquery:
+    """Ids of the template expense of each rule: its earliest expense, by date and then id.
+
+    Shared by generation and the forecast, so both always copy the same expense.
+    """
+    ranked = (
+        select(
+            Expense.id,
+            func.row_number()
+            .over(partition_by=Expense.recurrence_rule_id, order_by=(Expense.date.asc(), Expense.id.asc()))
+            .label("position"),
+        )
+        .where(Expense.recurrence_rule_id.in_(rule_ids))
+        .subquery()
+    )
+    return select(ranked.c.id).where(ranked.c.position == 1).subquery()
+
+
+def fetch_templates(session: Session, rule_ids: List[int]) -> dict[int, Expense]:
+    if not rule_ids:
+        return {}
+    ids = template_ids(rule_ids)
+    templates = (
+        session.query(Expense)
+        .join(ids, ids.c.id == Expense.id)
+        .options(selectinload(Expense.splits))
+        .all()
+    )
+    return {template.recurrence_rule_id: template for template in templates}
+
+
+def generate_due_occurrences(
+    session: Session,
+    reference: date | None = None,
+    catch_up: bool = False,
+) -> tuple[dict[int, int], List[int]]:
+    reference = reference or date.today()
+    due_rules = fetch_due_recurrences(session, reference)
+    templates = fetch_templates(session, [rule.id for rule in due_rules])
+
+    expense_rows: List[dict] = []
+    split_rows: List[List[dict]] = []
+    generated: defaultdict[int, int] = defaultdict(int)
+    skipped: List[int] = []
+
+    for rule in due_rules:
+        template = templates.get(rule.id)
+        if template is None:
+            skipped.append(rule.id)
+            continue
+        template_splits = [
+            {"person_id": split.person_id, "percentage": split.percentage, "amount_cents": split.amount_cents}
+            for split in template.splits
+        ]
+        for due_date in iter_due_dates(rule, reference, limit=None if catch_up else 1):
+            expense_rows.append(
+                {
+                    "description": template.description,
+                    "amount_cents": template.amount_cents,
+                    "date": due_date,
+                    "category": template.category,
+                    "notes": template.notes,
+                    "paid_by_id": template.paid_by_id,
+                    "account_id": template.account_id,
+                    "recurrence_rule_id": rule.id,
+                }
+            )
+            split_rows.append(template_splits)
+            advance_recurrence(rule)
+            generated[rule.id] += 1
+
+    delta = LedgerDelta()
+    insert_expenses(session, expense_rows, split_rows, delta)
+    delta.apply(session)
+    return dict(generated), skipped
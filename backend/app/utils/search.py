@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import re
+import time
+from typing import Any, List
+
+from sqlalchemy import column, func, literal_column, or_, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, selectinload
+
+from ..models import Expense
+from ..schemas import ExpenseRead, ExpenseSearchHit, ExpenseSearchPage
+from .queries import filter_expenses
+
+FTS_TABLE = "expenses_fts"
+SEARCH_COLUMNS = ("description", "notes", "category")
+# bm25 weights for description, notes and category: a hit in the description ranks first.
+RANK_WEIGHTS = (10.0, 4.0, 2.0)
+MAX_TERMS = 16
+
+SEARCH_SCHEMA = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description, notes, category,
+        content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, notes, category)
+        VALUES (new.id, new.description, new.notes, new.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, notes, category)
+        VALUES ('delete', old.id, old.description, old.notes, old.category);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description, notes, category ON expenses BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, notes, category)
+        VALUES ('delete', old.id, old.description, old.notes, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, description, notes, category)
+        VALUES (new.id, new.description, new.notes, new.category);
+    END
+    """,
+)
+
+expenses_fts = table(FTS_TABLE, column("rowid"), column(FTS_TABLE))
+
+# Engine URLs whose FTS table is known to exist. A missing table is only remembered for
+# FTS_RECHECK_SECONDS (engine URL -> monotonic time of the check), so a `search rebuild` run by
+# another process is picked up without restarting the workers.
+FTS_RECHECK_SECONDS = 30.0
+_fts_ready: set[str] = set()
+_fts_missing: dict[str, float] = {}
+
+
+def supports_fts(connection: Connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    options = connection.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return "ENABLE_FTS5" in options
+
+
+def create_search_index(connection: Connection) -> bool:
+    """Create the FTS table and its triggers and index the existing expenses.
+
+    Returns ``False`` (and does nothing) when the database has no FTS5, in which
+    case searches fall back to ``LIKE``.
+    """
+    _fts_ready.clear()
+    _fts_missing.clear()
+    if not supports_fts(connection):
+        return False
+    for statement in SEARCH_SCHEMA:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def fts_ready(session: Session) -> bool:
+    bind = session.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    key = str(bind.url)
+    if key in _fts_ready:
+        return True
+    checked_at = _fts_missing.get(key)
+    if checked_at is not None and time.monotonic() - checked_at < FTS_RECHECK_SECONDS:
+        return False
+    exists = session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first() is not None
+    if exists:
+        _fts_ready.add(key)
+        _fts_missing.pop(key, None)
+    else:
+        _fts_missing[key] = time.monotonic()
+    return exists
+
+
+def search_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def match_expression(terms: List[str]) -> str:
+    # Every term is quoted (so FTS operators typed by the user are plain text) and matched as a prefix.
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_expenses(
+    session: Session,
+    query: str,
+    filters: dict[str, Any],
+    limit: int,
+    offset: int = 0,
+) -> ExpenseSearchPage:
+    terms = search_terms(query)
+    if not terms:
+        return ExpenseSearchPage(query=query, source="none", items=[], next_offset=None)
+    if fts_ready(session):
+        source = "fts"
+        rank = func.bm25(literal_column(FTS_TABLE), *RANK_WEIGHTS)
+        statement = (
+            session.query(Expense, rank)
+            .join(expenses_fts, expenses_fts.c.rowid == Expense.id)
+            .filter(literal_column(FTS_TABLE).op("MATCH")(match_expression(terms)))
+            .order_by(rank, Expense.date.desc(), Expense.id.desc())
+        )
+    else:
+        source = "like"
+        statement = session.query(Expense, literal_column("NULL"))
+        for term in terms:
+            pattern = f"%{term}%"
+            statement = statement.filter(
+                or_(*(getattr(Expense, name).ilike(pattern) for name in SEARCH_COLUMNS))
+            )
+        statement = statement.order_by(Expense.date.desc(), Expense.id.desc())
+
+    rows = (
+        filter_expenses(statement, **filters)
+        .options(selectinload(Expense.splits))
+        .offset(offset)
+        .limit(limit + 1)
+        .all()
+    )
+    next_offset = offset + limit if len(rows) > limit else None
+    # bm25 is negative and lower-is-better; expose it as a positive relevance.
+    items = [
+        ExpenseSearchHit(**ExpenseRead.from_orm(expense).dict(), rank=-score if score is not None else None)
+        for expense, score in rows[:limit]
+    ]
+    return ExpenseSearchPage(query=query, source=source, items=items, next_offset=next_offset)
@@ -0,0 +1,107 @@
+"""Column-level reads and orjson rendering for the read-heavy list routes.
+
+These routes select plain row tuples and build the response dicts directly, skipping the ORM identity
+map and the per-object ``orm_mode`` validation of the ``*Read`` schemas. The data comes straight from
+the database, so there is nothing to validate; the JSON keeps the schemas' field names and order.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, List, Sequence
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session
+
+from ..models import Expense, ExpenseSplit, RecurrenceRule
+from .money import from_cents
+
+
+class FastJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        # Dashboard totals are keyed by person id; the stdlib encoder turns int keys into strings too.
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+EXPENSE_COLUMNS = (
+    Expense.id,
+    Expense.description,
+    Expense.amount_cents,
+    Expense.date,
+    Expense.category,
+    Expense.notes,
+    Expense.paid_by_id,
+    Expense.account_id,
+    Expense.recurrence_rule_id,
+    Expense.created_at,
+)
+RECURRENCE_COLUMNS = (
+    RecurrenceRule.frequency_unit,
+    RecurrenceRule.interval,
+    RecurrenceRule.anchor_date,
+    RecurrenceRule.next_due_date,
+    RecurrenceRule.total_occurrences,
+    RecurrenceRule.is_active,
+    RecurrenceRule.id,
+    RecurrenceRule.occurrences_generated,
+)
+
+
+def select_expense_rows():
+    return select(*EXPENSE_COLUMNS)
+
+
+def expense_records(session: Session, rows: Sequence[Row]) -> List[dict[str, Any]]:
+    """Shape ``select_expense_rows()`` results like ``schemas.ExpenseRead``, splits included."""
+    splits: defaultdict[int, List[dict[str, Any]]] = defaultdict(list)
+    if rows:
+        split_rows = session.execute(
+            select(
+                ExpenseSplit.expense_id,
+                ExpenseSplit.person_id,
+                ExpenseSplit.percentage,
+                ExpenseSplit.amount_cents,
+                ExpenseSplit.id,
+            )
+            .where(ExpenseSplit.expense_id.in_([row[0] for row in rows]))
+            .order_by(ExpenseSplit.expense_id, ExpenseSplit.id)
+        )
+        for expense_id, person_id, percentage, amount_cents, split_id in split_rows:
+            splits[expense_id].append(
+                {"person_id": person_id, "percentage": percentage, "amount": from_cents(amount_cents), "id": split_id}
+            )
+    return [
+        {
+            "id": expense_id,
+            "description": description,
+            "amount": from_cents(amount_cents),
+            "date": expense_date,
+            "category": category,
+            "notes": notes,
+            "paid_by_id": paid_by_id,
+            "account_id": account_id,
+            "recurrence_rule_id": recurrence_rule_id,
+            "created_at": created_at,
+            "splits": splits[expense_id],
+        }
+        for (
+            expense_id,
+            description,
+            amount_cents,
+            expense_date,
+            category,
+            notes,
+            paid_by_id,
+            account_id,
+            recurrence_rule_id,
+            created_at,
+        ) in rows
+    ]
+
+
+def recurrence_records(session: Session) -> List[dict[str, Any]]:
+    """All rules shaped like ``schemas.RecurrenceRuleRead``, by next due date."""
+    keys = [column.key for column in RECURRENCE_COLUMNS]
+    rows = session.execute(select(*RECURRENCE_COLUMNS).order_by(RecurrenceRule.next_due_date))
+    return [dict(zip(keys, row)) for row in rows]
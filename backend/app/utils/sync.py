@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from typing import Any, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from ..cache import current_version
+from ..database import change_log
+from ..models import Account, Expense, Person, RecurrenceRule
+from .queries import decode_token, encode_token, invalid_cursor
+
+SYNC_MODELS = {
+    "people": Person,
+    "accounts": Account,
+    "expenses": Expense,
+    "recurrences": RecurrenceRule,
+}
+LOAD_BATCH = 500
+
+
+def entity_query(session: Session, entity: str):
+    query = session.query(SYNC_MODELS[entity])
+    if entity == "expenses":
+        query = query.options(selectinload(Expense.splits))
+    return query
+
+
+def load_rows(session: Session, entity: str, ids: List[int]) -> List[Any]:
+    model = SYNC_MODELS[entity]
+    query = entity_query(session, entity)
+    rows: List[Any] = []
+    for start in range(0, len(ids), LOAD_BATCH):
+        rows.extend(query.filter(model.id.in_(ids[start : start + LOAD_BATCH])).order_by(model.id))
+    return rows
+
+
+def encode_snapshot(version: int, entity: str, after_id: int) -> str:
+    return encode_token([version, entity, after_id])
+
+
+def decode_snapshot(token: str) -> tuple[int, str, int]:
+    try:
+        version, entity, after_id = decode_token(token)
+        if entity not in SYNC_MODELS:
+            raise ValueError(token)
+        return int(version), entity, int(after_id)
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+
+
+def snapshot_page(session: Session, version: int, start: tuple[str, int], limit: int) -> dict[str, Any]:
+    """Up to ``limit`` rows of the snapshot taken at ``version``, walking the tables by (entity, id) from ``start``.
+
+    Rows changed while the client pages through the snapshot may be sent in their old or new form, or
+    not at all if they were deleted; the sync that follows, from ``version``, brings all of them up to date.
+    """
+    entities = list(SYNC_MODELS)
+    first = entities.index(start[0])
+    page: dict[str, Any] = {entity: [] for entity in entities}
+    remaining = limit
+    for entity in entities[first:]:
+        after_id = start[1] if entity == start[0] else 0
+        model = SYNC_MODELS[entity]
+        rows = entity_query(session, entity).filter(model.id > after_id).order_by(model.id).limit(remaining + 1).all()
+        if len(rows) > remaining:
+            page[entity] = rows[:remaining]
+            resume = page[entity][-1].id if remaining else after_id
+            # The cursor only becomes valid once the last page is loaded, so a client that stops midway starts over.
+            page.update(cursor=0, has_more=True, snapshot=encode_snapshot(version, entity, resume))
+            return page
+        page[entity] = rows
+        remaining -= len(rows)
+    page.update(cursor=version, has_more=False, snapshot=None)
+    return page
+
+
+def pending_changes(session: Session, since: int, until: int, limit: int) -> tuple[List[Any], bool]:
+    """Change-log rows in (since, until], cut at a transaction boundary after ``limit`` rows."""
+    statement = (
+        select(change_log.c.version, change_log.c.entity, change_log.c.entity_id, change_log.c.deleted)
+        .where(change_log.c.version > since, change_log.c.version <= until)
+        .order_by(change_log.c.version, change_log.c.id)
+    )
+    rows = session.execute(statement.limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, False
+    boundary = rows[limit].version
+    if rows[0].version != boundary:
+        return [row for row in rows if row.version < boundary], True
+    # A single transaction larger than the page is returned whole; splitting it would lose the cursor.
+    return session.execute(statement.where(change_log.c.version <= boundary)).all(), True
+
+
+def changes_since(session: Session, since: int | None, limit: int, snapshot: str | None = None) -> dict[str, Any]:
+    # Read the version first: anything committed after it is left for the next sync.
+    current = current_version(session.connection())
+    if snapshot:
+        version, entity, after_id = decode_snapshot(snapshot)
+        if version <= current:
+            return {**snapshot_page(session, version, (entity, after_id), limit), "full": False}
+    if snapshot or not since or since > current:
+        # No cursor, or one from another database: start the client over.
+        return {**snapshot_page(session, current, (next(iter(SYNC_MODELS)), 0), limit), "full": True}
+
+    rows, has_more = pending_changes(session, since, current, limit)
+    cursor = rows[-1].version if has_more else current
+    updated: dict[str, List[int]] = {entity: [] for entity in SYNC_MODELS}
+    deleted: dict[str, List[int]] = {entity: [] for entity in SYNC_MODELS}
+    for row in rows:
+        if row.entity in SYNC_MODELS:
+            (deleted if row.deleted else updated)[row.entity].append(row.entity_id)
+
+    result: dict[str, Any] = {"cursor": cursor, "full": False, "has_more": has_more}
+    for entity, ids in updated.items():
+        result[entity] = load_rows(session, entity, ids) if ids else []
+        missing = set(ids) - {row.id for row in result[entity]}
+        deleted[entity].extend(sorted(missing))
+    result["deleted"] = deleted
+    return result
@@ -0,0 +1,365 @@
+"""Time every API route in-process against synthetic datasets.
+
+Usage (from backend/):
+    python -m benchmarks.api --expenses 10000 100000 --output bench.json
+    python -m benchmarks.api --expenses 10000 --compare bench.json
+
+Each scenario reports p50/p95/p99 latency, SQL statements per request and the peak Python memory of
+one traced request. Results are written as JSON so runs can be compared with --compare.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[int, dict], str]
+    params: Callable[[int, dict], dict] = lambda i, ctx: {}
+    body: Callable[[int, dict], Any] | None = None
+    setup: Callable[[int, dict], None] | None = None
+    iterations: int | None = None
+    expected_status: tuple[int, ...] = (200, 201, 204)
+    files: Callable[[int, dict], dict] | None = None
+    tags: list[str] = field(default_factory=list)
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def expense_payload(i: int, ctx: dict) -> dict:
+    return {
+        "description": f"Benchmark {i}",
+        "amount": 123.45,
+        "date": date.today().isoformat(),
+        "category": "benchmark",
+        "paid_by_id": 1,
+        "account_id": 1,
+        "splits": [{"person_id": 1, "percentage": 0.6}, {"person_id": 2, "percentage": 0.4}],
+    }
+
+
+def build_scenarios(client) -> list[Scenario]:
+    def create(path: str, payload: dict) -> int:
+        response = client.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def setup_person(i, ctx):
+        ctx["person_id"] = create("/api/people/", {"name": f"Temporária {i}-{time.time_ns()}"})
+
+    def setup_account(i, ctx):
+        ctx["account_id"] = create("/api/accounts/", {"name": f"Temporária {i}-{time.time_ns()}"})
+
+    def setup_expense(i, ctx):
+        ctx["expense_id"] = create("/api/expenses/", expense_payload(i, ctx))
+
+    def setup_rule(i, ctx):
+        today = date.today().isoformat()
+        ctx["rule_id"] = create("/api/recurrences/", {"anchor_date": today, "next_due_date": today})
+
+    def setup_second_page(i, ctx):
+        response = client.get("/api/expenses/", params={"limit": 100})
+        ctx["cursor"] = response.headers.get("x-next-cursor")
+
+    def setup_sync(i, ctx):
+        ctx["since"] = client.get("/api/sync/", params={"since": 1, "limit": 1}).json()["cursor"]
+        client.put("/api/expenses/1", json={"description": f"Sincronizada {i}"})
+
+    def import_file(i, ctx):
+        lines = "\n".join(json.dumps(expense_payload(i * 1000 + row, ctx)) for row in range(200))
+        return {"file": ("benchmark.ndjson", lines.encode(), "application/x-ndjson")}
+
+    run_due_reference = date.today()
+
+    return [
+        Scenario("GET /dashboard/summary", "GET", lambda i, ctx: "/api/dashboard/summary"),
+        Scenario(
+            "GET /dashboard/summary?exact_settlements",
+            "GET",
+            lambda i, ctx: "/api/dashboard/summary",
+            params=lambda i, ctx: {"exact_settlements": True},
+        ),
+        Scenario(
+            "GET /analytics/?bucket=month&group_by=category",
+            "GET",
+            lambda i, ctx: "/api/analytics/",
+            params=lambda i, ctx: {"bucket": "month", "group_by": "category"},
+        ),
+        Scenario(
+            "GET /analytics/?group_by=person&source=live",
+            "GET",
+            lambda i, ctx: "/api/analytics/",
+            params=lambda i, ctx: {"group_by": "person", "source": "live"},
+        ),
+        Scenario(
+            "GET /analytics/?bucket=week&group_by=payer",
+            "GET",
+            lambda i, ctx: "/api/analytics/",
+            params=lambda i, ctx: {"bucket": "week", "group_by": "payer"},
+        ),
+        Scenario("GET /people/", "GET", lambda i, ctx: "/api/people/"),
+        Scenario("POST /people/", "POST", lambda i, ctx: "/api/people/", body=lambda i, ctx: {"name": f"Nova {i}-{time.time_ns()}"}),
+        Scenario("GET /people/{id}", "GET", lambda i, ctx: "/api/people/1"),
+        Scenario("GET /people/{id}/ledger", "GET", lambda i, ctx: "/api/people/2/ledger"),
+        Scenario("PUT /people/{id}", "PUT", lambda i, ctx: "/api/people/1", body=lambda i, ctx: {"default_share": 0.5}),
+        Scenario("DELETE /people/{id}", "DELETE", lambda i, ctx: f"/api/people/{ctx['person_id']}", setup=setup_person, iterations=10),
+        Scenario("GET /accounts/", "GET", lambda i, ctx: "/api/accounts/"),
+        Scenario("POST /accounts/", "POST", lambda i, ctx: "/api/accounts/", body=lambda i, ctx: {"name": f"Nova {i}-{time.time_ns()}"}),
+        Scenario("GET /accounts/{id}", "GET", lambda i, ctx: "/api/accounts/1"),
+        Scenario("PUT /accounts/{id}", "PUT", lambda i, ctx: "/api/accounts/1", body=lambda i, ctx: {"description": f"v{i}"}),
+        Scenario("DELETE /accounts/{id}", "DELETE", lambda i, ctx: f"/api/accounts/{ctx['account_id']}", setup=setup_account),
+        Scenario("GET /expenses/", "GET", lambda i, ctx: "/api/expenses/"),
+        Scenario("GET /expenses/?limit=1000", "GET", lambda i, ctx: "/api/expenses/", params=lambda i, ctx: {"limit": 1000}),
+        Scenario("GET /expenses/?person_id", "GET", lambda i, ctx: "/api/expenses/", params=lambda i, ctx: {"person_id": 2}),
+        Scenario("GET /expenses/?account_id", "GET", lambda i, ctx: "/api/expenses/", params=lambda i, ctx: {"account_id": 3}),
+        Scenario(
+            "GET /expenses/?cursor (page 2)",
+            "GET",
+            lambda i, ctx: "/api/expenses/",
+            params=lambda i, ctx: {"limit": 100, "cursor": ctx["cursor"]},
+            setup=setup_second_page,
+        ),
+        Scenario(
+            "GET /sync/?since (1 alteração)",
+            "GET",
+            lambda i, ctx: "/api/sync/",
+            params=lambda i, ctx: {"since": ctx["since"]},
+            setup=setup_sync,
+        ),
+        Scenario("GET /expenses/search?q=condo", "GET", lambda i, ctx: "/api/expenses/search", params=lambda i, ctx: {"q": "condo"}),
+        Scenario(
+            "GET /expenses/search?q=boleto&account_id",
+            "GET",
+            lambda i, ctx: "/api/expenses/search",
+            params=lambda i, ctx: {"q": "boleto", "account_id": 3},
+        ),
+        Scenario("GET /expenses/{id}", "GET", lambda i, ctx: "/api/expenses/1"),
+        Scenario("POST /expenses/", "POST", lambda i, ctx: "/api/expenses/", body=expense_payload),
+        Scenario(
+            "PUT /expenses/{id}",
+            "PUT",
+            lambda i, ctx: f"/api/expenses/{ctx['expense_id']}",
+            body=lambda i, ctx: {"amount": 100 + i, "description": f"Editada {i}"},
+            setup=setup_expense,
+        ),
+        Scenario(
+            "PUT /expenses/{id} (só descrição)",
+            "PUT",
+            lambda i, ctx: f"/api/expenses/{ctx['expense_id']}",
+            body=lambda i, ctx: {"description": f"Renomeada {i}"},
+            setup=setup_expense,
+        ),
+        Scenario(
+            "POST /expenses/batch (50 alterações)",
+            "POST",
+            lambda i, ctx: "/api/expenses/batch",
+            body=lambda i, ctx: {
+                "operations": [
+                    {"op": "update", "id": expense_id, "data": {"description": f"Lote {i}", "amount": 50 + i}}
+                    for expense_id in range(1, 51)
+                ]
+            },
+            iterations=20,
+        ),
+        Scenario("DELETE /expenses/{id}", "DELETE", lambda i, ctx: f"/api/expenses/{ctx['expense_id']}", setup=setup_expense),
+        Scenario(
+            "GET /expenses/export (1 ano, ndjson)",
+            "GET",
+            lambda i, ctx: "/api/expenses/export",
+            params=lambda i, ctx: {
+                "format": "ndjson",
+                "date_from": (date.today() - timedelta(days=365)).isoformat(),
+            },
+            iterations=5,
+        ),
+        Scenario("POST /expenses/import (200 linhas)", "POST", lambda i, ctx: "/api/expenses/import", files=import_file, iterations=5),
+        Scenario("GET /recurrences/", "GET", lambda i, ctx: "/api/recurrences/"),
+        Scenario(
+            "POST /recurrences/",
+            "POST",
+            lambda i, ctx: "/api/recurrences/",
+            body=lambda i, ctx: {"anchor_date": date.today().isoformat(), "next_due_date": date.today().isoformat()},
+        ),
+        Scenario(
+            "GET /recurrences/forecast?months=60",
+            "GET",
+            lambda i, ctx: "/api/recurrences/forecast",
+            params=lambda i, ctx: {"months": 60},
+        ),
+        Scenario("PUT /recurrences/{id}", "PUT", lambda i, ctx: "/api/recurrences/1", body=lambda i, ctx: {"interval": 1}),
+        Scenario("DELETE /recurrences/{id}", "DELETE", lambda i, ctx: f"/api/recurrences/{ctx['rule_id']}", setup=setup_rule),
+        Scenario(
+            "POST /recurrences/{id}/generate",
+            "POST",
+            lambda i, ctx: "/api/recurrences/1/generate",
+            params=lambda i, ctx: {"reference_date": (date.today() + timedelta(days=i)).isoformat()},
+            iterations=10,
+        ),
+        Scenario(
+            "POST /recurrences/run-due?catch_up",
+            "POST",
+            lambda i, ctx: "/api/recurrences/run-due",
+            params=lambda i, ctx: {"catch_up": True, "reference_date": (run_due_reference + timedelta(days=31 * i)).isoformat()},
+            iterations=5,
+        ),
+    ]
+
+
+class QueryCounter:
+    def __init__(self, engine) -> None:
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self)
+
+    def __call__(self, *args, **kwargs) -> None:
+        self.count += 1
+
+
+def run_scenario(client, counter: QueryCounter, scenario: Scenario, iterations: int) -> dict:
+    latencies: list[float] = []
+    queries: list[int] = []
+    peak_memory = 0
+    total = (scenario.iterations or iterations) + 1
+    for i in range(total):
+        ctx: dict = {}
+        if scenario.setup:
+            scenario.setup(i, ctx)
+        kwargs: dict[str, Any] = {"params": scenario.params(i, ctx)}
+        if scenario.body is not None:
+            kwargs["json"] = scenario.body(i, ctx)
+        if scenario.files is not None:
+            kwargs["files"] = scenario.files(i, ctx)
+        traced = i == total - 1
+        if traced:
+            tracemalloc.start()
+        counter.count = 0
+        started = time.perf_counter()
+        response = client.request(scenario.method, scenario.path(i, ctx), **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        if traced:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if response.status_code not in scenario.expected_status:
+            raise RuntimeError(f"{scenario.name}: status {response.status_code} - {response.text[:200]}")
+        if not traced:
+            latencies.append(elapsed)
+            queries.append(counter.count)
+    return {
+        "iterations": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "queries": round(statistics.fmean(queries), 1),
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+    }
+
+
+def reset_database(engine) -> None:
+    from app.database import Base
+    from app.migrations import run_migrations
+
+    Base.metadata.drop_all(bind=engine)
+    run_migrations(engine)
+
+
+def compare(previous: dict, current: dict) -> None:
+    print(f"\n{'cenário':<48} {'tamanho':>9} {'p50 antes':>10} {'p50 agora':>10} {'variação':>9}")
+    for size, scenarios in current["results"].items():
+        old_scenarios = previous.get("results", {}).get(size, {})
+        for name, metrics in scenarios.items():
+            old = old_scenarios.get(name)
+            if not old:
+                continue
+            change = (metrics["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0.0
+            print(f"{name:<48} {size:>9} {old['p50_ms']:>10.2f} {metrics['p50_ms']:>10.2f} {change:>+8.1f}%")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, nargs="+", default=[10_000], help="Tamanhos de dataset (ex.: 10000 100000 1000000)")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--only", help="Executa apenas cenários cujo nome contenha este texto")
+    parser.add_argument("--database", help="Arquivo SQLite a usar (padrão: temporário)")
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparação")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="rateio-bench-")
+    database = Path(args.database) if args.database else Path(directory) / "bench.db"
+    # The app binds its engine at import time, so the database must be chosen before importing it.
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+
+    import sqlalchemy
+    from fastapi.testclient import TestClient
+
+    from app.config import settings
+    from app.database import engine
+    from app.main import app
+
+    from .datasets import DatasetSpec, generate_dataset
+
+    report: dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "iterations": args.iterations,
+            "settings": json.loads(settings.json(exclude={"database_url"})),
+        },
+        "datasets": {},
+        "results": {},
+    }
+
+    for size in args.expenses:
+        reset_database(engine)
+        started = time.perf_counter()
+        spec = generate_dataset(engine, DatasetSpec(expenses=size))
+        report["datasets"][str(size)] = {**spec.as_dict(), "seconds": round(time.perf_counter() - started, 1)}
+        print(f"\n# {size} despesas (dataset em {report['datasets'][str(size)]['seconds']} s)")
+
+        counter = QueryCounter(engine)
+        results: dict[str, dict] = {}
+        with TestClient(app) as client:
+            for scenario in build_scenarios(client):
+                if args.only and args.only not in scenario.name:
+                    continue
+                metrics = run_scenario(client, counter, scenario, args.iterations)
+                results[scenario.name] = metrics
+                print(
+                    f"{scenario.name:<48} p50 {metrics['p50_ms']:>9.2f} ms  p95 {metrics['p95_ms']:>9.2f} ms  "
+                    f"p99 {metrics['p99_ms']:>9.2f} ms  {metrics['queries']:>6} sql  {metrics['peak_memory_kb']:>9} KiB"
+                )
+        sqlalchemy.event.remove(engine, "before_cursor_execute", counter)
+        report["results"][str(size)] = results
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"\nResultados gravados em {args.output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
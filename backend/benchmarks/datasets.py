@@ -0,0 +1,103 @@
+"""Synthetic datasets written straight through app.models for the benchmarks."""
+from __future__ import annotations
+
+import random
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import bump_data_version_statement
+from app.models import FrequencyUnit
+from app.utils.analytics import rebuild_rollups
+from app.utils.bulk import allocate_split_rows
+from app.utils.ledger import rebuild_balances
+
+CATEGORIES = ["moradia", "mercado", "transporte", "lazer", "saúde", "educação", "condomínio", None]
+START_DATE = date(2015, 1, 1)
+
+
+@dataclass
+class DatasetSpec:
+    expenses: int
+    people: int = 6
+    accounts: int = 8
+    recurrences: int = 50
+    seed: int = 42
+    batch_size: int = 20_000
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def random_splits(rng: random.Random, people: int) -> list[dict]:
+    members = rng.sample(range(1, people + 1), rng.randint(2, min(5, people)))
+    weights = [rng.randint(1, 10) for _ in members]
+    total = sum(weights)
+    percentages = [round(weight / total, 4) for weight in weights]
+    percentages[-1] = round(1 - sum(percentages[:-1]), 4)
+    return [{"person_id": person_id, "percentage": percentage} for person_id, percentage in zip(members, percentages)]
+
+
+def generate_dataset(engine: Engine, spec: DatasetSpec, rebuild_ledger: bool = True) -> DatasetSpec:
+    rng = random.Random(spec.seed)
+    days = (date.today() - START_DATE).days
+    with engine.begin() as connection:
+        connection.execute(
+            insert(models.Person),
+            [{"name": f"Pessoa {index}", "email": f"pessoa{index}@example.com"} for index in range(1, spec.people + 1)],
+        )
+        connection.execute(insert(models.Account), [{"name": f"Conta {index}"} for index in range(1, spec.accounts + 1)])
+        connection.execute(
+            insert(models.RecurrenceRule),
+            [
+                {
+                    "frequency_unit": rng.choice([FrequencyUnit.monthly, FrequencyUnit.monthly, FrequencyUnit.weekly, FrequencyUnit.yearly]),
+                    "interval": 1,
+                    "anchor_date": START_DATE,
+                    "next_due_date": START_DATE + timedelta(days=rng.randint(days - 400, days - 30)),
+                    "is_active": True,
+                }
+                for _ in range(spec.recurrences)
+            ],
+        )
+
+    expense_id = 0
+    for offset in range(0, spec.expenses, spec.batch_size):
+        expense_rows = []
+        split_rows = []
+        for _ in range(min(spec.batch_size, spec.expenses - offset)):
+            expense_id += 1
+            amount_cents = rng.randint(500, 200_000)
+            rule_id = expense_id if expense_id <= spec.recurrences else None
+            expense_rows.append(
+                {
+                    "id": expense_id,
+                    "description": f"Despesa {expense_id}",
+                    "amount_cents": amount_cents,
+                    "date": START_DATE + timedelta(days=rng.randint(0, days)) if rule_id is None else START_DATE,
+                    "category": rng.choice(CATEGORIES),
+                    "notes": "boleto" if rng.random() < 0.1 else None,
+                    "paid_by_id": rng.randint(1, spec.people),
+                    "account_id": rng.randint(1, spec.accounts),
+                    "recurrence_rule_id": rule_id,
+                }
+            )
+            split_rows.append([{**split, "expense_id": expense_id} for split in random_splits(rng, spec.people)])
+        allocate_split_rows(expense_rows, split_rows)
+        with engine.begin() as connection:
+            connection.execute(insert(models.Expense), expense_rows)
+            connection.execute(insert(models.ExpenseSplit), [split for splits in split_rows for split in splits])
+
+    with engine.begin() as connection:
+        connection.execute(bump_data_version_statement)
+
+    if rebuild_ledger:
+        with Session(engine) as session:
+            rebuild_balances(session)
+            rebuild_rollups(session)
+            session.commit()
+    return spec
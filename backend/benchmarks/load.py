@@ -0,0 +1,213 @@
+"""Compare the sync and async database modes under concurrent load.
+
+Usage (from backend/):
+    python -m benchmarks.load --expenses 100000 --workers 2 --concurrency 8 64
+    python -m benchmarks.load --modes async --duration 20 --output load.json
+
+Each mode runs in its own gunicorn (uvicorn workers) against the same synthetic SQLite database, with
+the same number of workers. Every scenario is driven by `concurrency` clients in a loop for `duration`
+seconds and reports throughput, latency percentiles and errors.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+
+from .api import percentile
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+@dataclass
+class LoadScenario:
+    name: str
+    method: str
+    path: Callable[[int], str]
+    params: dict[str, Any] | None = None
+    body: Callable[[int], Any] | None = None
+
+
+def build_scenarios(expenses: int) -> list[LoadScenario]:
+    return [
+        LoadScenario("GET /expenses/{id}", "GET", lambda i: f"/api/expenses/{i % expenses + 1}"),
+        LoadScenario("GET /expenses/?limit=50", "GET", lambda i: "/api/expenses/", params={"limit": 50}),
+        LoadScenario("GET /people/", "GET", lambda i: "/api/people/"),
+        LoadScenario("GET /dashboard/summary", "GET", lambda i: "/api/dashboard/summary"),
+        LoadScenario(
+            "PUT /expenses/{id} (só descrição)",
+            "PUT",
+            lambda i: f"/api/expenses/{i % expenses + 1}",
+            body=lambda i: {"description": f"Carga {i}"},
+        ),
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, database: Path, workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database}",
+        "DATABASE_ASYNC": "true" if mode == "async" else "false",
+        "RESPONSE_CACHE_ENABLED": "false",
+        "REQUEST_LOG_ENABLED": "false",
+        "SLOW_QUERY_THRESHOLD_MS": "1e9",
+    }
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    # An empty config keeps gunicorn.conf.py (file logs, port 8000) out of the measurement.
+    config = database.with_name("gunicorn.conf.py")
+    config.touch()
+    command = [
+        sys.executable, "-m", "gunicorn", "app.main:app",
+        "--config", str(config),
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(workers),
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn ({mode}) terminou com código {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"gunicorn ({mode}) não respondeu em 60 s")
+
+
+async def drive(base_url: str, scenario: LoadScenario, concurrency: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker() -> None:
+            nonlocal errors, counter
+            while time.perf_counter() < deadline:
+                counter += 1
+                i = counter
+                started = time.perf_counter()
+                response = await client.request(
+                    scenario.method,
+                    scenario.path(i),
+                    params=scenario.params,
+                    json=scenario.body(i) if scenario.body else None,
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "errors": errors,
+    }
+
+
+def compare_modes(results: dict[str, dict]) -> None:
+    if not {"sync", "async"} <= set(results):
+        return
+    print(f"\n{'cenário':<40} {'clientes':>8} {'req/s sync':>11} {'req/s async':>12} {'variação':>9}")
+    for key, sync_metrics in results["sync"].items():
+        async_metrics = results["async"].get(key)
+        if not async_metrics:
+            continue
+        name, concurrency = key.rsplit(" @", 1)
+        change = (async_metrics["rps"] - sync_metrics["rps"]) / sync_metrics["rps"] * 100 if sync_metrics["rps"] else 0.0
+        print(f"{name:<40} {concurrency:>8} {sync_metrics['rps']:>11.1f} {async_metrics['rps']:>12.1f} {change:>+8.1f}%")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=10_000, help="Tamanho do dataset")
+    parser.add_argument("--workers", type=int, default=2, help="Workers do gunicorn em cada modo")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 64], help="Clientes simultâneos")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por cenário")
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--only", help="Executa apenas cenários cujo nome contenha este texto")
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    database = Path(tempfile.mkdtemp(prefix="rateio-load-")) / "load.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+
+    from app.database import engine
+    from app.migrations import run_migrations
+
+    from .datasets import DatasetSpec, generate_dataset
+
+    run_migrations(engine)
+    generate_dataset(engine, DatasetSpec(expenses=args.expenses))
+    engine.dispose()
+    print(f"# {args.expenses} despesas, {args.workers} worker(s) por modo")
+
+    report: dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "expenses": args.expenses,
+            "workers": args.workers,
+            "duration": args.duration,
+        },
+        "results": {},
+    }
+    for mode in args.modes:
+        port = free_port()
+        process = start_server(mode, database, args.workers, port)
+        results: dict[str, dict] = {}
+        try:
+            for scenario in build_scenarios(args.expenses):
+                if args.only and args.only not in scenario.name:
+                    continue
+                for concurrency in args.concurrency:
+                    metrics = asyncio.run(drive(f"http://127.0.0.1:{port}", scenario, concurrency, args.duration))
+                    results[f"{scenario.name} @{concurrency}"] = metrics
+                    print(
+                        f"{mode:<6} {scenario.name:<40} {concurrency:>4} clientes  {metrics['rps']:>8.1f} req/s  "
+                        f"p50 {metrics['p50_ms']:>8.2f} ms  p99 {metrics['p99_ms']:>8.2f} ms  {metrics['errors']} erro(s)"
+                    )
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        report["results"][mode] = results
+
+    compare_modes(report["results"])
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"\nResultados gravados em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
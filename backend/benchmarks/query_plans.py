@@ -0,0 +1,106 @@
+"""Compare SQLite query plans and timings for the hot queries before and after the index migration.
+
+Usage (from backend/): python -m benchmarks.query_plans --expenses 10000
+
+Without indexes the person_id filter is a correlated scan over expense_splits for every expense, so
+the "before" run grows quadratically; keep --expenses moderate.
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import create_engine, delete, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import DropIndex
+
+from app import models
+from app.database import Base
+from app.migrations import HOT_PATH_INDEXES, run_migrations, schema_migrations
+from app.utils.ledger import person_ledger_query
+
+from .datasets import DatasetSpec, generate_dataset
+
+
+def hot_queries(today: date) -> dict[str, object]:
+    expense = models.Expense
+    split = models.ExpenseSplit
+    rule = models.RecurrenceRule
+    return {
+        "listagem (date DESC, id DESC)": select(expense.id)
+        .order_by(expense.date.desc(), expense.id.desc())
+        .limit(100),
+        "filtro account_id": select(expense.id)
+        .where(expense.account_id == 2)
+        .order_by(expense.date.desc(), expense.id.desc())
+        .limit(100),
+        "filtro person_id (EXISTS em splits)": select(expense.id)
+        .where(select(split.id).where(split.expense_id == expense.id, split.person_id == 3).exists())
+        .order_by(expense.date.desc(), expense.id.desc())
+        .limit(100),
+        "extrato da pessoa (janela, página 1)": person_ledger_query(3, 101),
+        "splits por expense_id (selectinload)": select(split.id).where(split.expense_id.in_(list(range(1000, 1100)))),
+        "splits por person_id": select(split.expense_id).where(split.person_id == 3),
+        "modelo da recorrência": select(expense.id)
+        .where(expense.recurrence_rule_id == 7)
+        .order_by(expense.date.asc())
+        .limit(1),
+        "fetch_due_recurrences": select(rule.id).where(rule.is_active.is_(True), rule.next_due_date <= today),
+    }
+
+
+def simulate_legacy_schema(engine: Engine) -> None:
+    with engine.begin() as connection:
+        for table, names in HOT_PATH_INDEXES.items():
+            for index in table.indexes:
+                if index.name in names:
+                    connection.execute(DropIndex(index, if_exists=True))
+        connection.execute(delete(schema_migrations))
+
+
+def measure(engine: Engine, queries: dict[str, object], repeat: int) -> dict[str, tuple[list[str], float]]:
+    results = {}
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE"))
+        for label, statement in queries.items():
+            compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                connection.execute(statement).all()
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            results[label] = (plan, elapsed_ms)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--expenses", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        simulate_legacy_schema(engine)
+        generate_dataset(engine, DatasetSpec(expenses=args.expenses, people=5, recurrences=200), rebuild_ledger=False)
+
+        queries = hot_queries(date.today())
+        before = measure(engine, queries, args.repeat)
+        run_migrations(engine)
+        after = measure(engine, queries, args.repeat)
+        engine.dispose()
+
+    for label in queries:
+        plan_before, ms_before = before[label]
+        plan_after, ms_after = after[label]
+        print(f"== {label}")
+        print(f"   antes  ({ms_before:8.2f} ms): {' | '.join(plan_before)}")
+        print(f"   depois ({ms_after:8.2f} ms): {' | '.join(plan_after)}")
+
+
+if __name__ == "__main__":
+    main()
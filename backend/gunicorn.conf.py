@@ -1,13 +1,51 @@
 import multiprocessing
+import os
 from pathlib import Path
 
 project_root = Path(__file__).resolve().parents[1]
 log_dir = project_root.parent / "logs"
 log_dir.mkdir(parents=True, exist_ok=True)
+metrics_dir = Path(os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", str(project_root / "data" / "metrics")))
 
 bind = "127.0.0.1:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
 worker_class = "uvicorn.workers.UvicornWorker"
-accesslog = log_dir / "gunicorn.log"
-errorlog = log_dir / "gunicorn.log"
+accesslog = str(log_dir / "gunicorn.log")
+errorlog = str(log_dir / "gunicorn.log")
 loglevel = "info"
+logconfig_dict = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "root": {"level": "INFO", "handlers": ["console"]},
+    "loggers": {
+        "rateio": {"level": "INFO", "handlers": ["rateio_file"], "propagate": False},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "generic", "stream": "ext://sys.stdout"},
+        "rateio_file": {
+            "class": "logging.FileHandler",
+            "formatter": "generic",
+            "filename": str(log_dir / "gunicorn.log"),
+        },
+    },
+}
+
+
+def on_starting(server):
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    for stale in metrics_dir.glob("*.db"):
+        stale.unlink()
+
+    from app.database import engine
+    from app.migrations import run_migrations
+
+    applied = run_migrations(engine)
+    for migration in applied:
+        server.log.info("Migração %s aplicada: %s", migration.version, migration.description)
+    engine.dispose()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
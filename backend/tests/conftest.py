@@ -0,0 +1,69 @@
+"""Fixtures shared by the API tests.
+
+Usage (from backend/):
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The app binds its engine at import time, so the database must be chosen before importing it.
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp(prefix='rateio-tests-')) / 'tests.db'}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from app.database import Base, bump_data_version_statement, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+# Seeded by the migrations and not touched by the API, so they survive between tests.
+KEPT_TABLES = {"schema_migrations", "data_version", "scheduler_state"}
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(app_client):
+    yield app_client
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name not in KEPT_TABLES:
+                connection.execute(delete(table))
+        # Cached responses are keyed by the data version, so the cleanup must bump it like any write.
+        connection.execute(bump_data_version_statement)
+
+
+@pytest.fixture
+def household(client):
+    """Two people and an account, the smallest setup an expense needs."""
+    fernando = client.post("/api/people/", json={"name": "Fernando"}).json()
+    esposa = client.post("/api/people/", json={"name": "Esposa"}).json()
+    account = client.post("/api/accounts/", json={"name": "Casa"}).json()
+    return {"people": [fernando, esposa], "account": account}
+
+
+def expense_payload(household: dict, amount: float = 100.0, expense_date: str = "2024-01-15", **fields) -> dict:
+    fernando, esposa = household["people"]
+    payload = {
+        "description": "Mercado",
+        "amount": amount,
+        "date": expense_date,
+        "paid_by_id": fernando["id"],
+        "account_id": household["account"]["id"],
+        "category": "casa",
+        "splits": [
+            {"person_id": fernando["id"], "percentage": 0.5},
+            {"person_id": esposa["id"], "percentage": 0.5},
+        ],
+    }
+    payload.update(fields)
+    return payload
@@ -0,0 +1,32 @@
+from app.cache import CachedResponse, ResponseCacheMiddleware
+
+
+def entry(size):
+    return CachedResponse("etag", 200, [], b"x" * size)
+
+
+def test_cache_is_bounded_by_total_bytes():
+    cache = ResponseCacheMiddleware(None, [], max_entries=10, max_body_bytes=100, max_total_bytes=250)
+    for key in "abcde":
+        cache.store(key, entry(100))
+
+    assert list(cache.entries) == ["d", "e"]
+    assert cache.total_bytes == 200
+
+    cache.store("e", entry(10))
+    assert cache.total_bytes == 110
+
+
+def test_single_body_cannot_exceed_the_total():
+    cache = ResponseCacheMiddleware(None, [], max_entries=10, max_body_bytes=1000, max_total_bytes=250)
+    assert cache.max_body_bytes == 250
+
+
+def test_reads_are_served_from_the_cache_until_a_write(client, household):
+    assert client.get("/api/people/").headers["X-Cache"] == "MISS"
+    assert client.get("/api/people/").headers["X-Cache"] == "HIT"
+
+    client.post("/api/people/", json={"name": "Filho"})
+    response = client.get("/api/people/")
+    assert response.headers["X-Cache"] == "MISS"
+    assert len(response.json()) == 3
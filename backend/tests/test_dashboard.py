@@ -0,0 +1,22 @@
+from .conftest import expense_payload
+
+
+def test_deleted_person_shows_up_as_unallocated(client, household):
+    fernando, esposa = household["people"]
+    filho = client.post("/api/people/", json={"name": "Filho"}).json()
+    splits = [
+        {"person_id": fernando["id"], "percentage": 0.5},
+        {"person_id": esposa["id"], "percentage": 0.25},
+        {"person_id": filho["id"], "percentage": 0.25},
+    ]
+    client.post("/api/expenses/", json=expense_payload(household, amount=100.0, splits=splits))
+
+    summary = client.get("/api/dashboard/summary").json()
+    assert summary["unallocated"] == 0
+    assert client.delete(f"/api/people/{filho['id']}").status_code == 204
+
+    summary = client.get("/api/dashboard/summary").json()
+    assert summary["unallocated"] == 25.0
+    assert summary["total_owed_by"] == {str(fernando["id"]): 50.0, str(esposa["id"]): 25.0}
+    # Esposa still owes her own share; the 25.00 nobody owes is what Fernando does not get back.
+    assert summary["settlements"] == [{"payer_id": esposa["id"], "receiver_id": fernando["id"], "amount": 25.0}]
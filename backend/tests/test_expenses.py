@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import models, schemas
+from app.database import SessionLocal
+from app.utils.analytics import verify_rollups
+from app.utils.expenses import apply_expense_update
+from app.utils.ledger import LedgerDelta, verify_balances
+
+from .conftest import expense_payload
+
+
+def load_twice(expense_id):
+    sessions = SessionLocal(), SessionLocal()
+    expenses = [session.get(models.Expense, expense_id) for session in sessions]
+    # Load the splits as well, before the other session changes them.
+    for expense in expenses:
+        len(expense.splits)
+    return sessions, expenses
+
+
+def update(session, expense, **fields):
+    delta = LedgerDelta()
+    apply_expense_update(expense, schemas.ExpenseUpdate(**fields), delta)
+    delta.apply(session)
+
+
+def test_updates_from_the_same_old_state_do_not_both_apply(client, household):
+    expense_id = client.post("/api/expenses/", json=expense_payload(household)).json()["id"]
+    (first, second), (mine, theirs) = load_twice(expense_id)
+    try:
+        update(first, mine, amount=50.0)
+        first.commit()
+        update(second, theirs, amount=70.0)
+        with pytest.raises(StaleDataError):
+            second.commit()
+    finally:
+        first.close()
+        second.close()
+
+    assert client.get(f"/api/expenses/{expense_id}").json()["amount"] == 50.0
+    with SessionLocal() as session:
+        assert verify_balances(session) == [] and verify_rollups(session) == []
+
+
+def test_delete_after_a_concurrent_update_is_rejected(client, household):
+    expense_id = client.post("/api/expenses/", json=expense_payload(household)).json()["id"]
+    (first, second), (mine, theirs) = load_twice(expense_id)
+    try:
+        update(first, mine, paid_by_id=household["people"][1]["id"])
+        first.commit()
+        delta = LedgerDelta()
+        delta.add_expense(theirs, sign=-1)
+        delta.apply(second)
+        second.delete(theirs)
+        with pytest.raises(StaleDataError):
+            second.commit()
+    finally:
+        first.close()
+        second.close()
+
+    with SessionLocal() as session:
+        assert verify_balances(session) == [] and verify_rollups(session) == []
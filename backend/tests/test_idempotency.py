@@ -0,0 +1,158 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from app import idempotency
+from app.database import engine
+from app.idempotency import (
+    RequestFingerprint,
+    claim_key,
+    digest,
+    idempotency_keys,
+    release_key,
+    renew_claim,
+    store_response,
+)
+
+from .conftest import expense_payload
+
+
+def post_expense(client, household, key, **fields):
+    return client.post("/api/expenses/", json=expense_payload(household, **fields), headers={"Idempotency-Key": key})
+
+
+def expense_count(client):
+    return len(client.get("/api/expenses/").json())
+
+
+def test_retry_replays_the_stored_response(client, household):
+    first = post_expense(client, household, "compra-1")
+    retry = post_expense(client, household, "compra-1")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert expense_count(client) == 1
+
+
+def test_key_reused_for_a_different_body_is_rejected(client, household):
+    assert post_expense(client, household, "compra-2").status_code == 201
+
+    response = post_expense(client, household, "compra-2", amount=250.0)
+    assert response.status_code == 422
+    assert expense_count(client) == 1
+
+
+def test_running_request_blocks_retries(client, household):
+    with engine.begin() as connection:
+        claim_key(connection, digest(b"compra-3"), b"a" * 16, datetime.utcnow(), 30)
+
+    response = post_expense(client, household, "compra-3")
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert expense_count(client) == 0
+
+
+def test_lease_of_a_crashed_request_is_taken_over(client, household):
+    # A worker died 31 s into a request: its 30 s lease is over, long before the key's TTL.
+    with engine.begin() as connection:
+        claim_key(connection, digest(b"compra-4"), b"a" * 16, datetime.utcnow() - timedelta(seconds=31), 30)
+
+    response = post_expense(client, household, "compra-4")
+    assert response.status_code == 201, response.text
+    assert post_expense(client, household, "compra-4").headers["Idempotent-Replayed"] == "true"
+    assert expense_count(client) == 1
+
+
+def test_stale_holder_cannot_touch_a_taken_over_key(client):
+    key_hash, now = digest(b"compra-5"), datetime.utcnow()
+    with engine.begin() as connection:
+        claim_key(connection, key_hash, b"a" * 16, now - timedelta(seconds=60), 30)
+        assert claim_key(connection, key_hash, b"b" * 16, now, 30) is None
+
+        assert not renew_claim(connection, key_hash, b"a" * 16, now, 30)
+        assert not store_response(connection, key_hash, b"a" * 16, b"f" * 16, 201, [], b"{}", now)
+        release_key(connection, key_hash, b"a" * 16)
+
+        row = connection.execute(idempotency_keys.select()).one()
+        assert row.claim == b"b" * 16 and row.status is None
+        assert renew_claim(connection, key_hash, b"b" * 16, now, 30)
+
+
+
+def test_success_whose_response_was_not_stored_is_not_repeated(client, household, monkeypatch):
+    def locked(*args):
+        raise OperationalError("UPDATE idempotency_keys", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(idempotency, "store_response", locked)
+    first = post_expense(client, household, "compra-6")
+    assert first.status_code == 201, first.text
+
+    monkeypatch.undo()
+    retry = post_expense(client, household, "compra-6")
+    assert retry.status_code == 409
+    assert "Retry-After" not in retry.headers
+    assert expense_count(client) == 1
+
+
+
+def multipart_fingerprint(boundary, payload, chunk_size):
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="despesas.csv"\r\n\r\n'.encode()
+        + payload
+        + f"\r\n--{boundary}--\r\n".encode()
+    )
+    content_type = f"multipart/form-data; boundary={boundary}".encode()
+    scope = {
+        "method": "POST",
+        "path": "/api/expenses/import",
+        "query_string": b"",
+        "headers": [(b"content-type", content_type)],
+    }
+    fingerprint = RequestFingerprint(scope)
+    for start in range(0, len(body), chunk_size):
+        more_body = start + chunk_size < len(body)
+        fingerprint.update({"type": "http.request", "body": body[start : start + chunk_size], "more_body": more_body})
+    return fingerprint.digest()
+
+
+def test_fingerprint_ignores_the_multipart_boundary_however_the_body_is_split():
+    payload = b"linha 1\nlinha 2\n" * 50
+    reference = multipart_fingerprint("aaaa1111", payload, 1 << 20)
+
+    for chunk_size in (1, 3, 7, 16, 64):
+        assert multipart_fingerprint("bbbbzzzzzzzz", payload, chunk_size) == reference
+    assert multipart_fingerprint("cc", b"outro arquivo", 5) != reference
+
+
+def test_import_retry_is_replayed_despite_a_new_boundary(client, household):
+    fernando = household["people"][0]
+    rows = [
+        {
+            "description": f"Importada {i}",
+            "amount": 10,
+            "date": "2024-01-01",
+            "paid_by_id": fernando["id"],
+            "account_id": household["account"]["id"],
+            "splits": [{"person_id": fernando["id"], "percentage": 1}],
+        }
+        for i in range(20)
+    ]
+    data = "\n".join(json.dumps(row) for row in rows).encode()
+
+    # The test client picks a new random boundary for every request, like a browser does.
+    responses = [
+        client.post(
+            "/api/expenses/import",
+            files={"file": ("despesas.ndjson", data, "application/x-ndjson")},
+            headers={"Idempotency-Key": "importacao-1"},
+        )
+        for _ in range(2)
+    ]
+
+    assert responses[0].status_code == 200, responses[0].text
+    assert responses[0].json()["imported"] == 20
+    assert responses[1].headers["Idempotent-Replayed"] == "true"
+    assert responses[1].content == responses[0].content
+    assert expense_count(client) == 20
@@ -0,0 +1,81 @@
+import base64
+import json
+
+from app.database import SessionLocal
+from app.utils import ledger
+from app.utils.analytics import verify_rollups
+
+from .conftest import expense_payload
+
+
+def walk_ledger(client, person_id, limit):
+    entries, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/api/people/{person_id}/ledger", params=params)
+        assert response.status_code == 200, response.text
+        entries.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return entries
+
+
+def seed_expenses(client, household, count=12):
+    fernando, esposa = household["people"]
+    ids = []
+    for i in range(count):
+        payload = expense_payload(
+            household,
+            amount=10.0 * (i + 1),
+            # Pairs of expenses share a date, so the id has to break ties across page boundaries.
+            expense_date=f"2024-{1 + i // 2:02d}-10",
+            paid_by_id=[fernando, esposa][i % 3 == 0]["id"],
+        )
+        response = client.post("/api/expenses/", json=payload)
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def test_ledger_pages_match_a_single_page(client, household):
+    seed_expenses(client, household)
+    person_id = household["people"][0]["id"]
+
+    full = walk_ledger(client, person_id, limit=1000)
+    assert len(full) == 12
+    balance = 0
+    for entry in full:
+        balance = round(balance + entry["paid"] - entry["owed"], 2)
+        assert entry["balance"] == balance
+    for limit in (1, 5):
+        assert walk_ledger(client, person_id, limit) == full
+
+
+def test_ledger_balance_ignores_cursor_contents_and_follows_edits(client, household):
+    ids = seed_expenses(client, household, count=4)
+    person_id = household["people"][0]["id"]
+
+    first = client.get(f"/api/people/{person_id}/ledger", params={"limit": 2})
+    cursor = first.headers["X-Next-Cursor"]
+    expense_date, expense_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+    forged = json.dumps([expense_date, expense_id, 999999]).encode()
+    forged_cursor = base64.urlsafe_b64encode(forged).decode().rstrip("=")
+    assert client.get(f"/api/people/{person_id}/ledger", params={"cursor": forged_cursor}).status_code == 400
+
+    # An expense before the cursor changes between pages: the next page starts from the new balance.
+    response = client.put(f"/api/expenses/{ids[0]}", json={"amount": 500.0})
+    assert response.status_code == 200, response.text
+    second = client.get(f"/api/people/{person_id}/ledger", params={"limit": 2, "cursor": cursor}).json()
+    assert second == walk_ledger(client, person_id, limit=1000)[2:]
+
+
+def test_dialects_without_upsert_keep_balances_and_rollups_exact(client, household, monkeypatch):
+    monkeypatch.setattr(ledger, "UPSERT_INSERTS", {})
+    ids = seed_expenses(client, household, count=6)
+    client.put(f"/api/expenses/{ids[0]}", json={"amount": 75.0, "category": "lazer"})
+    client.delete(f"/api/expenses/{ids[1]}")
+
+    with SessionLocal() as session:
+        assert ledger.verify_balances(session) == []
+        assert verify_rollups(session) == []
@@ -0,0 +1,85 @@
+from datetime import date
+
+from app.utils.recurrence import add_months
+
+
+def create_daily_rule(client, household, **fields):
+    today = date.today().isoformat()
+    rule = client.post(
+        "/api/recurrences/",
+        json={"frequency_unit": "daily", "anchor_date": "2024-01-01", "next_due_date": today, **fields},
+    ).json()
+    fernando, esposa = household["people"]
+    response = client.post(
+        "/api/expenses/",
+        json={
+            "description": "Padaria",
+            "amount": 10.0,
+            "date": today,
+            "paid_by_id": fernando["id"],
+            "account_id": household["account"]["id"],
+            "recurrence_rule_id": rule["id"],
+            "splits": [
+                {"person_id": fernando["id"], "percentage": 0.5},
+                {"person_id": esposa["id"], "percentage": 0.5},
+            ],
+        },
+    )
+    assert response.status_code == 201, response.text
+    return rule
+
+
+def test_forecast_rejects_horizon_beyond_limit(client, household):
+    create_daily_rule(client, household)
+
+    response = client.get("/api/recurrences/forecast", params={"until": "9999-12-31"})
+    assert response.status_code == 422
+
+    response = client.get("/api/recurrences/forecast", params={"until": add_months(date.today(), 121).isoformat()})
+    assert response.status_code == 422
+
+    response = client.get("/api/recurrences/forecast", params={"months": 121})
+    assert response.status_code == 422
+
+
+def test_forecast_accepts_horizon_at_limit(client, household):
+    create_daily_rule(client, household)
+    horizon = add_months(date.today(), 120)
+
+    response = client.get("/api/recurrences/forecast", params={"until": horizon.isoformat()})
+    assert response.status_code == 200, response.text
+    assert response.json()["occurrences"] == (horizon - date.today()).days + 1
+
+
+def test_generate_and_forecast_copy_the_same_template(client, household):
+    rule = client.post(
+        "/api/recurrences/",
+        json={"frequency_unit": "monthly", "anchor_date": "2024-01-10", "next_due_date": "2024-02-10"},
+    ).json()
+    fernando, esposa = household["people"]
+    splits = [{"person_id": fernando["id"], "percentage": 0.5}, {"person_id": esposa["id"], "percentage": 0.5}]
+    # Same date, so only the id breaks the tie: the first one created is the template.
+    for description, amount in (("Aluguel", 1500.0), ("Aluguel reajustado", 1600.0)):
+        response = client.post(
+            "/api/expenses/",
+            json={
+                "description": description,
+                "amount": amount,
+                "date": "2024-01-10",
+                "paid_by_id": fernando["id"],
+                "account_id": household["account"]["id"],
+                "recurrence_rule_id": rule["id"],
+                "splits": splits,
+            },
+        )
+        assert response.status_code == 201, response.text
+
+    forecast = client.get(
+        "/api/recurrences/forecast", params={"until": "2024-02-10", "include_expenses": True}
+    ).json()
+    generated = client.post(f"/api/recurrences/{rule['id']}/generate").json()
+
+    assert [expense["description"] for expense in forecast["expenses"]] == ["Aluguel"]
+    assert generated[0]["date"] == "2024-02-10"
+    assert generated[0]["description"] == "Aluguel"
+    assert generated[0]["amount"] == forecast["expenses"][0]["amount"] == 1500.0
@@ -0,0 +1,28 @@
+import time
+
+from app.database import sql_engines
+from app.utils import search
+
+from .conftest import expense_payload
+
+
+def mark_missing(checked_at):
+    for sql_engine in sql_engines():
+        search._fts_missing[str(sql_engine.url)] = checked_at
+
+
+def test_missing_fts_table_is_checked_again_after_an_interval(client, household, monkeypatch):
+    monkeypatch.setattr(search, "_fts_ready", set())
+    monkeypatch.setattr(search, "_fts_missing", {})
+    client.post("/api/expenses/", json=expense_payload(household, description="Feira orgânica"))
+
+    # A recent negative check is trusted: the search falls back to LIKE.
+    mark_missing(time.monotonic())
+    response = client.get("/api/expenses/search", params={"q": "feira"}).json()
+    assert response["source"] == "like"
+
+    # Once it is older than the interval, the table is looked up again and found.
+    mark_missing(time.monotonic() - search.FTS_RECHECK_SECONDS)
+    response = client.get("/api/expenses/search", params={"q": "feira"}).json()
+    assert response["source"] == "fts"
+    assert [item["description"] for item in response["items"]] == ["Feira orgânica"]
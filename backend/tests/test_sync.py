@@ -0,0 +1,59 @@
+from .conftest import expense_payload
+
+ENTITIES = ("people", "accounts", "expenses", "recurrences")
+
+
+def sync_all(client, limit, **params):
+    """Follow ``snapshot`` until the last page, as the frontend's syncStore does."""
+    pages, store = [], {entity: {} for entity in ENTITIES}
+    snapshot = None
+    while True:
+        page_params = {**params, "limit": limit, **({"snapshot": snapshot} if snapshot else {})}
+        response = client.get("/api/sync/", params=page_params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append(page)
+        for entity in ENTITIES:
+            for row in page[entity]:
+                store[entity][row["id"]] = row
+            for row_id in page["deleted"][entity]:
+                store[entity].pop(row_id, None)
+        snapshot = page["snapshot"]
+        if not page["has_more"]:
+            return pages, store
+
+
+def test_snapshot_is_paged_by_limit(client, household):
+    for i in range(5):
+        assert client.post("/api/expenses/", json=expense_payload(household, amount=10.0 + i)).status_code == 201
+
+    pages, store = sync_all(client, limit=3)
+    (single,), expected = sync_all(client, limit=1000)
+
+    # 2 people, 1 account and 5 expenses.
+    assert len(pages) == 3
+    assert all(sum(len(page[entity]) for entity in ENTITIES) <= 3 for page in pages)
+    assert [page["full"] for page in pages] == [True, False, False]
+    assert [page["cursor"] for page in pages[:-1]] == [0, 0]
+    assert pages[-1]["cursor"] == single["cursor"] and pages[-1]["snapshot"] is None
+    assert store == expected
+
+
+def test_changes_during_the_snapshot_arrive_in_the_next_sync(client, household):
+    ids = [client.post("/api/expenses/", json=expense_payload(household)).json()["id"] for _ in range(4)]
+
+    first = client.get("/api/sync/", params={"limit": 2}).json()
+    assert first["has_more"]
+    client.delete(f"/api/expenses/{ids[-1]}")
+    client.put(f"/api/expenses/{ids[0]}", json={"amount": 42.0})
+
+    rest = client.get("/api/sync/", params={"limit": 1000, "snapshot": first["snapshot"]}).json()
+    assert not rest["has_more"]
+    changes = client.get("/api/sync/", params={"since": rest["cursor"]}).json()
+
+    assert changes["deleted"]["expenses"] == [ids[-1]]
+    assert [(row["id"], row["amount"]) for row in changes["expenses"]] == [(ids[0], 42.0)]
+
+
+def test_malformed_snapshot_token_is_rejected(client):
+    assert client.get("/api/sync/", params={"snapshot": "nao-e-um-cursor"}).status_code == 400
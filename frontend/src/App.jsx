@@ -17,39 +17,55 @@ import SettlementsList from "./components/SettlementsList";
 import SummaryCard from "./components/SummaryCard";
 import {
   fetchAccounts,
+  fetchAnalytics,
   fetchDashboardSummary,
-  fetchExpenses,
+  fetchExpensesPage,
   fetchPeople,
   fetchRecurrences
 } from "./services/api";
 
 ChartJS.register(ArcElement, BarElement, CategoryScale, Legend, LinearScale, Tooltip);
 
+const MONTHLY_CHART_MONTHS = 12;
+const MONTHLY_CHART_COLORS = ["#2563eb", "#14b8a6", "#f59e0b", "#ef4444", "#6366f1"];
+
+function monthlyChartStart() {
+  const today = new Date();
+  const start = new Date(today.getFullYear(), today.getMonth() - (MONTHLY_CHART_MONTHS - 1), 1);
+  return `${start.getFullYear()}-${String(start.getMonth() + 1).padStart(2, "0")}-01`;
+}
+
 export default function App() {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
   const [summary, setSummary] = useState(null);
   const [expenses, setExpenses] = useState([]);
+  const [expensesCursor, setExpensesCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [recurrences, setRecurrences] = useState([]);
   const [people, setPeople] = useState([]);
   const [accounts, setAccounts] = useState([]);
+  const [monthlyTotals, setMonthlyTotals] = useState(null);
 
   useEffect(() => {
     async function loadData() {
       try {
         setIsLoading(true);
-        const [summaryData, expensesData, recurrencesData, peopleData, accountsData] = await Promise.all([
+        const [summaryData, expensesPage, recurrencesData, peopleData, accountsData, monthlyData] = await Promise.all([
           fetchDashboardSummary(),
-          fetchExpenses(),
+          fetchExpensesPage(),
           fetchRecurrences(),
           fetchPeople(),
-          fetchAccounts()
+          fetchAccounts(),
+          fetchAnalytics({ bucket: "month", groupBy: "payer", date_from: monthlyChartStart() })
         ]);
         setSummary(summaryData);
-        setExpenses(expensesData);
+        setExpenses(expensesPage.items);
+        setExpensesCursor(expensesPage.nextCursor);
         setRecurrences(recurrencesData);
         setPeople(peopleData);
         setAccounts(accountsData);
+        setMonthlyTotals(monthlyData);
       } catch (err) {
         console.error(err);
         setError("Não foi possível carregar os dados do servidor.");
@@ -61,6 +77,20 @@ export default function App() {
     loadData();
   }, []);
 
+  async function loadMoreExpenses() {
+    if (!expensesCursor) return;
+    try {
+      setIsLoadingMore(true);
+      const page = await fetchExpensesPage({ cursor: expensesCursor });
+      setExpenses((current) => [...current, ...page.items]);
+      setExpensesCursor(page.nextCursor);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  }
+
   const peopleById = useMemo(() => Object.fromEntries(people.map((person) => [person.id, person.name])), [people]);
   const accountsById = useMemo(
     () => Object.fromEntries(accounts.map((account) => [account.id, account.name])),
@@ -112,6 +142,23 @@ export default function App() {
     };
   }, [summary, peopleById]);
 
+  const monthlyBarData = useMemo(() => {
+    if (!monthlyTotals || monthlyTotals.points.length === 0) return null;
+    const months = [...new Set(monthlyTotals.points.map((point) => point.period))];
+    const payers = [...new Set(monthlyTotals.points.map((point) => point.key))];
+    const totals = Object.fromEntries(
+      monthlyTotals.points.map((point) => [`${point.period}:${point.key}`, point.total])
+    );
+    return {
+      labels: months,
+      datasets: payers.map((payerId, index) => ({
+        label: peopleById[payerId] ?? `Pessoa ${payerId}`,
+        data: months.map((month) => totals[`${month}:${payerId}`] ?? 0),
+        backgroundColor: MONTHLY_CHART_COLORS[index % MONTHLY_CHART_COLORS.length]
+      }))
+    };
+  }, [monthlyTotals, peopleById]);
+
   if (isLoading) {
     return (
       <main className="mx-auto max-w-6xl space-y-6 p-6">
@@ -202,14 +249,45 @@ export default function App() {
         </div>
       </section>
 
+      <section className="rounded-lg bg-white p-6 shadow-sm ring-1 ring-slate-200">
+        <h2 className="text-lg font-semibold text-slate-800">Despesas por mês</h2>
+        {monthlyBarData ? (
+          <Bar
+            data={monthlyBarData}
+            options={{
+              responsive: true,
+              maintainAspectRatio: false,
+              scales: {
+                x: { stacked: true },
+                y: { stacked: true, beginAtZero: true }
+              }
+            }}
+            height={240}
+          />
+        ) : (
+          <p className="mt-4 text-sm text-slate-500">Sem despesas nos últimos 12 meses.</p>
+        )}
+      </section>
+
       <section className="grid gap-6 lg:grid-cols-3">
         <div className="lg:col-span-2 space-y-4">
           <h2 className="text-lg font-semibold text-slate-800">Últimas despesas</h2>
-          <ExpensesTable expenses={expenses} peopleById={peopleById} accountsById={accountsById} />
+          <ExpensesTable
+            expenses={expenses}
+            peopleById={peopleById}
+            accountsById={accountsById}
+            hasMore={Boolean(expensesCursor)}
+            isLoadingMore={isLoadingMore}
+            onLoadMore={loadMoreExpenses}
+          />
         </div>
         <div className="space-y-4">
           <h2 className="text-lg font-semibold text-slate-800">Ajustes de rateio</h2>
-          <SettlementsList settlements={summary?.settlements ?? []} peopleById={peopleById} />
+          <SettlementsList
+            settlements={summary?.settlements ?? []}
+            peopleById={peopleById}
+            unallocated={summary?.unallocated ?? 0}
+          />
         </div>
       </section>
 
@@ -1,4 +1,11 @@
-export default function ExpensesTable({ expenses = [], peopleById = {}, accountsById = {} }) {
+export default function ExpensesTable({
+  expenses = [],
+  peopleById = {},
+  accountsById = {},
+  hasMore = false,
+  isLoadingMore = false,
+  onLoadMore
+}) {
   return (
     <div className="overflow-hidden rounded-lg bg-white shadow-sm ring-1 ring-slate-200">
       <table className="min-w-full divide-y divide-slate-200">
@@ -38,6 +45,18 @@ export default function ExpensesTable({ expenses = [], peopleById = {}, accounts
           )}
         </tbody>
       </table>
+      {hasMore ? (
+        <div className="border-t border-slate-200 bg-slate-50 px-4 py-3 text-center">
+          <button
+            type="button"
+            onClick={onLoadMore}
+            disabled={isLoadingMore}
+            className="text-sm font-medium text-blue-600 hover:text-blue-700 disabled:cursor-not-allowed disabled:text-slate-400"
+          >
+            {isLoadingMore ? "Carregando..." : "Carregar mais"}
+          </button>
+        </div>
+      ) : null}
     </div>
   );
 }
@@ -1,14 +1,31 @@
-export default function SettlementsList({ settlements = [], peopleById = {} }) {
+function UnallocatedNotice({ unallocated }) {
+  if (!unallocated) {
+    return null;
+  }
+  return (
+    <div className="rounded-lg bg-amber-50 p-4 text-sm text-amber-800 ring-1 ring-amber-200">
+      {Math.abs(unallocated).toLocaleString("pt-BR", { style: "currency", currency: "BRL" })}
+      {unallocated > 0 ? " das despesas não estão no rateio de ninguém" : " em rateios excedem o que foi pago"}
+      {" "}(por exemplo, rateios de uma pessoa removida); a diferença foi descontada do maior saldo nos ajustes.
+    </div>
+  );
+}
+
+export default function SettlementsList({ settlements = [], peopleById = {}, unallocated = 0 }) {
   if (settlements.length === 0) {
     return (
-      <div className="rounded-lg bg-white p-6 text-sm text-slate-500 shadow-sm ring-1 ring-slate-200">
-        Nenhum ajuste necessário no momento.
+      <div className="space-y-3">
+        <UnallocatedNotice unallocated={unallocated} />
+        <div className="rounded-lg bg-white p-6 text-sm text-slate-500 shadow-sm ring-1 ring-slate-200">
+          Nenhum ajuste necessário no momento.
+        </div>
       </div>
     );
   }
 
   return (
     <div className="space-y-3">
+      <UnallocatedNotice unallocated={unallocated} />
       {settlements.map((settlement, index) => (
         <div
           key={`${settlement.payer_id}-${settlement.receiver_id}-${index}`}
@@ -9,8 +9,21 @@ export async function fetchDashboardSummary() {
   return response.data;
 }
 
-export async function fetchExpenses() {
-  const response = await api.get("/expenses");
+export async function fetchExpenses(params = {}) {
+  const response = await api.get("/expenses", { params });
+  return response.data;
+}
+
+export async function fetchExpensesPage({ cursor, limit = 50, ...filters } = {}) {
+  const response = await api.get("/expenses", { params: { ...filters, limit, cursor } });
+  return {
+    items: response.data,
+    nextCursor: response.headers["x-next-cursor"] ?? null
+  };
+}
+
+export async function fetchAnalytics({ bucket = "month", groupBy = "category", ...filters } = {}) {
+  const response = await api.get("/analytics/", { params: { ...filters, bucket, group_by: groupBy } });
   return response.data;
 }
 
@@ -29,4 +42,36 @@ export async function fetchAccounts() {
   return response.data;
 }
 
+const SYNC_ENTITIES = ["people", "accounts", "expenses", "recurrences"];
+
+export async function fetchChanges({ since, limit, snapshot } = {}) {
+  const response = await api.get("/sync/", { params: { since, limit, snapshot } });
+  return response.data;
+}
+
+export function applyChanges(store, changes) {
+  const next = { cursor: changes.cursor };
+  for (const entity of SYNC_ENTITIES) {
+    const rows = changes.full ? new Map() : new Map(store?.[entity] ?? []);
+    for (const row of changes[entity]) {
+      rows.set(row.id, row);
+    }
+    for (const id of changes.deleted[entity]) {
+      rows.delete(id);
+    }
+    next[entity] = rows;
+  }
+  return next;
+}
+
+export async function syncStore(store) {
+  let current = store;
+  let changes;
+  do {
+    changes = await fetchChanges({ since: current?.cursor, snapshot: changes?.snapshot });
+    current = applyChanges(current, changes);
+  } while (changes.has_more);
+  return current;
+}
+
 export default api;